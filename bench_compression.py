@@ -0,0 +1,162 @@
+# bench_compression.py
+#
+# Measures what compressed message storage buys on a synthetic archive:
+# database size and the time to read every message back, compared with the
+# old layout where each chat's messages were one JSON blob.
+#
+#   python bench_compression.py [--chats 300] [--messages 40]
+
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from src.memory.codec import DEFAULT_CODEC, COMPRESS_THRESHOLD
+from src.memory.migrations import migrate
+from src.memory.messages import store_messages, load_messages
+
+WORDS = ("the model request token context server prompt reply memory folder "
+         "chat thread queue window layout value error result python sqlite").split()
+
+
+def _prose(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _log_dump(rng: random.Random, lines: int) -> str:
+    levels = ("INFO", "DEBUG", "WARN", "ERROR")
+    return "\n".join(
+        f"2025-01-{rng.randint(1, 28):02d} 12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} "
+        f"{rng.choice(levels)} worker-{rng.randint(1, 8)} {_prose(rng, 8)}"
+        for _ in range(lines)
+    )
+
+
+def _code_block(rng: random.Random, functions: int) -> str:
+    body = []
+    for i in range(functions):
+        body.append(f"def handle_{rng.choice(WORDS)}_{i}(request, context=None):")
+        body.append(f"    \"\"\"{_prose(rng, 6)}\"\"\"")
+        body.append(f"    value = request.get('{rng.choice(WORDS)}', {rng.randint(0, 99)})")
+        body.append("    if value is None:")
+        body.append("        raise ValueError('missing value')")
+        body.append("    return context.process(value) if context else value\n")
+    return "Here is the code:\n```python\n" + "\n".join(body) + "\n```"
+
+
+def build_corpus(chats: int, messages: int, seed: int = 1234):
+    """Chats mixing short turns with pasted logs and generated code"""
+    rng = random.Random(seed)
+    system_prompt = _prose(rng, 300)
+    corpus = []
+    for _ in range(chats):
+        history = [{"role": "system", "content": system_prompt}]
+        for i in range(messages):
+            role = "user" if i % 2 == 0 else "assistant"
+            kind = rng.random()
+            if role == "user" and kind < 0.15:
+                content = _log_dump(rng, rng.randint(50, 400))
+            elif role == "assistant" and kind < 0.35:
+                content = _code_block(rng, rng.randint(5, 40))
+            else:
+                content = _prose(rng, rng.randint(10, 120))
+            history.append({"role": role, "content": content, "timestamp": "2025-01-01T12:00:00"})
+        corpus.append(history)
+    return corpus
+
+
+def _new_db(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    return conn
+
+
+def bench_blob(path: Path, corpus) -> float:
+    """Old layout: JSON blob per chat. Returns read time in seconds"""
+    conn = _new_db(path)
+    with conn:
+        for history in corpus:
+            conn.execute(
+                "INSERT INTO chats (title, messages, model_name) VALUES ('bench', ?, 'bench')",
+                (json.dumps(history),)
+            )
+    conn.execute("VACUUM")
+
+    start = time.perf_counter()
+    for (blob,) in conn.execute("SELECT messages FROM chats"):
+        for msg in json.loads(blob):
+            len(msg["content"])
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def bench_rows(path: Path, corpus):
+    """Row layout with compression. Returns (list time, full read time)"""
+    conn = _new_db(path)
+    with conn:
+        for history in corpus:
+            cursor = conn.execute(
+                "INSERT INTO chats (title, messages, model_name) VALUES ('bench', '[]', 'bench')"
+            )
+            store_messages(conn, cursor.lastrowid, history)
+    conn.execute("VACUUM")
+
+    chat_ids = [row[0] for row in conn.execute("SELECT id FROM chats")]
+
+    # Loading without touching content (e.g. building a chat list) stays cheap
+    start = time.perf_counter()
+    for chat_id in chat_ids:
+        load_messages(conn, chat_id)
+    lazy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chat_id in chat_ids:
+        for msg in load_messages(conn, chat_id):
+            len(msg["content"])
+    full_elapsed = time.perf_counter() - start
+
+    codecs = dict(conn.execute(
+        """SELECT COALESCE(b.codec, m.codec), COUNT(*)
+           FROM messages m LEFT JOIN bodies b ON b.hash = m.body_hash
+           GROUP BY 1"""
+    ).fetchall())
+    conn.close()
+    return lazy_elapsed, full_elapsed, codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed message storage")
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=40)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.chats, args.messages)
+    text_bytes = sum(len(m["content"].encode("utf-8")) for h in corpus for m in h)
+    print(f"Corpus: {args.chats} chats, {args.chats * (args.messages + 1)} messages, "
+          f"{text_bytes / 1e6:.1f} MB of text")
+    print(f"Codec: {DEFAULT_CODEC}, threshold {COMPRESS_THRESHOLD} chars\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        blob_path = Path(tmp) / "blob.db"
+        rows_path = Path(tmp) / "rows.db"
+
+        blob_read = bench_blob(blob_path, corpus)
+        lazy_read, rows_read, codecs = bench_rows(rows_path, corpus)
+
+        blob_size = blob_path.stat().st_size
+        rows_size = rows_path.stat().st_size
+
+    print(f"JSON blobs:      {blob_size / 1e6:8.1f} MB   read all {blob_read * 1000:8.1f} ms")
+    print(f"Compressed rows: {rows_size / 1e6:8.1f} MB   read all {rows_read * 1000:8.1f} ms"
+          f"   load without decoding {lazy_read * 1000:8.1f} ms")
+    print(f"\nSize reduction: {(1 - rows_size / blob_size) * 100:.1f}%")
+    print(f"Full read cost: {rows_read / blob_read:.2f}x the blob layout")
+    print(f"Messages per codec: {codecs}")
+
+
+if __name__ == "__main__":
+    main()
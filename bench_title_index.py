@@ -0,0 +1,110 @@
+# bench_title_index.py
+#
+# Times quick switcher searches over a synthetic set of chat titles and
+# fails (exit status 1) if the slowest query misses the frame budget: the
+# switcher searches on every keystroke, on the UI thread.
+#
+#   python bench_title_index.py [--titles 100000] [--budget-ms 16]
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from src.memory.title_index import TitleIndex
+
+WORDS = ("the model request token context server prompt reply memory folder "
+         "chat thread queue window layout value error result python sqlite "
+         "data query index table schema migration backup archive search fuzzy "
+         "trigram switcher sidebar branch stream render markdown code block "
+         "theme font color widget canvas scroll resize cache worker timeout "
+         "lock transaction vacuum export import json parser config settings "
+         "install build release test debug profile memory leak crash fix "
+         "refactor rename explain summarize translate review draft email plan "
+         "recipe travel budget workout essay story poem letter resume").split()
+
+QUERIES = (
+    "data query index",  # Several words, all common
+    "pyhton",  # Typos: only the fuzzy pass finds these
+    "sqlte",
+    "trnasaction",
+    "qeury idnex",
+    "zzqxv",  # Nothing at all
+    "dat",
+    "da",
+    "d",
+    "render markdown",
+    "workout plan",
+)
+
+
+class _Titles:
+    """Stands in for ChatMemoryDB.list_titles"""
+
+    def __init__(self, titles: int, seed: int = 1234):
+        rng = random.Random(seed)
+        self.chats = []
+        for chat_id in range(1, titles + 1):
+            title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+            if rng.random() < 0.2:
+                title += f" #{rng.randint(1, 999)}"
+            day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            self.chats.append((chat_id, title, rng.choice((None, 1, 2, 3)), day))
+        self.folders = [(1, "Work"), (2, "Personal"), (3, "Code")]
+
+    def list_titles(self):
+        return list(self.chats), list(self.folders)
+
+
+def bench(index: TitleIndex, runs: int = 5):
+    """Slowest of runs per query, in seconds"""
+    timings = {}
+    for query in QUERIES:
+        worst = 0.0
+        for _ in range(runs):
+            start = time.perf_counter()
+            index.search(query)
+            worst = max(worst, time.perf_counter() - start)
+        timings[query] = worst
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quick switcher title searches")
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--budget-ms", type=float, default=16.0)
+    parser.add_argument("--renames", type=int, default=150000,
+                        help="Titles saved after the build (enough to compact the index)")
+    args = parser.parse_args()
+
+    source = _Titles(args.titles)
+    index = TitleIndex(source)
+    start = time.perf_counter()
+    index._build()
+    print(f"Built index of {args.titles} titles in {time.perf_counter() - start:.2f}s")
+
+    # Every save re-adds its chat, leaving the old slot behind
+    rng = random.Random(99)
+    for _ in range(args.renames):
+        chat_id, title, folder_id, _ = rng.choice(source.chats)
+        index.set_chat(chat_id, title, folder_id)
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread():
+            thread.join()  # Compaction
+    print(f"Re-added {args.renames} titles; {len(index._texts)} slots in use\n")
+
+    timings = bench(index)
+    for query, elapsed in timings.items():
+        print(f"{query!r:22} {elapsed * 1000:7.2f} ms")
+
+    worst = max(timings.values()) * 1000
+    print(f"\nSlowest: {worst:.2f} ms (budget {args.budget_ms:.0f} ms)")
+    if worst > args.budget_ms:
+        print("Over budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,37 @@
 from typing import Dict, Optional, List
 import customtkinter as ctk
+import tkinter.messagebox as messagebox
 from ..settings import SettingsManager
 from ..model import OllamaAPI
 from ..settings_dialog import SettingsDialog
 from ..startup_check import OllamaSystemCheck
 from ..memory.sidebar import MemorySidebar
 from ..memory.database import ChatMemoryDB
+from ..memory.writer import ChatWriter, PendingChat
+from ..memory.maintenance import (IdleMaintenance, ArchiveTask, GarbageCollectTask,
+                                  BackupTask, VacuumTask)
+from ..memory.changes import ChangeWatcher
+from ..memory.messages import window_base
+from ..memory.title_index import TitleIndex
 from datetime import datetime
+import time
 from ..utils import TokenManager
 from .chat_area import ChatArea
 from .input_area import InputArea
 from ..welcome_dialog import WelcomeDialog
 from .status_bar import StatusBar
+from .quick_switcher import QuickSwitcher
+from .theme import ThemeRegistry
+
+# Messages read when a chat is opened (at least), and per scroll-up after that
+CHAT_PAGE_SIZE = 30
+
+# Database housekeeping runs after this long without input, one step per tick
+IDLE_AFTER_SECONDS = 30
+IDLE_TICK_MS = 2000
+
+# How often to check for changes made by other windows or scripts
+CHANGE_POLL_MS = 1000
 
 def center_window(window, width, height):
     """Center a window on the screen"""
@@ -44,6 +64,10 @@ def __init__(self):
         self.memory_db = ChatMemoryDB()
         self.memory_db.debug_print_contents()
         
+        # Persist chats on a background thread so autosave never blocks the UI
+        self.chat_writer = ChatWriter(self.memory_db, on_saved=self._handle_chat_saved)
+        self._pending_chat = None
+        
         # Initialize settings first
         self.settings_manager = SettingsManager()
         self.settings = self.settings_manager.settings
@@ -51,6 +75,7 @@ def __init__(self):
         # Show welcome dialog and get selected model
         selected_model = self.show_welcome_dialog()
         if not selected_model:  # User closed welcome dialog without selecting model
+            self.chat_writer.close()
             self.destroy()
             return
             
@@ -69,12 +94,40 @@ def __init__(self):
         
         # Configure window
         self.setup_window()
+        # Theme colours and fonts, followed by the widgets made with them
+        self.theme = ThemeRegistry(self, self.settings)
         self.setup_ui()
         self._setup_bindings()
         
+        # Upgrade older archives in the background once the UI is up
+        self.backfill_runner = self.memory_db.start_background_migrations(
+            on_progress=self._handle_backfill_progress
+        )
+        
         # Add loading state
         self.is_processing = False
         self.current_chat_id = None
+        
+        # Archive stale chats, back up and vacuum the database while the user is away
+        self._closing = False
+        self.maintenance = IdleMaintenance([
+            ArchiveTask(self.memory_db, lambda: self.settings.archive_after_days),
+            GarbageCollectTask(self.memory_db),
+            BackupTask(
+                self.memory_db,
+                lambda: self.settings.backup_interval_hours,
+                lambda: self.settings.backup_keep,
+                is_idle=self._is_user_idle
+            ),
+            VacuumTask(self.memory_db),
+        ])
+        self._last_activity = time.monotonic()
+        self._was_idle = False
+        self.after(IDLE_TICK_MS, self._idle_tick)
+        
+        # Pick up chats saved by other instances
+        self.change_watcher = ChangeWatcher(self.memory_db.db_path)
+        self.after(CHANGE_POLL_MS, self._poll_changes)
     
     def setup_window(self):
         """Configure main window settings"""
@@ -97,6 +150,27 @@ def setup_window(self):
         # Configure grid
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=1)
+        
+        # Flush pending saves before the window goes away
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def on_close(self):
+        """Flush queued chat saves and close the app"""
+        self._closing = True  # Makes a running backup give up
+        self.backfill_runner.stop()
+        self.maintenance.stop()
+        unsaved = self.chat_writer.close()
+        self.change_watcher.close()
+        try:
+            if unsaved:
+                messagebox.showerror(
+                    "Error",
+                    f"{len(unsaved)} chat(s) could not be saved; their latest messages are lost."
+                )
+        except Exception as e:
+            print(f"Error reporting unsaved chats: {e}")
+        finally:
+            self.destroy()
     
     def setup_ui(self):
         """Setup main UI components"""
@@ -108,6 +182,13 @@ def setup_ui(self):
         )
         self.sidebar.grid(row=0, column=0, sticky="ns", padx=(10, 0), pady=10)
         
+        # Titles for the Ctrl+K switcher, indexed in the background and kept
+        # current by the sidebar's change events
+        self.title_index = TitleIndex(self.memory_db)
+        self.sidebar.model.subscribe(self.title_index.on_model_event)
+        self.title_index.start()
+        self.quick_switcher = None
+        
         # Create main frame
         self.main_frame = ctk.CTkFrame(self)
         self.main_frame.grid(row=0, column=1, sticky="nsew", padx=10, pady=10)
@@ -118,8 +199,16 @@ def setup_ui(self):
         self.main_frame.grid_columnconfigure(0, weight=1)
         
         # Add components
-        self.chat_area = ChatArea(self.main_frame, self.settings)
-        self.input_area = InputArea(self.main_frame, self.settings, self.send_message)
+        self.chat_area = ChatArea(self.main_frame, self.settings, self.theme)
+        self.chat_area.on_reach_top = self._load_older_messages
+        self.chat_area.on_edit_message = self.edit_message
+        self.chat_area.on_regenerate = self.regenerate_message
+        self.chat_area.on_branch_selected = self._switch_branch
+        self._branches = []
+        self._current_root_id = None
+        self._editing_message = None
+        self._oldest_loaded_seq = None
+        self.input_area = InputArea(self.main_frame, self.settings, self.send_message, self.theme)
         
         # Remove status bar - it's already in settings
         # self.status_bar = StatusBar(self)
@@ -144,45 +233,162 @@ def load_chat(self, chat_id: int):
         if self.is_processing:
             return
         
+        # Selecting a conversation opens the branch it was last left on
+        chat_id = self.memory_db.get_active_branch(chat_id)
+        
         # Don't reload if it's the current chat
         if self.current_chat_id == chat_id:
             return
         
-        chat_data = self.memory_db.get_chat(chat_id)
+        # Only the newest messages (as much as fits the model's context) are loaded
+        chat_data = self.memory_db.get_chat(
+            chat_id,
+            message_limit=CHAT_PAGE_SIZE,
+            token_budget=self.settings.max_context_tokens
+        )
         if not chat_data:
             return
         
-        # Clear current chat
-        for widget in self.chat_area.chat_frame.winfo_children():
-            widget.destroy()
+        # Saves of this chat build on the revision just loaded
+        self.chat_writer.expect_revision(chat_id, chat_data["revision"])
         
-        # Set current chat ID in both app and sidebar
-        self.current_chat_id = chat_id
-        self.sidebar.current_chat_id = chat_id  # Sync the ID with sidebar
+        # Another conversation shares no prefix with what the server has cached
+        if chat_data["root_id"] != self._current_root_id:
+            self.api.reset_prompt_window()
         
-        # Update highlighting immediately
-        for btn in self.sidebar._chat_buttons:
-            if btn.winfo_exists():
-                is_current = btn._chat_id == chat_id
-                btn.configure(text_color="white" if is_current else "gray")
+        # Set current chat ID in both app and sidebar (which lists conversations)
+        self.current_chat_id = chat_id
+        self._current_root_id = chat_data["root_id"]
+        self._pending_chat = None
+        self._cancel_edit()
+        # Sync the ID with sidebar and update highlighting immediately
+        self.sidebar.highlight_chat(chat_data["root_id"])
         
         # Load messages
         self.api.conversation_history = chat_data["messages"]
         
-        # Display messages
-        for msg in chat_data["messages"]:
-            if msg["role"] not in ["system"]:  # Skip system messages
-                self.chat_area._append_to_chat(msg["content"], sender=msg["role"])
+        # Hand every loaded message to the chat area; it only builds bubbles
+        # for the ones on screen. Older ones are read on scroll-up
+        visible = [msg for msg in chat_data["messages"] if msg["role"] not in ["system"]]  # Skip system messages
+        self._oldest_loaded_seq = visible[0].seq if visible else None
+        self.chat_area.set_messages(visible)
+        
+        self._update_branch_menu()
+
+    def _update_branch_menu(self):
+        """Show the current conversation's branches in the chat header"""
+        if self.current_chat_id is None:
+            self._branches = []
+            self.chat_area.show_branches([], 0)
+            return
+        self._branches = self.memory_db.list_branches(self.current_chat_id)
+        labels = []
+        for number, branch in enumerate(self._branches):
+            name = "Original" if branch["branch_parent"] is None else f"Branch {number}"
+            preview = branch["preview"].replace("\n", " ")
+            labels.append(f"{name}: {preview}" if preview else name)
+        current = next((i for i, branch in enumerate(self._branches)
+                        if branch["id"] == self.current_chat_id), 0)
+        self.chat_area.show_branches(labels, current)
+
+    def _switch_branch(self, index: int):
+        """Open another branch of the current conversation"""
+        if self.is_processing or index >= len(self._branches):
+            return
+        branch_id = self._branches[index]["id"]
+        if branch_id == self.current_chat_id:
+            return
+        self.save_current_chat()
+        self.memory_db.set_active_branch(branch_id)
+        self.load_chat(branch_id)
+
+    def _message_seq(self, msg: Dict) -> Optional[int]:
+        """Position of a message in the current chat"""
+        if getattr(msg, "seq", None) is not None:
+            return msg.seq
+        history = self.api.conversation_history
+        for i, other in enumerate(history):
+            if other is msg:
+                return window_base(history) + i - 1
+        return None
+
+    def _start_branch(self, msg: Dict) -> bool:
+        """Fork the current chat just before msg and open the new branch
+        
+        The branch shares everything before msg with the chat it came from,
+        in storage and in the prompt sent to the model.
+        """
+        seq = self._message_seq(msg)
+        if seq is None or seq < 1:
+            return False
+        # Rows up to the fork point have to be in the database first
+        self.save_current_chat()
+        self.chat_writer.flush(timeout=10.0)
+        chat_id = self.current_chat_id
+        if chat_id is None and self._pending_chat is not None:
+            chat_id = self._pending_chat.chat_id
+        if chat_id is None:
+            return False
+        try:
+            branch_id = self.memory_db.create_branch(chat_id, seq)
+        except Exception as e:
+            print(f"Error creating branch: {e}")
+            return False
+        self.current_chat_id = chat_id
+        self.load_chat(branch_id)
+        return self.current_chat_id == branch_id
+
+    def edit_message(self, msg: Dict):
+        """Put an earlier message in the input field; sending it starts a new branch"""
+        if self.is_processing:
+            return
+        self._editing_message = msg
+        field = self.input_area.input_field
+        field.delete("1.0", "end")
+        field.insert("1.0", msg["content"])
+        self.input_area._update_input_height()
+        field.focus_set()
+        self.chat_area.header_label.configure(
+            text="Editing an earlier message - sending starts a new branch (Esc to cancel)"
+        )
+
+    def _cancel_edit(self, event=None):
+        """Leave edit mode without sending"""
+        if self._editing_message is None:
+            return
+        self._editing_message = None
+        self.chat_area.header_label.configure(text="Chat History")
+        if event is not None:
+            self.input_area.input_field.delete("1.0", "end")
+            self.input_area._update_input_height()
+
+    def regenerate_message(self, msg: Dict):
+        """Ask for another answer in place of msg, as a new branch"""
+        if self.is_processing or not self._start_branch(msg):
+            return
+        self._request_reply(is_first_message=False)
+
+    def _load_older_messages(self):
+        """Render the previous page of the current chat when scrolled to the top"""
+        if self.current_chat_id is None:
+            return
+        
+        if self._oldest_loaded_seq is None or self._oldest_loaded_seq <= 1:
+            return
         
-        # Force geometry update and scroll refresh
-        self.chat_area.chat_frame.update_idletasks()
-        self.after(100, self._ensure_chat_visible)
+        page = self.memory_db.get_messages_page(
+            self.current_chat_id,
+            before_seq=self._oldest_loaded_seq,
+            limit=CHAT_PAGE_SIZE
+        )
+        if page:
+            self._oldest_loaded_seq = page[0].seq
+        self.chat_area.prepend_messages(page)
 
     def new_chat(self, folder_id=None):
         """Create a new chat and return its ID"""
-        # Clear the chat window by removing all widgets
-        for widget in self.chat_area.chat_frame.winfo_children():
-            widget.destroy()
+        # Clear the chat window
+        self.chat_area.clear()
         
         # Reset conversation history
         self.api.conversation_history = [{
@@ -192,20 +398,15 @@ def new_chat(self, folder_id=None):
         
         # Don't create a new chat in database until first message is sent
         self.current_chat_id = None
+        self._current_root_id = None
+        self._pending_chat = None
+        self._cancel_edit()
+        self.api.reset_prompt_window()
+        self.chat_area.show_branches([], 0)
+        self._oldest_loaded_seq = None
         
         return None  # Return None to indicate no database entry yet
 
-    def _ensure_chat_visible(self):
-        """Ensure chat content is visible after loading"""
-        # Force another geometry update
-        self.chat_area.chat_frame.update_idletasks()
-        # Update the scroll region
-        self.chat_area.chat_frame._parent_canvas.configure(
-            scrollregion=self.chat_area.chat_frame._parent_canvas.bbox("all")
-        )
-        # Scroll to show content
-        self.chat_area.chat_frame._parent_canvas.yview_moveto(0.0)
-
     def open_settings_dialog(self):
         """Open the settings dialog"""
         dialog = SettingsDialog(self)
@@ -214,11 +415,13 @@ def open_settings_dialog(self):
         dialog.focus_force()    # Force focus to dialog
         dialog.wait_window()    # Wait for dialog to close
         
-        # Update the API instance with the new system prompt
-        self.api.conversation_history[0] = {
-            "role": "system",
-            "content": self.settings.system_prompt
-        }
+        # Update the API instance with the new system prompt; a branch keeps
+        # its conversation's, which only the root chat can change
+        if self.current_chat_id is None or self.current_chat_id == self._current_root_id:
+            self.api.conversation_history[0] = {
+                "role": "system",
+                "content": self.settings.system_prompt
+            }
 
     def send_message(self, event=None):
         """Send a message to the API"""
@@ -235,6 +438,13 @@ def send_message(self, event=None):
             self._show_token_warning(error_msg)
             return
         
+        # Sending an edited message continues a new branch from before the original
+        if self._editing_message is not None:
+            edited = self._editing_message
+            self._cancel_edit()
+            if not self._start_branch(edited):
+                return
+        
         # Add timestamp to message
         timestamp = datetime.now().isoformat()
         
@@ -242,16 +452,21 @@ def send_message(self, event=None):
         is_first_message = len(self.api.conversation_history) <= 1
         
         # Add timestamp to user message
-        self.api.conversation_history.append({
+        message = {
             "role": "user",
             "content": user_text,
             "timestamp": timestamp
-        })
+        }
+        self.api.conversation_history.append(message)
         
-        self.chat_area._append_to_chat(user_text, sender="user")
+        self.chat_area._append_to_chat(user_text, sender="user", message=message)
         self.input_area.input_field.delete("1.0", "end")
         self.input_area._update_input_height()
         
+        self._request_reply(is_first_message)
+
+    def _request_reply(self, is_first_message: bool = False):
+        """Ask the model to answer the conversation as it stands"""
         # Show loading and disable sidebar
         self.is_processing = True
         self.chat_area.progress_bar.place(relx=0.5, rely=0.5, relwidth=0.99, anchor="center")
@@ -260,15 +475,18 @@ def send_message(self, event=None):
         self.input_area.send_button.configure(state="disabled")
         self.sidebar.disable_interaction()  # Disable sidebar here
         
-        # Use async response
+        # Use async response, streamed into a bubble as it arrives
+        last_user = next((msg for msg in reversed(self.api.conversation_history) if msg["role"] == "user"), None)
+        self.chat_area.start_stream("assistant")
         self.api.get_response_async(
-            user_text,
+            last_user["content"] if last_user else "",
             callback=lambda response: self._handle_response(response, is_first_message),
+            on_chunk=self.chat_area.stream_write,
             temperature=self.settings.temperature
         )
         
         # Auto-save after sending message
-        self.after(1000, self.save_current_chat)
+        self.save_current_chat()
 
     def _show_loading(self):
         """Show loading indicator"""
@@ -289,12 +507,17 @@ def _hide_loading(self):
 
     def _handle_response(self, response: str, is_first_message: bool = False):
         """Handle async response from API"""
-        self.after(0, lambda: self._process_response(response, is_first_message))
+        # Read on the API thread, before another request can replace it
+        usage = self.api.last_usage
+        self.after(0, lambda: self._process_response(response, is_first_message, usage))
 
-    def _process_response(self, response: str, is_first_message: bool = False):
+    def _process_response(self, response: str, is_first_message: bool = False,
+                          usage: Optional[Dict] = None):
         """Process the response from the API"""
         response = response.strip()
-        self.chat_area._append_to_chat(response, sender="assistant")
+        history = self.api.conversation_history
+        reply = history[-1] if history and history[-1]["role"] == "assistant" else None
+        self.chat_area.end_stream(response, message=reply)
         
         # Hide loading and re-enable sidebar
         self.is_processing = False
@@ -305,17 +528,11 @@ def _process_response(self, response: str, is_first_message: bool = False):
         self.input_area.send_button.configure(state="normal")
         self.sidebar.enable_interaction()  # Re-enable sidebar here
         
-        # Handle chat saving/updating
-        if is_first_message:
-            title = self.api.conversation_history[1]["content"]
-            title = title[:18] + "..." if len(title) > 18 else title
-            self.memory_db.rename_chat(self.current_chat_id, title)
-            self.sidebar.load_contents()
-        else:
-            self.after(1000, self.save_current_chat)
+        # Queue the updated chat (and the reply's usage) for saving
+        self.save_current_chat(usage=usage)
 
-    def save_current_chat(self):
-        """Save the current chat"""
+    def save_current_chat(self, usage: Optional[Dict] = None):
+        """Queue the current chat for saving on the writer thread"""
         if len(self.api.conversation_history) <= 1:  # Only system message
             return
         
@@ -328,24 +545,109 @@ def save_current_chat(self):
         title = first_msg["content"][:18] + "..." if len(first_msg["content"]) > 12 else first_msg["content"]
         
         if self.current_chat_id is None:
-            # Create new chat
-            self.current_chat_id = self.memory_db.save_chat(
-                title=title,
+            # Create new chat - the writer fills in its ID once inserted
+            if self._pending_chat is None:
+                self._pending_chat = PendingChat()
+            self.chat_writer.save(
+                self._pending_chat,
                 messages=self.api.conversation_history,
+                title=title,
                 model_name=self.api.model,
-                folder_id=self.sidebar.current_folder_id
+                folder_id=self.sidebar.current_folder_id,
+                usage=usage
             )
-            # Update sidebar's current chat ID to ensure proper highlighting
-            self.sidebar.current_chat_id = self.current_chat_id
         else:
             # Update existing chat
-            self.memory_db.update_chat(
-                chat_id=self.current_chat_id,
-                messages=self.api.conversation_history
+            self.chat_writer.save(
+                self.current_chat_id,
+                messages=self.api.conversation_history,
+                usage=usage
             )
+
+    def _handle_chat_saved(self, key, chat_id: int, summary_changed: bool):
+        """Handle a completed save from the writer thread"""
+        self.after(0, lambda: self._on_chat_saved(key, chat_id, summary_changed))
+
+    def _on_chat_saved(self, key, chat_id: int, summary_changed: bool):
+        """Adopt new chat IDs and update the chat's row in the sidebar"""
+        if key is self._pending_chat:
+            self.current_chat_id = chat_id
+            self._current_root_id = chat_id
+            self._pending_chat = None
+            # Update sidebar's current chat ID to ensure proper highlighting
+            self.sidebar.current_chat_id = chat_id
+        elif key == self.current_chat_id and chat_id != key:
+            # Another window saved this chat first; ours went to a conflict copy
+            self.current_chat_id = chat_id
+            self.sidebar.current_chat_id = chat_id
+        
+        # A branch's first saved message becomes its label in the switcher
+        if chat_id == self.current_chat_id and len(self._branches) > 1:
+            self._update_branch_menu()
         
-        # Refresh sidebar with proper highlighting
-        self.sidebar.load_contents()
+        # Patches just this chat's row (or moves it to the top)
+        self.sidebar.model.chat_changed(chat_id)
+
+    def _poll_changes(self):
+        """Refresh what other instances changed since the last poll"""
+        try:
+            changes = self.change_watcher.poll()
+        except Exception as e:
+            print(f"Error checking for changes: {e}")
+            changes = []
+        
+        model = self.sidebar.model
+        for change in changes:
+            if change["kind"] == "reset":
+                # A backup was restored (maybe by another window)
+                self._reload_current_chat()
+                model.reload()
+                continue
+            if change["kind"] == "folder":
+                model.folder_changed(change["item_id"])
+                continue
+            if change["summary_changed"] or change["deleted"]:
+                model.chat_changed(change["item_id"])
+                continue
+            # Revisions this instance wrote itself need nothing
+            own_revision = self.chat_writer.revision_of(change["item_id"])
+            if own_revision is not None and change["revision"] <= own_revision:
+                continue
+            model.chat_changed(change["item_id"])
+            if change["item_id"] == self.current_chat_id:
+                self._reload_current_chat()
+        
+        self.after(CHANGE_POLL_MS, self._poll_changes)
+
+    def _reload_current_chat(self):
+        """Show the current chat as another window saved it"""
+        chat_id = self.current_chat_id
+        if chat_id is None or self.is_processing or self.chat_writer.has_pending(chat_id):
+            # Our save is on its way and will become a conflict copy
+            return
+        self.current_chat_id = None
+        self.load_chat(chat_id)
+
+    def restore_backup(self, path):
+        """Replace all chats with a backup and start a fresh chat"""
+        self.chat_writer.flush(timeout=10.0)
+        self.memory_db.restore_backup(path)
+        self.new_chat()
+        self.sidebar.model.reload()
+
+    def _handle_backfill_progress(self, backfill, done: int, total: int):
+        """Handle progress reports from the background migration thread"""
+        self.after(0, lambda: self._show_backfill_progress(backfill, done, total))
+
+    def _show_backfill_progress(self, backfill, done: int, total: int):
+        """Show archive upgrade progress in the chat header"""
+        if backfill is None:
+            self.chat_area.header_label.configure(text="Chat History")
+            return
+        percent = int(done * 100 / total) if total else 100
+        self.chat_area.header_label.configure(
+            text=f"Upgrading archive: {backfill.description} ({percent}%)"
+        )
 
     def check_connection_status(self):
         """Periodically check Ollama connection status"""
@@ -367,7 +669,50 @@ def _setup_bindings(self):
         """Setup keyboard bindings"""
         self.input_area.input_field.bind("<Return>", self._handle_return)
         self.input_area.input_field.bind("<Shift-Return>", self._handle_shift_return)
+        self.input_area.input_field.bind("<Escape>", self._cancel_edit)
         self.bind("<Control-b>", lambda e: self.sidebar.toggle_sidebar())
+        # Bound on the input too, or the text box would delete to end of line first
+        self.bind("<Control-k>", self.open_quick_switcher)
+        self.input_area.input_field.bind("<Control-k>", self.open_quick_switcher)
+        
+        # Any input counts as activity for idle maintenance
+        for sequence in ("<Key>", "<Button>", "<MouseWheel>"):
+            self.bind_all(sequence, self._note_activity, add="+")
+
+    def open_quick_switcher(self, event=None):
+        """Show the Ctrl+K palette for jumping to a chat or folder"""
+        if self.quick_switcher is not None and self.quick_switcher.winfo_exists():
+            self.quick_switcher.focus_force()
+        else:
+            self.quick_switcher = QuickSwitcher(self, self.title_index, on_select=self._open_switcher_result)
+        return "break"
+
+    def _open_switcher_result(self, result: Dict):
+        """Open what was picked in the quick switcher"""
+        if result["kind"] == "folder":
+            self.sidebar.open_folder(result["id"])
+        else:
+            self.load_chat(result["id"])
+
+    def _note_activity(self, event=None):
+        """Remember when the user last did something"""
+        self._last_activity = time.monotonic()
+
+    def _is_user_idle(self) -> bool:
+        """True while nothing is typed, clicked or generated (safe from any thread)"""
+        return (not self._closing and not self.is_processing
+                and time.monotonic() - self._last_activity >= IDLE_AFTER_SECONDS)
+
+    def _idle_tick(self):
+        """Run a maintenance step if the user has been idle for a while"""
+        idle = self._is_user_idle()
+        if idle:
+            if not self._was_idle:
+                # New idle period - recheck for chats to archive and pages to free
+                self.maintenance.reset()
+            self.maintenance.run_step()
+        self._was_idle = idle
+        self.after(IDLE_TICK_MS, self._idle_tick)
 
     def _handle_return(self, event):
         """Send message on Enter, unless Shift is held"""
@@ -381,36 +726,17 @@ def _handle_shift_return(self, event):
 
     def _show_token_warning(self, message: str):
         """Show token limit warning in UI"""
-        warning = ctk.CTkLabel(
-            self.chat_area.chat_frame,
-            text=message,
-            text_color="orange",
-            font=("Helvetica", 12)
-        )
-        warning.pack(pady=5)
-        # Auto-remove warning after 5 seconds
-        self.after(5000, warning.destroy)
+        # Auto-removed after 5 seconds
+        self.chat_area.show_notice(message, duration_ms=5000)
 
     def update_theme_color(self, color):
-        """Update UI elements with new theme color"""
-        # Update sidebar buttons
-        self.sidebar.folder_action_btn.configure(fg_color=color)
-        self.sidebar.new_chat_btn.configure(fg_color=color)
-        
-        # Update input area
-        self.input_area.send_button.configure(fg_color=color)
-        self.input_area.send_button.configure(hover_color=color)
-        
-        # Update chat area message bubbles
-        self.chat_area.update_theme_color(color)
-        
-        # Update status bar indicator if connected
-        if hasattr(self, 'status_bar'):
-            success, _ = OllamaSystemCheck.check_system()
-            self.status_bar.update_status(success)  # This will use the new theme color
+        """Update UI elements with new theme color
         
-        # Update settings
+        Widgets showing it are bound to the theme's "accent" colour and
+        follow in one batch once the event loop is idle.
+        """
         self.settings.theme_color = color
+        self.theme.set_color("accent", color)
 
     def show_welcome_dialog(self) -> str:
         """Show welcome dialog and return selected model"""
@@ -456,8 +782,8 @@ def update_message_fonts(self, font_family: str = None, font_size: int = None):
         if font_size:
             self.settings.message_font_size = font_size
         
-        # Update existing messages
-        self.chat_area.update_font_settings(font_family, font_size)
+        # Existing messages use the theme's named fonts
+        self.theme.set_message_font(self.settings.message_font_family, self.settings.message_font_size)
         
         # Save settings
         self.settings_manager.save_settings()
@@ -1,13 +1,50 @@
 import customtkinter as ctk
-from typing import Dict
+import tkinter as tk
+from typing import Dict, List
 from datetime import datetime
 import sys
+import time
+
+from .message_list import VirtualMessageList
+from .transcript_view import TranscriptView
+from . import markdown
+from .highlight import Highlighter
+from .stream_sink import StreamSink, FLUSH_INTERVAL_MS
+from .text_layout import LineCounter, spans_height
+from .theme import MESSAGE_FONT
+
+# Newest messages shown at once when a chat opens (about a screenful); the
+# older ones follow in slices of at most LOAD_SLICE_MS, with the event loop
+# free in between
+FIRST_SLICE_MESSAGES = 20
+LOAD_SLICE_MS = 8
+
+# Unused text and code parts a pooled row keeps for its next message
+MAX_SPARE_PARTS = 2
 
 class ChatArea:
-    def __init__(self, parent: ctk.CTkFrame, settings):
+    def __init__(self, parent: ctk.CTkFrame, settings, theme):
         self.parent = parent
         self.settings = settings
+        self.theme = theme  # ThemeRegistry: colours and fonts that change live
+        # Called when the user scrolls to the top, to load older messages
+        self.on_reach_top = None
+        # Called with a message from its bubble's context menu
+        self.on_edit_message = None
+        self.on_regenerate = None
+        # Called with the index of the branch picked in the header
+        self.on_branch_selected = None
+        # Older messages of the chat being opened, still to be shown
+        self._pending_entries = []
+        self._load_job = None
+        self._slice_size = FIRST_SLICE_MESSAGES
+        # Reply being streamed in: its entry once the first text arrived
+        self._stream = None
+        self._stream_entry = None
+        self._stream_sender = "assistant"
         self.setup_ui()
+        # Rows size their text from font metrics; the font itself is shared
+        self.theme.on_change(MESSAGE_FONT, self.message_list.reflow)
     
     def setup_ui(self):
         """Setup chat area UI"""
@@ -18,9 +55,12 @@ def setup_ui(self):
         # Add header
         self._setup_header()
         
-        # Chat frame (scrollable)
-        self.chat_frame = self._create_chat_area()
-        self.chat_frame.pack(fill="both", expand=True)
+        # Colours code blocks in the background
+        self.highlighter = Highlighter(self.container)
+        
+        # Message list (virtualised and scrollable)
+        self.message_list = self._create_chat_area()
+        self.message_list.pack(fill="both", expand=True)
         
         # Add bottom fade effect
         self._setup_fade_effect()
@@ -42,19 +82,62 @@ def _setup_header(self):
             text_color="gray"
         )
         self.header_label.pack(side="left", padx=10)
-    
-    def _create_chat_area(self) -> ctk.CTkScrollableFrame:
-        """Creates a scrollable chat area"""
-        chat_frame = ctk.CTkScrollableFrame(
-            self.container,
-            fg_color="transparent",
-            border_width=0,
-            scrollbar_button_hover_color="#505050"  # Brighter hover color
-        )
         
-        # Get the parent canvas that CTkScrollableFrame creates
-        parent_canvas = chat_frame._parent_canvas
-        scrollbar = chat_frame._scrollbar
+        # Branch switcher, only shown for conversations with branches
+        self.branch_menu = ctk.CTkOptionMenu(
+            self.header,
+            values=[""],
+            width=220,
+            height=22,
+            font=("Helvetica", 11),
+            dynamic_resizing=False,
+            command=self._handle_branch_selected
+        )
+        self._branch_labels = []
+    
+    def show_branches(self, labels: List[str], current: int):
+        """List a conversation's branches in the header, or hide it with only one"""
+        self._branch_labels = labels
+        if len(labels) <= 1:
+            self.branch_menu.pack_forget()
+            return
+        self.branch_menu.configure(values=labels)
+        self.branch_menu.set(labels[current])
+        self.branch_menu.pack(side="right", padx=10, pady=4)
+    
+    def _handle_branch_selected(self, label: str):
+        if self.on_branch_selected and label in self._branch_labels:
+            self.on_branch_selected(self._branch_labels.index(label))
+    
+    def _create_chat_area(self):
+        """Creates the message list
+        
+        Either bubbles built only for the messages near the view, or (with
+        settings.chat_renderer = "text") the whole chat drawn into one text
+        widget with tags.
+        """
+        if getattr(self.settings, "chat_renderer", "widgets") == "text":
+            message_list = TranscriptView(
+                self.container,
+                self.theme,
+                display_name=lambda entry: self._display_name(entry["sender"], entry["time"]),
+                highlighter=self.highlighter,
+                on_context_menu=self._show_message_menu,
+                on_reach_top=self._request_older_messages,
+                fg_color="transparent"
+            )
+        else:
+            message_list = VirtualMessageList(
+                self.container,
+                build_row=self._build_row,
+                estimate_height=self._estimate_height,
+                on_reach_top=self._request_older_messages,
+                prepare_row=self._prepare_row,
+                extend_row=self._extend_row,
+                resize_row=self._resize_row,
+                fg_color="transparent"
+            )
+        scrollbar = message_list.scrollbar
         
         # Configure scrollbar with proper colors and hover states
         scrollbar.configure(
@@ -66,37 +149,31 @@ def _create_chat_area(self) -> ctk.CTkScrollableFrame:
         
         # Show scrollbar on hover
         def show_scrollbar(event):
-            scrollbar.grid()  # Show the scrollbar
+            if not scrollbar.winfo_ismapped():
+                scrollbar.pack(side="right", fill="y", before=message_list.viewport)
         
         def hide_scrollbar(event):
             if not scrollbar.winfo_ismapped():
                 return
-            # Get mouse position relative to the chat frame
-            mouse_x = chat_frame.winfo_pointerx() - chat_frame.winfo_rootx()
-            mouse_y = chat_frame.winfo_pointery() - chat_frame.winfo_rooty()
+            # Get mouse position relative to the message list
+            mouse_x = message_list.winfo_pointerx() - message_list.winfo_rootx()
+            mouse_y = message_list.winfo_pointery() - message_list.winfo_rooty()
             
-            # Check if mouse is outside the chat frame
-            if not (0 <= mouse_x <= chat_frame.winfo_width() and 
-                    0 <= mouse_y <= chat_frame.winfo_height()):
-                scrollbar.grid_remove()  # Hide the scrollbar
+            # Check if mouse is outside the message list
+            if not (0 <= mouse_x <= message_list.winfo_width() and 
+                    0 <= mouse_y <= message_list.winfo_height()):
+                scrollbar.pack_forget()  # Hide the scrollbar
         
         # Bind mouse enter/leave events
-        chat_frame.bind('<Enter>', show_scrollbar)
-        chat_frame.bind('<Leave>', hide_scrollbar)
+        message_list.bind('<Enter>', show_scrollbar)
+        message_list.bind('<Leave>', hide_scrollbar)
         scrollbar.bind('<Enter>', show_scrollbar)
         scrollbar.bind('<Leave>', hide_scrollbar)
         
         # Initially hide scrollbar
-        scrollbar.grid_remove()
+        scrollbar.pack_forget()
         
-        # Bind scroll events directly to the canvas based on platform
-        if sys.platform.startswith("win") or sys.platform == "darwin":
-            parent_canvas.bind("<MouseWheel>", self._on_mousewheel)
-        else:  # Linux
-            parent_canvas.bind("<Button-4>", self._on_mousewheel)
-            parent_canvas.bind("<Button-5>", self._on_mousewheel)
-        
-        return chat_frame
+        return message_list
     
     def _setup_fade_effect(self):
         """Setup bottom fade effect and progress bar"""
@@ -126,9 +203,10 @@ def _setup_fade_effect(self):
             self.bottom_fade,
             mode="indeterminate",
             height=2,
-            progress_color=self.settings.theme_color,
+            progress_color=self.theme.color("accent"),
             fg_color="#1a1a1a"
         )
+        self.theme.bind(self.progress_bar, "accent", "progress_color")
         self.progress_bar.place(relx=0.5, rely=0.5, relwidth=0.99, anchor="center")
         
         # Configure progress bar
@@ -162,229 +240,490 @@ def _create_gradient_colors(self, base_color: str, steps: int) -> list:
         
         return colors
     
-    def _on_mousewheel(self, event):
-        """Handle mousewheel scrolling"""
-        parent_canvas = self.chat_frame._parent_canvas
-        
-        if event.num == 4:  # Linux scroll up
-            parent_canvas.yview_scroll(-1, "units")
-        elif event.num == 5:  # Linux scroll down
-            parent_canvas.yview_scroll(1, "units")
-        else:  # Windows/macOS
-            direction = -1 if event.delta > 0 else 1
-            parent_canvas.yview_scroll(direction, "units")
-    
-    def _append_to_chat(self, text: str, sender: str):
-        """Add a message to the chat area"""
-        # Get current timestamp
-        timestamp = datetime.now().strftime("%I:%M %p")
+    def _request_older_messages(self):
+        """Ask for the previous page of messages, at most once per idle cycle"""
+        if not self.on_reach_top or getattr(self, "_older_requested", False):
+            return
+        if self._pending_entries:
+            return  # Still showing what was loaded; those come first
+        self._older_requested = True
+        
+        def load():
+            self._older_requested = False
+            self.on_reach_top()
+        
+        self.message_list.after_idle(load)
+    
+    def _entry(self, message: Dict, text: str = None, sender: str = None, timestamp: str = None) -> Dict:
+        """A message as an item of the message list"""
+        return {
+            "text": text if text is not None else message["content"],
+            "sender": sender or message["role"],
+            "message": message,
+            # Shown next to the name; fixed when the message is added, not per rebuild
+            "time": timestamp or datetime.now().strftime("%I:%M %p"),
+        }
+    
+    def set_messages(self, messages: list):
+        """Show these messages in place of the current ones, scrolled to the newest
         
+        The newest screenful is shown right away; older messages are added
+        above it a time slice at a time (see _load_slice).
+        """
+        self._cancel_loading()
+        timestamp = datetime.now().strftime("%I:%M %p")
+        entries = [self._entry(msg, timestamp=timestamp) for msg in messages]
+        self._pending_entries = entries[:-FIRST_SLICE_MESSAGES]
+        self.message_list.set_entries(entries[-FIRST_SLICE_MESSAGES:])
+        if self._pending_entries:
+            self._load_job = self.message_list.after(1, self._load_slice)
+    
+    def _load_slice(self):
+        """Prepend older messages until this slice's time is used up"""
+        self._load_job = None
+        started = time.perf_counter()
+        while self._pending_entries:
+            batch = self._pending_entries[-self._slice_size:]
+            del self._pending_entries[-self._slice_size:]
+            batch_started = time.perf_counter()
+            self.message_list.prepend_entries(batch)
+            # Aim each batch at half a slice, from how long this one took
+            elapsed_ms = max((time.perf_counter() - batch_started) * 1000, 0.1)
+            self._slice_size = max(1, min(500, int(len(batch) * LOAD_SLICE_MS / 2 / elapsed_ms)))
+            if (time.perf_counter() - started) * 1000 >= LOAD_SLICE_MS:
+                break
+        if self._pending_entries:
+            # Let input and repaints through before the next slice
+            self._load_job = self.message_list.after(1, self._load_slice)
+    
+    def _cancel_loading(self):
+        """Stop adding the previous chat's messages"""
+        if self._load_job is not None:
+            self.message_list.after_cancel(self._load_job)
+            self._load_job = None
+        self._pending_entries = []
+    
+    def clear(self):
+        """Remove every message"""
+        self._cancel_loading()
+        self._close_stream()
+        self.message_list.clear()
+    
+    def prepend_messages(self, messages: list):
+        """Insert older messages above the current ones, keeping the view in place"""
+        timestamp = datetime.now().strftime("%I:%M %p")
+        self.message_list.prepend_entries([self._entry(msg, timestamp=timestamp) for msg in messages])
+    
+    def _append_to_chat(self, text: str, sender: str, prepend: bool = False, message: Dict = None):
+        """Add a message to the chat area (or above the others with prepend)
+        
+        Bubbles given their ``message`` get a context menu to edit it or
+        regenerate the reply, which starts a new branch from there.
+        """
+        entry = self._entry(message, text=text, sender=sender)
+        if prepend:
+            self.message_list.prepend_entries([entry])
+        else:
+            self.message_list.append_entries([entry])
+            self.message_list.scroll_to_bottom()
+    
+    def extend_last_message(self, text: str):
+        """Add text to the newest message, e.g. a reply as it streams in"""
+        self.message_list.extend_last(text)
+    
+    def start_stream(self, sender: str = "assistant"):
+        """Get ready for a message that arrives in pieces through stream_write
+        
+        Pieces are collected and drawn at most every
+        settings.stream_flush_ms (see StreamSink); the bubble appears with
+        the first text, grows in place, and the view follows it only if it
+        was showing the newest message.
+        """
+        self._close_stream()
+        self._stream_sender = sender
+        interval = getattr(self.settings, "stream_flush_ms", FLUSH_INTERVAL_MS)
+        self._stream = StreamSink(self.message_list, self._flush_stream, interval)
+        self._stream.open()
+    
+    def stream_write(self, text: str):
+        """Add a piece of the streaming message; safe to call from any thread"""
+        stream = self._stream
+        if stream is not None:
+            stream.write(text)
+    
+    def end_stream(self, text: str, message: Dict = None):
+        """Show the finished message in full, in place of the streamed text"""
+        entry = self._stream_entry
+        self._close_stream()
+        if entry is not None and self.message_list.entries and self.message_list.entries[-1] is entry:
+            entry["text"] = text
+            entry["message"] = message
+            # Drawn once more, now with its markdown and highlighting
+            self.message_list.refresh_entry(-1)
+        else:
+            self._append_to_chat(text, sender=self._stream_sender, message=message)
+    
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close(discard=True)
+            self._stream = None
+        if self._stream_entry is not None:
+            self._stream_entry.pop("streaming", None)
+            self._stream_entry = None
+    
+    def _flush_stream(self, text: str):
+        """Draw the text collected since the last flush"""
+        if self._stream_entry is None:
+            text = text.lstrip()  # Replies are shown stripped
+            if not text:
+                return
+            entry = self._entry(None, text=text, sender=self._stream_sender)
+            entry["streaming"] = True
+            self._stream_entry = entry
+            self.message_list.append_entries([entry])
+        else:
+            self.message_list.extend_last(text)
+    
+    def show_notice(self, text: str, duration_ms: int = 5000):
+        """Show a short warning over the bottom of the messages"""
+        notice = ctk.CTkLabel(
+            self.message_list,
+            text=text,
+            text_color="orange",
+            font=("Helvetica", 12)
+        )
+        notice.place(relx=0.5, rely=1.0, anchor="s", y=-10)
+        self.message_list.after(duration_ms, notice.destroy)
+    
+    def _bubble_width(self, width: int) -> float:
+        """Widest a bubble may get in a list this wide"""
+        return min(width * 0.7, 600) if width > 1 else 600
+    
+    def _estimate_height(self, entry: Dict, width: int) -> int:
+        """Height of a message's row, from font metrics, before it has been built"""
+        max_width = self._bubble_width(width)
+        family, size = self.theme.message_family, self.theme.message_size
+        height = 30  # Name label and the gap under it
+        for kind, content in self._segments(entry):
+            if kind == "text":
+                # Text container padding around the textbox
+                height += 20 + spans_height(content, family, size, int(max_width - 40))
+            else:
+                # Code frame and textbox padding
+                height += 30 + self._code_height(content["text"])
+        return height
+    
+    def _segments(self, entry: Dict) -> list:
+        """A message as ("text", spans) and ("code", block) parts, in order
+        
+        Assistant replies are read as markdown (parsed once per content,
+        see markdown.parse); user messages only have their code fences split
+        out. Text blocks between code blocks share one textbox. A message
+        still streaming in is plain text in one textbox, so it can grow in
+        place; it gets its markdown when it's done.
+        """
+        if entry.get("streaming"):
+            # The widget shows the text as is (the last newline is dropped)
+            return [("text", [(entry["text"] + "\n", ())])]
+        if entry["sender"] == "assistant":
+            blocks = markdown.parse(entry["text"])
+        else:
+            blocks = markdown.plain_blocks(entry["text"])
+        segments = []
+        for block in blocks:
+            if block["kind"] == "code":
+                segments.append(("code", block))
+            elif segments and segments[-1][0] == "text":
+                segments[-1][1].extend(markdown.block_spans(block, first=False))
+            else:
+                segments.append(("text", markdown.block_spans(block)))
+        return segments
+    
+    def _display_name(self, sender: str, timestamp: str) -> str:
+        """Name line shown above a bubble"""
         # Get custom names from settings
         ai_name = self.settings.agent_name if hasattr(self.settings, 'agent_name') else None
         user_name = self.settings.user_name if hasattr(self.settings, 'user_name') else None
         
-        # Determine display name
-        display_name = timestamp
         if sender == "user" and user_name:
-            display_name = f"{user_name} • {timestamp}"
+            return f"{user_name} • {timestamp}"
         elif sender == "assistant" and ai_name:
-            display_name = f"{ai_name} • {timestamp}"
+            return f"{ai_name} • {timestamp}"
         elif sender == "user":
-            display_name = f"User • {timestamp}"
+            return f"User • {timestamp}"
         elif sender == "assistant":
-            display_name = f"Assistant • {timestamp}"
-        
-        # Message container
-        msg_container = ctk.CTkFrame(
-            self.chat_frame,
-            fg_color="transparent"
-        )
-        msg_container.pack(fill="x", pady=5, padx=10)
-        
+            return f"Assistant • {timestamp}"
+        return timestamp
+    
+    def _prepare_row(self, row: ctk.CTkFrame):
+        """Build the parts every row has, once; _build_row refills them
+        
+        Rows are pooled by the message list (prebuilt while idle and reused
+        for every message and chat after that), so the name label, the
+        bubble and its text and code parts are made here or as a message
+        first needs them, and only reset afterwards.
+        """
         # Inner container for timestamp and bubble
-        inner_container = ctk.CTkFrame(
-            msg_container,
-            fg_color="transparent"
-        )
-        inner_container.pack(
-            side="right" if sender == "user" else "left",
-            anchor="e" if sender == "user" else "w"
-        )
+        row._inner = ctk.CTkFrame(row, fg_color="transparent")
+        row._inner.pack(side="left", anchor="w", padx=10)
         
-        # Add timestamp/name label
-        time_label = ctk.CTkLabel(
-            inner_container,
-            text=display_name,
+        # Timestamp/name label
+        row._name_label = ctk.CTkLabel(
+            row._inner,
+            text="",
             text_color="gray",
             font=("Helvetica", 10)
         )
-        time_label.pack(
-            anchor="e" if sender == "user" else "w",
-            padx=15,
-            pady=(0, 2)
-        )
-        
-        # Calculate maximum width
-        max_width = min(self.container.winfo_width() * 0.7, 600)
+        row._name_label.pack(anchor="w", padx=15, pady=(0, 2))
         
         # Message bubble
-        bubble = ctk.CTkFrame(
-            inner_container,
-            fg_color="#404040" if sender == "user" else self.settings.theme_color,
+        row._bubble = ctk.CTkFrame(
+            row._inner,
+            fg_color=self.theme.color("accent"),
             corner_radius=15
         )
-        bubble.pack(anchor="e" if sender == "user" else "w")
+        row._bubble.pack(side="left", anchor="w")
+        self.theme.bind(row._bubble, "accent", "fg_color")
+        row._bubble_color = "accent"
+        row._message = None
+        row._text_parts = []
+        row._code_parts = []
+        row._texts = []  # (textbox, spans) shown, resized when the font changes
+        row._stream_text = None
+        row._stream_lines = None
+        self._bind_message_menu(row._bubble, row)
+        row._text_parts.append(self._make_text_part(row))
+    
+    def _build_row(self, row: ctk.CTkFrame, entry: Dict):
+        """Fill a message list row with a message's name label and bubble"""
+        sender = entry["sender"]
+        side, anchor = ("right", "e") if sender == "user" else ("left", "w")
+        row._message = entry["message"]
+        
+        row._inner.pack(side=side, anchor=anchor, padx=10)
+        row._name_label.configure(text=self._display_name(sender, entry["time"]))
+        row._name_label.pack(anchor=anchor, padx=15, pady=(0, 2))
+        
+        # Only assistant bubbles follow the theme colour
+        color = "user_bubble" if sender == "user" else "accent"
+        if row._bubble_color != color:
+            row._bubble.configure(fg_color=self.theme.color(color))
+            if color == "accent":
+                self.theme.bind(row._bubble, "accent", "fg_color")
+            else:
+                self.theme.unbind(row._bubble, "accent")
+            row._bubble_color = color
         
-        # Handle code blocks
-        if "```" in text:
-            self._handle_code_blocks(text, bubble, max_width)
-        else:
-            self._create_text_message(text, bubble, max_width)
+        # Calculate maximum width
+        max_width = self._bubble_width(self.message_list.viewport.winfo_width())
+        
+        # Markdown text and code blocks, in the parts the row already has
+        for part in row._text_parts + row._code_parts:
+            part.pack_forget()
+        row._texts = []
+        row._stream_text = None
+        used_text = used_code = 0
+        for kind, content in self._segments(entry):
+            if kind == "text":
+                if used_text == len(row._text_parts):
+                    row._text_parts.append(self._make_text_part(row))
+                part = row._text_parts[used_text]
+                used_text += 1
+                self._fill_text_part(part, content, max_width)
+                part.pack(padx=15, pady=10, fill="x")
+                row._texts.append((part._text, content))
+                row._stream_text = part._text
+            else:
+                if used_code == len(row._code_parts):
+                    row._code_parts.append(self._make_code_part(row))
+                part = row._code_parts[used_code]
+                used_code += 1
+                self._fill_code_part(part, content["text"], content["lang"])
+                part.pack(padx=15, pady=5, fill="x")
+        
+        # Spare parts are kept for the next message, up to a few
+        for parts, used in ((row._text_parts, used_text), (row._code_parts, used_code)):
+            for part in parts[used + MAX_SPARE_PARTS:]:
+                part.destroy()
+            del parts[used + MAX_SPARE_PARTS:]
         
         # Configure bubble padding
         bubble_pad = (max_width * 0.25, 10) if sender == "user" else (10, max_width * 0.25)
-        bubble.pack(side="right" if sender == "user" else "left", padx=bubble_pad)
-        
-        # Scroll to bottom
-        self.chat_frame.after_idle(self._scroll_to_bottom)
-    
-    def _handle_code_blocks(self, text: str, bubble: ctk.CTkFrame, max_width: int):
-        """Handle text with code blocks"""
-        segments = text.split("```")
-        for i, segment in enumerate(segments):
-            if i % 2 == 0:  # Regular text
-                if segment.strip():
-                    self._create_text_message(segment.strip(), bubble, max_width)
-            else:  # Code block
-                self._create_code_block(segment.strip(), bubble)
-    
-    def _create_text_message(self, text: str, bubble: ctk.CTkFrame, max_width: int):
-        """Create a regular text message"""
+        row._bubble.pack(side=side, anchor=anchor, padx=bubble_pad)
+        
+        row._stream_lines = None
+        if entry.get("streaming"):
+            row._stream_lines = LineCounter(self.theme.message_family, self.theme.message_size,
+                                            int(max_width - 40))
+            row._stream_lines.feed(entry["text"])
+    
+    def _resize_row(self, row: ctk.CTkFrame, entry: Dict) -> bool:
+        """Fit a row's textboxes to the message font, which they already show
+        (it's a named font); a streaming row is rebuilt instead"""
+        if entry.get("streaming"):
+            return False
+        max_width = self._bubble_width(self.message_list.viewport.winfo_width())
+        family, size = self.theme.message_family, self.theme.message_size
+        for text_widget, spans in row._texts:
+            height = spans_height(spans, family, size, int(max_width - 40))
+            if height != text_widget.cget("height"):
+                text_widget.configure(height=height)
+        return True
+    
+    def _extend_row(self, row: ctk.CTkFrame, entry: Dict, text: str) -> bool:
+        """Append streamed text to a row's textbox instead of rebuilding the row"""
+        lines = getattr(row, "_stream_lines", None)
+        if lines is None or not entry.get("streaming"):
+            return False
+        text_widget = row._stream_text
+        text_widget._textbox.configure(state="normal")
+        text_widget._textbox.insert("end-1c", text)
+        text_widget._textbox.configure(state="disabled")
+        # Resized only when the text wraps onto another line
+        height = lines.feed(text)
+        if height != text_widget.cget("height"):
+            text_widget.configure(height=height)
+        return True
+    
+    def _show_message_menu(self, event, message: Dict):
+        """Offer to edit a user message or regenerate a reply"""
+        if message is None:
+            return None
+        menu = tk.Menu(self.container, tearoff=0)
+        if message["role"] == "user" and self.on_edit_message:
+            menu.add_command(label="Edit and resend", command=lambda: self.on_edit_message(message))
+        elif message["role"] == "assistant" and self.on_regenerate:
+            menu.add_command(label="Regenerate", command=lambda: self.on_regenerate(message))
+        else:
+            return None
+        menu.tk_popup(event.x_root, event.y_root)
+        return "break"
+    
+    def _bind_message_menu(self, widget, row: ctk.CTkFrame):
+        """Right-click menu on a part of a row's bubble and everything inside it,
+        for whichever message the row shows when it's clicked"""
+        def show_menu(event):
+            return self._show_message_menu(event, row._message)
+        
+        button = "<Button-2>" if sys.platform == "darwin" else "<Button-3>"
+        widgets = [widget]
+        while widgets:
+            current = widgets.pop()
+            # CTk widgets forward bind() to their canvas, which is visited as a child
+            if not isinstance(current, ctk.CTkBaseClass):
+                current.bind(button, show_menu, add="+")
+            widgets.extend(current.winfo_children())
+    
+    def _make_text_part(self, row: ctk.CTkFrame) -> ctk.CTkFrame:
+        """A text part for a row's bubble: a textbox in a container"""
         # Create a container frame for the text
         container = ctk.CTkFrame(
-            bubble,
-            fg_color="transparent",
-            width=max_width - 40
+            row._bubble,
+            fg_color="transparent"
         )
-        container.pack(padx=15, pady=10, fill="x")
         container.grid_columnconfigure(0, weight=1)
         
-        # Create the text widget with proper font settings from settings
         text_widget = ctk.CTkTextbox(
             container,
             wrap="word",
             activate_scrollbars=False,
             fg_color="transparent",
-            border_width=0,
-            width=max_width - 40,
-            height=1,  # Start with minimal height
-            font=(self.settings.message_font_family, self.settings.message_font_size)  # Use settings font!
+            border_width=0
         )
         text_widget.grid(row=0, column=0, sticky="ew")
-        
-        # Insert text
-        text_widget.insert("1.0", text.strip())
-        
-        # Update widget to calculate proper size
-        text_widget.update_idletasks()
-        
-        # Get the actual content height using the correct font metrics
-        content_height = text_widget._textbox.count("1.0", "end", "displaylines")[0] + 1
-        line_height = self.settings.message_font_size + 4  # Base line height on font size
-        
-        # Set the height to match content exactly
-        final_height = (content_height * line_height) + 1
-        text_widget.configure(height=final_height)
+        # The shared message font: a font change restyles the text in Tk
+        text_widget._textbox.configure(font=self.theme.font("message"))
+        self._configure_markdown_tags(text_widget)
         text_widget.configure(state="disabled")
+        container._text = text_widget
+        self._bind_message_menu(container, row)
+        return container
     
-    def _create_code_block(self, code: str, bubble: ctk.CTkFrame):
-        """Create a code block"""
+    def _fill_text_part(self, part: ctk.CTkFrame, spans: list, max_width: int):
+        """Show a text part of a message from its markdown (text, tags) spans"""
+        text_widget = part._text
+        # Height worked out from font metrics (cached), so no layout pass is forced
+        family, size = self.theme.message_family, self.theme.message_size
+        width = max_width - 40
+        height = spans_height(spans, family, size, int(width))
+        if (width, height) != (text_widget.cget("width"), text_widget.cget("height")):
+            part.configure(width=width)
+            text_widget.configure(width=width, height=height)
+        
+        # Insert text, without the last newline (the widget has its own)
+        args = []
+        for text, tags in spans:
+            args += [text, tags]
+        textbox = text_widget._textbox
+        textbox.configure(state="normal")
+        textbox.delete("1.0", "end")
+        if args:
+            args[-2] = args[-2][:-1] if args[-2].endswith("\n") else args[-2]
+            textbox.insert("1.0", *args)
+        textbox.configure(state="disabled")
+    
+    def _configure_markdown_tags(self, text_widget: ctk.CTkTextbox):
+        """Styles of the markdown tags (see markdown.py), in the theme's named fonts"""
+        theme = self.theme
+        textbox = text_widget._textbox
+        textbox.tag_configure("bold", font=theme.font("message_bold"))
+        textbox.tag_configure("italic", font=theme.font("message_italic"))
+        textbox.tag_configure("inline_code", font=theme.font("code"), background=theme.color("code_bg"))
+        for level in (1, 2, 3):
+            textbox.tag_configure(f"h{level}", font=theme.font(f"h{level}"))
+        textbox.tag_configure("table", font=theme.font("code"))
+        textbox.tag_configure("quote", foreground=theme.color("muted"), lmargin1=10, lmargin2=10)
+        textbox.tag_configure("link", foreground=theme.color("link"), underline=True)
+        textbox.tag_configure("rule", foreground=theme.color("muted"))
+        # Created after "table", so a header row gets this font
+        textbox.tag_configure("table_header", font=theme.font("code_bold"))
+    
+    def _make_code_part(self, row: ctk.CTkFrame) -> ctk.CTkFrame:
+        """A code block part for a row's bubble"""
         code_frame = ctk.CTkFrame(
-            bubble,
-            fg_color="#2b2b2b",
+            row._bubble,
+            fg_color=self.theme.color("code_bg"),
             corner_radius=8
         )
-        code_frame.pack(padx=15, pady=5, fill="x")
         
         code_text = ctk.CTkTextbox(
             code_frame,
-            fg_color="#2b2b2b",
-            text_color="#e6e6e6",
-            font=("Courier", 12),
+            fg_color=self.theme.color("code_bg"),
+            text_color=self.theme.color("code_text"),
             height=100,
             wrap="none"
         )
         code_text.pack(padx=10, pady=10, fill="x")
-        code_text.insert("1.0", code)
+        code_text._textbox.configure(font=self.theme.font("code"))
         code_text.configure(state="disabled")
+        self.highlighter.configure_tags(code_text._textbox)
+        code_frame._text = code_text
+        self._bind_message_menu(code_frame, row)
+        return code_frame
+    
+    def _fill_code_part(self, part: ctk.CTkFrame, code: str, lang: str = ""):
+        """Show a code block, highlighted once its tokens are known"""
+        code_text = part._text
+        textbox = code_text._textbox
+        textbox.configure(state="normal")
+        textbox.delete("1.0", "end")
+        textbox.insert("1.0", code)
+        textbox.configure(state="disabled")
+        self.highlighter.highlight(textbox, code, lang)
         
         # Adjust height based on content
+        height = self._code_height(code)
+        if height != code_text.cget("height"):
+            code_text.configure(height=height)
+    
+    def _code_height(self, code: str) -> int:
+        """Code blocks don't wrap: a fixed height per line, up to a limit"""
         line_count = len(code.split('\n'))
-        code_text.configure(height=min(line_count * 20, 300))
+        return min(line_count * 20, 300)
     
     def _scroll_to_bottom(self):
         """Scroll chat to the bottom"""
-        try:
-            self.chat_frame._parent_canvas.yview_moveto(1.0)
-        except:
-            pass 
-    
-    def update_theme_color(self, color: str):
-        """Update theme color for all assistant message bubbles and progress bar"""
-        # Update all assistant message bubbles
-        for container in self.chat_frame.winfo_children():
-            if isinstance(container, ctk.CTkFrame):
-                # Get the inner container that holds the bubble
-                inner_container = next((child for child in container.winfo_children() 
-                                     if isinstance(child, ctk.CTkFrame)), None)
-                if inner_container:
-                    # Get the message bubble
-                    bubble = next((child for child in inner_container.winfo_children() 
-                                if isinstance(child, ctk.CTkFrame) 
-                                and child.cget("fg_color") != "transparent"), None)
-                    if bubble:
-                        # Only update assistant messages (not user messages which are #404040)
-                        if bubble.cget("fg_color") != "#404040":
-                            bubble.configure(fg_color=color)
-        
-        # Update progress bar color
-        if hasattr(self, 'progress_bar'):
-            self.progress_bar.configure(progress_color=color)
-    
-    def update_font_settings(self, font_family: str = None, font_size: int = None):
-        """Update font settings for all message bubbles"""
-        # Update all text widgets in message bubbles
-        for container in self.chat_frame.winfo_children():
-            if isinstance(container, ctk.CTkFrame):
-                # Navigate through the widget hierarchy to find text widgets
-                inner_container = next((child for child in container.winfo_children() 
-                                     if isinstance(child, ctk.CTkFrame)), None)
-                if inner_container:
-                    bubble = next((child for child in inner_container.winfo_children() 
-                                if isinstance(child, ctk.CTkFrame)), None)
-                    if bubble:
-                        # Find the text container inside the bubble
-                        text_container = next((child for child in bubble.winfo_children() 
-                                            if isinstance(child, ctk.CTkFrame)), None)
-                        if text_container:
-                            # Find and update the text widget
-                            text_widget = next((child for child in text_container.winfo_children() 
-                                             if isinstance(child, ctk.CTkTextbox)), None)
-                            if text_widget:
-                                # Update font settings
-                                current_font = text_widget.cget("font")
-                                new_family = font_family if font_family else current_font[0]
-                                new_size = font_size if font_size else current_font[1]
-                                
-                                # Configure new font
-                                text_widget.configure(font=(new_family, new_size))
-                                
-                                # Recalculate height based on new font
-                                text_widget.update_idletasks()
-                                content_height = text_widget._textbox.count("1.0", "end", "displaylines")[0] + 1
-                                line_height = new_size + 4
-                                final_height = (content_height * line_height) + 1
-                                text_widget.configure(height=final_height) 
+        self.message_list.scroll_to_bottom()
     
     def _show_loading(self):
         """Show loading indicator and disable sidebar"""
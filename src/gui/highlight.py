@@ -0,0 +1,228 @@
+import hashlib
+import itertools
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from pygments.lexers import get_lexer_by_name, guess_lexer
+    from pygments.token import Token
+    from pygments.util import ClassNotFound
+except ImportError:  # Optional - code blocks are shown uncoloured
+    Token = None
+
+# Lines lexed before the spans found so far are handed to the UI, so the
+# top of a huge block (the part on screen) is coloured first
+CHUNK_LINES = 300
+
+# Spans tagged per UI callback, and how often results are picked up
+SPANS_PER_BATCH = 1500
+POLL_MS = 15
+
+# Highlighted blocks kept before the cache is started over
+MAX_CACHED_BLOCKS = 500
+
+# Colours for token types, on the dark code block background; a token
+# gets the colour of its closest listed type
+TOKEN_COLORS = {
+    ("Keyword",): "#c678dd",
+    ("Keyword", "Constant"): "#d19a66",
+    ("Name", "Builtin"): "#56b6c2",
+    ("Name", "Function"): "#61afef",
+    ("Name", "Class"): "#e5c07b",
+    ("Name", "Decorator"): "#e5c07b",
+    ("Name", "Tag"): "#e06c75",
+    ("Name", "Attribute"): "#d19a66",
+    ("Literal", "String"): "#98c379",
+    ("Literal", "Number"): "#d19a66",
+    ("Comment",): "#7f848e",
+    ("Operator", "Word"): "#c678dd",
+    ("Generic", "Inserted"): "#98c379",
+    ("Generic", "Deleted"): "#e06c75",
+    ("Generic", "Heading"): "#61afef",
+}
+
+# Spans are (tag, line, column, end line, end column), lines counted from
+# 1 at the first line of the code
+Span = Tuple[str, int, int, int, int]
+
+
+def tag_name(token_type: tuple) -> str:
+    return "tok_" + "_".join(token_type)
+
+
+def _tag_for(token_type, tags: Dict) -> Optional[str]:
+    """Tag of a Pygments token type, from the closest type with a colour"""
+    tag = tags.get(token_type, False)
+    if tag is not False:
+        return tag
+    found = None
+    current = token_type
+    while current:
+        if tuple(current) in TOKEN_COLORS:
+            found = tag_name(tuple(current))
+            break
+        current = current.parent
+    tags[token_type] = found
+    return found
+
+
+class Highlighter:
+    """Colours code blocks with Pygments without blocking the UI
+
+    Lexing runs on a worker thread; the spans it finds come back through
+    a queue that the UI thread polls, and are applied as text tags a batch
+    per callback. Finished blocks are cached by a hash of their language
+    and code, so a block shown again (scrolled back into view, chat
+    reopened) is tagged without lexing.
+
+    Each call gets a generation number, remembered per place (widget and
+    start index): a code part reused for another block starts a new one,
+    and spans still coming in for the old block are dropped.
+    """
+
+    def __init__(self, widget):
+        self.widget = widget  # For after()
+        self.enabled = Token is not None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._results = queue.Queue()  # (job, spans, done) from the worker
+        self._jobs: List[Dict] = []  # Jobs with spans left to apply
+        self._cache: Dict[str, List[Span]] = {}
+        self._token_tags: Dict = {}  # Token type -> tag, worker thread only
+        self._lexing = 0  # Jobs given to the worker and not finished yet
+        self._polling = False
+        self._generation = itertools.count(1)
+        self._latest: Dict[Tuple[str, str], int] = {}  # (widget, start) -> newest generation
+
+    def configure_tags(self, text: tk.Text):
+        """Create the token tags on a text widget (above its other tags)"""
+        for token_type, color in TOKEN_COLORS.items():
+            text.tag_configure(tag_name(token_type), foreground=color)
+
+    def highlight(self, text: tk.Text, code: str, lang: str = "", start: str = "1.0"):
+        """Colour code, shown in text from the line at index (or mark) start on"""
+        if not self.enabled or not code.strip():
+            return
+        key = hashlib.sha256(f"{lang}\0{code}".encode("utf-8")).hexdigest()
+        place = (str(text), start)
+        generation = next(self._generation)
+        self._latest[place] = generation
+        job = {"text": text, "start": start, "first_line": code.split("\n", 1)[0],
+               "place": place, "generation": generation,
+               "spans": [], "done": False, "queued": False}
+        cached = self._cache.get(key)
+        if cached is not None:
+            job.update(spans=list(cached), done=True, queued=True)
+            self._jobs.append(job)
+        else:
+            self._lexing += 1
+            self._executor.submit(self._lex, job, key, code, lang)
+        self._schedule()
+
+    def _lex(self, job: Dict, key: str, code: str, lang: str):
+        """Worker thread: tokenize, handing spans over every CHUNK_LINES lines"""
+        try:
+            try:
+                lexer = get_lexer_by_name(lang, stripnl=False, ensurenl=False) if lang else None
+            except ClassNotFound:
+                lexer = None
+            if lexer is None:
+                lexer = guess_lexer(code, stripnl=False, ensurenl=False)
+            if lexer.name == "Text only":
+                self._results.put((job, [], True))
+                return
+
+            found: List[Span] = []
+            spans: List[Span] = []
+            line, column = 1, 0
+            handed_over = CHUNK_LINES
+            for token_type, value in lexer.get_tokens(code):
+                newlines = value.count("\n")
+                if newlines:
+                    end_line, end_column = line + newlines, len(value) - value.rfind("\n") - 1
+                else:
+                    end_line, end_column = line, column + len(value)
+                tag = _tag_for(token_type, self._token_tags)
+                if tag is not None and value.strip():
+                    if spans and spans[-1][0] == tag and spans[-1][3:] == (line, column):
+                        # Continues the previous span (e.g. the parts of a string)
+                        spans[-1] = spans[-1][:3] + (end_line, end_column)
+                    else:
+                        spans.append((tag, line, column, end_line, end_column))
+                line, column = end_line, end_column
+                if line > handed_over:
+                    self._results.put((job, spans, False))
+                    found += spans
+                    spans = []
+                    handed_over += CHUNK_LINES
+            found += spans
+            self._results.put((job, spans, True))
+            if len(self._cache) >= MAX_CACHED_BLOCKS:
+                self._cache.clear()
+            self._cache[key] = found
+        except Exception as e:
+            print(f"Error highlighting code: {e}")
+            self._results.put((job, [], True))
+
+    def _schedule(self):
+        if not self._polling:
+            self._polling = True
+            self.widget.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        """UI thread: collect results and apply the next batch of spans"""
+        self._polling = False
+        while True:
+            try:
+                job, spans, done = self._results.get_nowait()
+            except queue.Empty:
+                break
+            job["spans"] += spans
+            if done:
+                job["done"] = True
+                self._lexing -= 1
+            if not job["queued"]:
+                job["queued"] = True
+                self._jobs.append(job)
+
+        budget = SPANS_PER_BATCH
+        for job in list(self._jobs):
+            if budget <= 0:
+                break
+            batch, job["spans"] = job["spans"][:budget], job["spans"][budget:]
+            budget -= len(batch)
+            self._apply(job, batch)
+            if not job["spans"] and job["done"]:
+                self._jobs.remove(job)
+                if self._latest.get(job["place"]) == job["generation"]:
+                    del self._latest[job["place"]]
+
+        if self._jobs or self._lexing:
+            self._schedule()
+
+    def _apply(self, job: Dict, spans: List[Span]):
+        """Tag spans, one tag_add call per tag"""
+        text = job["text"]
+        if self._latest.get(job["place"]) != job["generation"]:
+            job["spans"] = []  # Another block has been shown there since
+            return
+        try:
+            if not text.winfo_exists():
+                job["spans"] = []
+                return
+            start = text.index(job["start"])
+            # The code may have been redrawn or removed since
+            if text.get(start, f"{start} lineend") != job["first_line"]:
+                job["spans"] = []
+                return
+        except tk.TclError:
+            job["spans"] = []
+            return
+        base = int(start.split(".")[0]) - 1
+        ranges: Dict[str, list] = {}
+        for tag, line, column, end_line, end_column in spans:
+            ranges.setdefault(tag, []).extend(
+                (f"{base + line}.{column}", f"{base + end_line}.{end_column}"))
+        for tag, indices in ranges.items():
+            text.tag_add(tag, *indices)
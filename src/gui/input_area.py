@@ -2,10 +2,11 @@
 from typing import Callable
 
 class InputArea:
-    def __init__(self, parent: ctk.CTkFrame, settings, send_callback: Callable):
+    def __init__(self, parent: ctk.CTkFrame, settings, send_callback: Callable, theme):
         self.parent = parent
         self.settings = settings
         self.send_callback = send_callback
+        self.theme = theme
         self.setup_ui()
         self._setup_bindings()
     
@@ -49,10 +50,11 @@ def _setup_input_row(self):
             width=100,
             height=40,
             command=self.send_callback,
-            fg_color=self.settings.theme_color,
+            fg_color=self.theme.color("accent"),
             hover_color="#000000"
         )
         self.send_button.grid(row=0, column=2, padx=5)
+        self.theme.bind(self.send_button, "accent", "fg_color")
     
     def _setup_bindings(self):
         """Setup input field bindings"""
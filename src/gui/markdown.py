@@ -0,0 +1,291 @@
+import hashlib
+import re
+from typing import Dict, List, Tuple
+
+# A small Markdown reader for assistant replies. Text is split into blocks
+# (paragraphs, headings, lists, quotes, tables, rules and fenced code),
+# and each block into spans of (text, tags); renderers map the tag names
+# to text widget tags:
+#
+#   h1 h2 h3        heading levels (h4-h6 are shown as h3)
+#   bold italic     emphasis
+#   inline_code     `code` inside a line
+#   link            the text of [text](url)
+#   list quote rule
+#   table table_header  a table drawn as monospace lines, and its first row
+#   code            a fenced code block (one span; see the block's lang)
+
+FENCE = re.compile(r"^\s*```\s*([^`\s]*)")
+HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)(\s+#+)?\s*$")
+BULLET = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+ORDERED = re.compile(r"^(\s*)(\d{1,9})[.)]\s+(.*)$")
+QUOTE = re.compile(r"^\s{0,3}>\s?(.*)$")
+RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+INLINE = re.compile(
+    r"(?P<code>`[^`\n]+`)"
+    r"|(?P<bold>\*\*[^\n]+?\*\*|__[^\n]+?__)"
+    r"|(?P<italic>\*[^*\s][^*\n]*?\*|(?<!\w)_[^_\s][^_\n]*?_(?!\w))"
+    r"|(?P<link>\[[^\]\n]+\]\([^)\s]+\))"
+)
+
+# Extra points over the message font for each heading level
+HEADING_SIZES = {1: 8, 2: 5, 3: 2}
+
+# Parsed replies kept before the cache is started over
+MAX_CACHED_PARSES = 2000
+
+_parse_cache: Dict[str, List[Dict]] = {}
+
+
+def heading_size(size: int, level: int) -> int:
+    return size + HEADING_SIZES.get(min(level, 3), 0)
+
+
+def _starts_block(line: str, next_line: str = None) -> bool:
+    """True if line can't continue a paragraph"""
+    return bool(FENCE.match(line) or HEADING.match(line) or BULLET.match(line)
+                or ORDERED.match(line) or QUOTE.match(line) or RULE.match(line)
+                or _is_table(line, next_line))
+
+
+def _is_table(line: str, next_line: str) -> bool:
+    return "|" in line and next_line is not None and "|" in next_line and bool(TABLE_SEPARATOR.match(next_line))
+
+
+def _cells(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+
+def parse_blocks(text: str) -> List[Dict]:
+    """Split markdown into blocks (not cached; see parse)"""
+    blocks = []
+    lines = text.split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        next_line = lines[i + 1] if i + 1 < len(lines) else None
+
+        fence = FENCE.match(line)
+        if fence:
+            body = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith("```"):
+                body.append(lines[i])
+                i += 1
+            # An unclosed fence (a reply still streaming) runs to the end
+            blocks.append({"kind": "code", "lang": fence.group(1).lower(), "text": "\n".join(body),
+                           "closed": i < len(lines)})
+            i += 1
+            continue
+
+        if not line.strip():
+            i += 1
+            continue
+
+        heading = HEADING.match(line)
+        if heading:
+            blocks.append({"kind": "heading", "level": len(heading.group(1)), "text": heading.group(2)})
+            i += 1
+            continue
+
+        if RULE.match(line):
+            blocks.append({"kind": "rule"})
+            i += 1
+            continue
+
+        if _is_table(line, next_line):
+            rows = [_cells(line)]
+            i += 2
+            while i < len(lines) and "|" in lines[i] and lines[i].strip():
+                rows.append(_cells(lines[i]))
+                i += 1
+            blocks.append({"kind": "table", "rows": rows})
+            continue
+
+        if BULLET.match(line) or ORDERED.match(line):
+            items = []
+            while i < len(lines) and lines[i].strip():
+                bullet, ordered = BULLET.match(lines[i]), ORDERED.match(lines[i])
+                if bullet:
+                    items.append((len(bullet.group(1)) // 2, "•", bullet.group(2)))
+                elif ordered:
+                    items.append((len(ordered.group(1)) // 2, ordered.group(2) + ".", ordered.group(3)))
+                elif items and not _starts_block(lines[i]):
+                    # Continuation of the item above
+                    level, marker, item_text = items[-1]
+                    items[-1] = (level, marker, item_text + " " + lines[i].strip())
+                else:
+                    break
+                i += 1
+            blocks.append({"kind": "list", "items": items})
+            continue
+
+        if QUOTE.match(line):
+            quoted = []
+            while i < len(lines) and QUOTE.match(lines[i]):
+                quoted.append(QUOTE.match(lines[i]).group(1))
+                i += 1
+            blocks.append({"kind": "quote", "text": "\n".join(quoted)})
+            continue
+
+        paragraph = [line]
+        i += 1
+        while i < len(lines) and lines[i].strip() and not _starts_block(
+                lines[i], lines[i + 1] if i + 1 < len(lines) else None):
+            paragraph.append(lines[i])
+            i += 1
+        blocks.append({"kind": "paragraph", "text": "\n".join(paragraph)})
+    return blocks
+
+
+def parse(text: str) -> List[Dict]:
+    """Blocks of a whole reply, cached by content hash; don't modify them"""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    blocks = _parse_cache.get(key)
+    if blocks is None:
+        blocks = parse_blocks(text)
+        if len(_parse_cache) >= MAX_CACHED_PARSES:
+            _parse_cache.clear()
+        _parse_cache[key] = blocks
+    return blocks
+
+
+def plain_blocks(text: str) -> List[Dict]:
+    """Text and code blocks only, split on fences (for user messages)"""
+    blocks = []
+    for i, segment in enumerate(text.split("```")):
+        segment = segment.strip()
+        if not segment:
+            continue
+        if i % 2 == 0:  # Regular text
+            blocks.append({"kind": "text", "text": segment})
+        else:  # Code block
+            blocks.append({"kind": "code", "lang": "", "text": segment, "closed": True})
+    return blocks
+
+
+def inline_spans(text: str, tags: Tuple = ()) -> List[Tuple[str, Tuple]]:
+    """Split a line of markdown into (text, tags) by emphasis, code and links"""
+    spans = []
+    position = 0
+    for match in INLINE.finditer(text):
+        if match.start() > position:
+            spans.append((text[position:match.start()], tags))
+        token = match.group(0)
+        if match.group("code"):
+            spans.append((token[1:-1], tags + ("inline_code",)))
+        elif match.group("bold"):
+            spans += inline_spans(token[2:-2], tags + ("bold",))
+        elif match.group("italic"):
+            spans += inline_spans(token[1:-1], tags + ("italic",))
+        else:
+            label = token[1:token.index("](")]
+            spans.append((label, tags + ("link",)))
+        position = match.end()
+    if position < len(text):
+        spans.append((text[position:], tags))
+    return spans
+
+
+def block_spans(block: Dict, first: bool = True) -> List[Tuple[str, Tuple]]:
+    """(text, tags) pairs for a block, ending in a newline
+
+    Blocks after the first start with an empty line to separate them.
+    """
+    spans = [] if first else [("\n", ())]
+    kind = block["kind"]
+    if kind == "code":
+        spans.append((block["text"] + "\n", ("code",)))
+    elif kind == "text":
+        spans.append((block["text"] + "\n", ()))
+    elif kind == "paragraph":
+        spans += inline_spans(block["text"])
+        spans.append(("\n", ()))
+    elif kind == "heading":
+        spans += inline_spans(block["text"], (f"h{min(block['level'], 3)}",))
+        spans.append(("\n", ()))
+    elif kind == "quote":
+        spans += inline_spans(block["text"], ("quote",))
+        spans.append(("\n", ()))
+    elif kind == "rule":
+        spans.append(("─" * 24 + "\n", ("rule",)))
+    elif kind == "list":
+        for level, marker, text in block["items"]:
+            spans.append(("    " * level + marker + " ", ("list",)))
+            spans += inline_spans(text, ("list",))
+            spans.append(("\n", ()))
+    elif kind == "table":
+        spans += _table_spans(block["rows"])
+    return spans
+
+
+def _table_spans(rows: List[List[str]]) -> List[Tuple[str, Tuple]]:
+    """A table as aligned monospace lines, header in bold"""
+    columns = max(len(row) for row in rows)
+    rows = [row + [""] * (columns - len(row)) for row in rows]
+    # Cells are shown without their markdown
+    rows = [["".join(text for text, _ in inline_spans(cell)) for cell in row] for row in rows]
+    widths = [max(len(row[c]) for row in rows) for c in range(columns)]
+
+    def line(row):
+        return " │ ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() + "\n"
+
+    spans = [(line(rows[0]), ("table", "table_header"))]
+    spans.append(("─┼─".join("─" * width for width in widths) + "\n", ("table",)))
+    for row in rows[1:]:
+        spans.append((line(row), ("table",)))
+    return spans
+
+
+def _stable_boundary(text: str) -> int:
+    """Offset just past the last blank line outside a code fence (0 if none)
+
+    Everything before it is complete: text streamed in later can only
+    start new blocks, not change the ones there.
+    """
+    boundary = 0
+    in_fence = False
+    offset = 0
+    lines = text.split("\n")
+    for i, line in enumerate(lines[:-1]):  # The last line may be unfinished
+        offset += len(line) + 1
+        if FENCE.match(line):
+            in_fence = not in_fence
+            if not in_fence:
+                boundary = offset  # After a closing fence
+        elif not in_fence and not line.strip() and i > 0:
+            boundary = offset
+    return boundary
+
+
+class IncrementalMarkdown:
+    """Parses a reply as it streams in, re-reading only its unfinished tail
+
+    Blocks before the last stable boundary (a blank line or closing fence)
+    are parsed once and kept; each feed parses just the text after it.
+    """
+
+    def __init__(self):
+        self.stable_blocks: List[Dict] = []
+        self.stable_length = 0  # Characters of the reply they cover
+
+    def feed(self, text: str) -> Tuple[int, List[Dict]]:
+        """Blocks of text so far, and how many of them were already stable
+
+        Blocks before that count are unchanged since the last feed, so a
+        renderer only has to redraw from there on.
+        """
+        drawn = len(self.stable_blocks)
+        tail = text[self.stable_length:]
+        boundary = _stable_boundary(tail)
+        if boundary:
+            self.stable_blocks += parse_blocks(tail[:boundary])
+            self.stable_length += boundary
+            tail = tail[boundary:]
+        return drawn, self.stable_blocks + parse_blocks(tail)
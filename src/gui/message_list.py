@@ -0,0 +1,417 @@
+import customtkinter as ctk
+import sys
+import time
+from bisect import bisect_right
+from typing import Callable, Dict, List
+
+# Space kept between bubbles, and rows rendered above and below the view
+MESSAGE_GAP = 10
+OVERSCAN_PX = 400
+
+# Height of the shortest row (a one-line message), which bounds how many
+# rows can be near the view at once; that many are built ahead and pooled
+MIN_ROW_HEIGHT = 80
+
+# Pixels scrolled per mouse wheel step
+SCROLL_STEP = 60
+
+# Longest stretch spent estimating heights again after a reflow before
+# the event loop gets a turn
+REFLOW_SLICE_MS = 8
+
+
+class VirtualMessageList(ctk.CTkFrame):
+    """Scrolling list of chat messages with widgets only near the viewport
+
+    Each message is an entry with a height: estimated until its bubble has
+    been shown, then the height Tk actually gave it. Only entries within
+    OVERSCAN_PX of the view have a row widget; rows scrolled away are put
+    back in a pool and refilled for the next message coming into view,
+    also after the entries are replaced (another chat). The pool holds
+    as many rows as fit the view and its overscan, and is filled while
+    idle. A new row gets its fixed parts from ``prepare_row(row)`` and its
+    content for a message from ``build_row(row, entry)``, which reuses
+    what the row already has, so the list only knows about heights and
+    positions. Entries marked
+    "streaming" are still growing at the bottom (see extend_last).
+    """
+
+    def __init__(self, master, build_row: Callable, estimate_height: Callable,
+                 on_reach_top: Callable = None, prepare_row: Callable = None,
+                 extend_row: Callable = None, resize_row: Callable = None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.build_row = build_row  # (row frame, entry) -> fills the row
+        self.prepare_row = prepare_row  # (row frame) -> builds its fixed parts, once
+        self.estimate_height = estimate_height  # (entry, width) -> pixels
+        # (row frame, entry, added text) -> True if the row showed it in place
+        self.extend_row = extend_row
+        # (row frame, entry) -> True if the row took a reflow in place
+        self.resize_row = resize_row
+        self.on_reach_top = on_reach_top
+
+        self.entries: List[Dict] = []
+        self._tops: List[int] = []  # Top of each entry, recomputed when heights change
+        self._layout_dirty = False
+        self._offset = 0  # Pixels scrolled from the top
+        self._follow = True  # Keep showing the newest message as more arrive
+        self._bound: Dict[int, ctk.CTkFrame] = {}  # Entry index -> row showing it
+        self._pool: List[ctk.CTkFrame] = []
+        self._width = 0
+        self._check_pending = False
+        self._resize_job = None
+        self._prewarm_job = None
+        # Entries estimated before the last reflow are estimated again,
+        # from the newest down, a slice at a time
+        self._epoch = 0
+        self._reflow_next = -1
+        self._reflow_job = None
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.pack(side="left", fill="both", expand=True)
+        self.viewport.bind("<Configure>", self._on_resize)
+        self.bind_scroll(self.viewport)
+
+    # Entries
+
+    def set_entries(self, entries: List[Dict]):
+        """Replace every message, showing the newest"""
+        for index in list(self._bound):
+            self._release(index)
+        self.entries = []
+        self._reflow_next = -1
+        self.append_entries(entries)
+        self._follow = True
+        self._offset = self._content_height()
+        self._render()
+
+    def append_entries(self, entries: List[Dict]):
+        for entry in entries:
+            entry.setdefault("height", self.estimate_height(entry, self._width))
+            entry.setdefault("measured", False)
+            entry["epoch"] = self._epoch
+            self.entries.append(entry)
+        self._layout_dirty = True
+        if self._follow:
+            self._offset = self._content_height()
+        self._render()
+
+    def prepend_entries(self, entries: List[Dict]):
+        """Insert older messages above, keeping what is on screen in place"""
+        if not entries:
+            return
+        added = 0
+        for entry in entries:
+            entry.setdefault("height", self.estimate_height(entry, self._width))
+            entry.setdefault("measured", False)
+            entry["epoch"] = self._epoch
+            added += entry["height"] + MESSAGE_GAP
+        # Bound rows move down with their entries
+        self._bound = {index + len(entries): row for index, row in self._bound.items()}
+        for row in self._bound.values():
+            row._entry_index += len(entries)
+        self.entries[:0] = entries
+        if self._reflow_next >= 0:
+            self._reflow_next += len(entries)
+        self._layout_dirty = True
+        self._offset += added
+        self._render()
+
+    def refresh_entry(self, index: int):
+        """Rebuild one message's row after its content changed"""
+        if index < 0:
+            index += len(self.entries)
+        self._estimate(self.entries[index])
+        self._layout_dirty = True
+        if self._follow:
+            self._offset = self._content_height()
+        row = self._bound.get(index)
+        if row is not None:
+            self._fill(row, index)
+        self._render()
+
+    def extend_last(self, chars: str):
+        """Add text to the newest message, e.g. a reply as it streams in
+
+        A row on screen is asked to append the text to what it shows (its
+        <Configure> then reports any growth); only if it can't is it rebuilt.
+        """
+        if not self.entries:
+            return
+        index = len(self.entries) - 1
+        self.entries[index]["text"] += chars
+        row = self._bound.get(index)
+        if row is not None and self.extend_row and self.extend_row(row, self.entries[index], chars):
+            return
+        self.refresh_entry(index)
+
+    def clear(self):
+        self.set_entries([])
+
+    def rebuild(self, reestimate: bool = True):
+        """Rebuild every row on screen, e.g. after a width change"""
+        if reestimate:
+            self._epoch += 1
+            for entry in self.entries:
+                self._estimate(entry)
+            self._layout_dirty = True
+        for index in list(self._bound):
+            self._release(index)
+        if self._follow:
+            self._offset = self._content_height()
+        self._render()
+
+    def reflow(self):
+        """Message heights changed (e.g. the font): resize the rows on screen
+
+        Rows are asked to resize in place (resize_row), and rebuilt only if
+        they can't. Only their entries are estimated again right away; the
+        others are in the background, newest first (see _reflow_slice).
+        """
+        self._epoch += 1
+        for index, row in list(self._bound.items()):
+            entry = self.entries[index]
+            self._estimate(entry)
+            if not (self.resize_row and self.resize_row(row, entry)):
+                self._fill(row, index)
+        self._layout_dirty = True
+        if self._follow:
+            self._offset = self._content_height()
+        self._render()
+        self._reflow_next = len(self.entries) - 1
+        if self._reflow_job is None:
+            self._reflow_job = self.after(1, self._reflow_slice)
+
+    def _estimate(self, entry: Dict):
+        entry["height"] = self.estimate_height(entry, self._width)
+        entry["measured"] = False
+        entry["epoch"] = self._epoch
+
+    def _reflow_slice(self):
+        """Estimate entries from before the last reflow until the slice is used up"""
+        self._reflow_job = None
+        started = time.perf_counter()
+        self._layout()
+        shift = 0
+        while self._reflow_next >= 0:
+            index = self._reflow_next
+            self._reflow_next -= 1
+            entry = self.entries[index]
+            if entry["epoch"] == self._epoch:
+                continue
+            height = entry["height"]
+            self._estimate(entry)
+            if self._tops[index] + height <= self._offset:
+                # Above the view: shift so what is on screen stays put
+                shift += entry["height"] - height
+            if (time.perf_counter() - started) * 1000 >= REFLOW_SLICE_MS:
+                break
+        self._layout_dirty = True
+        if self._follow:
+            self._offset = self._content_height()
+        else:
+            self._offset += shift
+        self._render()
+        if self._reflow_next >= 0:
+            self._reflow_job = self.after(1, self._reflow_slice)
+
+    def bound_rows(self) -> List[ctk.CTkFrame]:
+        """Row widgets currently showing a message"""
+        return list(self._bound.values())
+
+    # Layout
+
+    def _layout(self):
+        if not self._layout_dirty:
+            return
+        tops = []
+        y = MESSAGE_GAP
+        for entry in self.entries:
+            tops.append(y)
+            y += entry["height"] + MESSAGE_GAP
+        self._tops = tops
+        self._layout_dirty = False
+
+    def _content_height(self) -> int:
+        self._layout()
+        if not self.entries:
+            return 0
+        return self._tops[-1] + self.entries[-1]["height"] + MESSAGE_GAP
+
+    def _on_resize(self, event):
+        if self._prewarm_job is None and event.height > 1:
+            self._prewarm_job = self.after(1, self._prewarm)
+        if event.width != self._width:
+            self._width = event.width
+            # Text rewraps; measure the rows again once resizing settles
+            if self._resize_job is not None:
+                self.after_cancel(self._resize_job)
+            self._resize_job = self.after(150, self._rewrap)
+        self._render()
+
+    def _rewrap(self):
+        self._resize_job = None
+        self.rebuild()
+
+    def _measured(self, row: ctk.CTkFrame, height: int):
+        """A row was laid out; adopt its real height"""
+        index = getattr(row, "_entry_index", None)
+        if index is None or self._bound.get(index) is not row:
+            return
+        entry = self.entries[index]
+        if height <= 1 or (entry["measured"] and entry["height"] == height):
+            return
+        self._layout()
+        delta = height - entry["height"]
+        entry["height"] = height
+        entry["measured"] = True
+        self._layout_dirty = True
+        if self._follow:
+            self._offset = self._content_height()
+        elif self._tops[index] < self._offset and not entry.get("streaming"):
+            # Grew above the view: shift so what is on screen stays put
+            # (a streaming message grows below its top, which stays put anyway)
+            self._offset += delta
+        self._render()
+
+    def _check_heights(self):
+        """Measure rows whose size didn't change (no <Configure> for them)"""
+        self._check_pending = False
+        for row in list(self._bound.values()):
+            self._measured(row, row.winfo_height())
+
+    # Rows
+
+    def _make_row(self) -> ctk.CTkFrame:
+        row = ctk.CTkFrame(self.viewport, fg_color="transparent")
+        row._entry_index = None
+        row.bind("<Configure>", lambda e: self._measured(row, e.height))
+        self.bind_scroll(row)
+        if self.prepare_row:
+            self.prepare_row(row)
+            for child in self._content(row):
+                self._bind_scroll_tree(child)
+        return row
+
+    def _capacity(self) -> int:
+        """Most rows that can be bound at once: the view and its overscan
+        filled with the shortest rows"""
+        height = max(self.viewport.winfo_height(), 1)
+        return (height + 2 * OVERSCAN_PX) // MIN_ROW_HEIGHT + 1
+
+    def _prewarm(self):
+        """Build pooled rows ahead, one per event loop turn, up to capacity"""
+        self._prewarm_job = None
+        if len(self._pool) + len(self._bound) < self._capacity():
+            self._pool.append(self._make_row())
+            self._prewarm_job = self.after(1, self._prewarm)
+
+    def _content(self, row: ctk.CTkFrame) -> list:
+        """Widgets built into a row (not the row's own canvas)"""
+        return [child for child in row.winfo_children() if child is not row._canvas]
+
+    def _fill(self, row: ctk.CTkFrame, index: int):
+        row._entry_index = index
+        self.build_row(row, self.entries[index])
+        # Parts the row just made for this message scroll the list too
+        for child in self._content(row):
+            self._bind_scroll_tree(child)
+
+    def _bind(self, index: int) -> ctk.CTkFrame:
+        if self.entries[index]["epoch"] != self._epoch:
+            self._estimate(self.entries[index])  # Not reached by the reflow yet
+            self._layout_dirty = True
+        row = self._pool.pop() if self._pool else self._make_row()
+        self._fill(row, index)
+        self._bound[index] = row
+        return row
+
+    def _release(self, index: int):
+        row = self._bound.pop(index)
+        row._entry_index = None
+        if len(self._pool) + len(self._bound) >= self._capacity():
+            row.destroy()  # More than the view can need (e.g. it was taller)
+            return
+        row.place_forget()
+        self._pool.append(row)
+
+    def _render(self):
+        """Bind rows to the entries near the view and position them"""
+        height = self.viewport.winfo_height()
+        if height <= 1:
+            return  # Not laid out yet
+        self._layout()
+        content_height = self._content_height()
+        self._offset = max(0, min(self._offset, content_height - height))
+        self._follow = self._offset >= content_height - height - 2
+
+        first = max(0, bisect_right(self._tops, self._offset - OVERSCAN_PX) - 1)
+        end = bisect_right(self._tops, self._offset + height + OVERSCAN_PX)
+
+        for index in [index for index in self._bound if not first <= index < end]:
+            self._release(index)
+        for index in range(first, end):
+            row = self._bound.get(index)
+            if row is None:
+                row = self._bind(index)
+                if not self._check_pending:
+                    # A reused row as tall as its last message gets no <Configure>
+                    self._check_pending = True
+                    self.after(50, self._check_heights)
+            row.place(x=0, y=self._tops[index] - self._offset, relwidth=1.0)
+
+        if content_height > height:
+            self.scrollbar.set(self._offset / content_height, (self._offset + height) / content_height)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # Scrolling
+
+    def scroll_to_bottom(self):
+        self._follow = True
+        self._offset = self._content_height()
+        self._render()
+
+    def _scroll_to(self, offset: int):
+        previous = self._offset
+        self._offset = int(offset)
+        self._render()
+        if self._offset <= 0 and offset < previous + 1 and self.on_reach_top:
+            self.on_reach_top()
+
+    def _on_scrollbar(self, action: str, amount, unit: str = None):
+        if action == "moveto":
+            self._scroll_to(float(amount) * self._content_height())
+        elif unit == "pages":
+            self._scroll_to(self._offset + int(amount) * self.viewport.winfo_height())
+        else:
+            self._scroll_to(self._offset + int(amount) * SCROLL_STEP)
+
+    def _on_mousewheel(self, event):
+        if event.num == 4:  # Linux scroll up
+            steps = -1
+        elif event.num == 5:  # Linux scroll down
+            steps = 1
+        else:  # Windows/macOS
+            steps = -1 if event.delta > 0 else 1
+        self._scroll_to(self._offset + steps * SCROLL_STEP)
+        return "break"
+
+    def bind_scroll(self, widget):
+        if sys.platform.startswith("win") or sys.platform == "darwin":
+            widget.bind("<MouseWheel>", self._on_mousewheel, add="+")
+        else:  # Linux
+            widget.bind("<Button-4>", self._on_mousewheel, add="+")
+            widget.bind("<Button-5>", self._on_mousewheel, add="+")
+
+    def _bind_scroll_tree(self, widget):
+        """Wheel over any part of a bubble scrolls the list (bound once per widget)"""
+        widgets = [widget]
+        while widgets:
+            current = widgets.pop()
+            # CTk widgets forward bind() to their canvas, which is visited as a child
+            if not isinstance(current, ctk.CTkBaseClass) and not getattr(current, "_scroll_bound", False):
+                self.bind_scroll(current)
+                current._scroll_bound = True
+            widgets.extend(current.winfo_children())
@@ -0,0 +1,109 @@
+import customtkinter as ctk
+from typing import Callable, Dict, List
+
+# Result rows shown (and kept as widgets, reused for every keystroke)
+VISIBLE_RESULTS = 10
+
+
+class QuickSwitcher(ctk.CTkToplevel):
+    """Ctrl+K palette: type part of a chat title or folder name, Enter to open it"""
+
+    def __init__(self, parent, title_index, on_select: Callable[[Dict], None]):
+        super().__init__(parent)
+        self.title("Go to chat")
+        self.title_index = title_index
+        self.on_select = on_select
+        self.results: List[Dict] = []
+        self.selected = 0
+
+        # Near the top of the main window, like a command palette
+        width, height = 460, 60 + VISIBLE_RESULTS * 30
+        x = parent.winfo_x() + (parent.winfo_width() - width) // 2
+        y = parent.winfo_y() + 80
+        self.geometry(f"{width}x{height}+{x}+{y}")
+        self.resizable(False, False)
+        self.transient(parent)
+
+        self.setup_ui()
+        self._setup_bindings()
+        self.after(50, self.entry.focus_force)
+
+    def setup_ui(self):
+        """Search field and a fixed set of result rows"""
+        self.query_var = ctk.StringVar()
+        self.entry = ctk.CTkEntry(
+            self,
+            textvariable=self.query_var,
+            placeholder_text="Search chats and folders..."
+        )
+        self.entry.pack(fill="x", padx=10, pady=(10, 5))
+
+        self.rows = []
+        for i in range(VISIBLE_RESULTS):
+            row = ctk.CTkButton(
+                self,
+                text="",
+                height=28,
+                anchor="w",
+                fg_color="transparent",
+                hover_color="#333333",
+                text_color="gray",
+                command=lambda i=i: self._open(i)
+            )
+            self.rows.append(row)
+
+        self.hint = ctk.CTkLabel(self, text="", text_color="gray")
+        self.hint.pack(pady=5)
+
+    def _setup_bindings(self):
+        self.query_var.trace_add("write", lambda *args: self._search())
+        self.entry.bind("<Down>", lambda e: self._move(1))
+        self.entry.bind("<Up>", lambda e: self._move(-1))
+        self.entry.bind("<Return>", lambda e: self._open(self.selected))
+        self.bind("<Escape>", lambda e: self.destroy())
+
+    def _search(self):
+        """Match on every keystroke; the index answers within a frame"""
+        query = self.query_var.get()
+        self.results = self.title_index.search(query, limit=VISIBLE_RESULTS)
+        self.selected = 0
+
+        if not query.strip():
+            self.hint.configure(text="")
+        elif not self.title_index.ready:
+            self.hint.configure(text="Still indexing chats...")
+        elif not self.results:
+            self.hint.configure(text="No matching chats")
+        else:
+            self.hint.configure(text="")
+        self._paint()
+
+    def _paint(self):
+        """Show the current results in the row widgets"""
+        for i, row in enumerate(self.rows):
+            if i >= len(self.results):
+                row.pack_forget()
+                continue
+            result = self.results[i]
+            icon = "📁" if result["kind"] == "folder" else "💬"
+            where = f"   — {result['folder']}" if result["folder"] else ""
+            row.configure(
+                text=f"{icon} {result['title']}{where}",
+                fg_color="#333333" if i == self.selected else "transparent",
+                text_color="white" if i == self.selected else "gray"
+            )
+            if not row.winfo_manager():
+                row.pack(fill="x", padx=10, before=self.hint)
+
+    def _move(self, step: int):
+        if self.results:
+            self.selected = (self.selected + step) % len(self.results)
+            self._paint()
+        return "break"
+
+    def _open(self, index: int):
+        if 0 <= index < len(self.results):
+            result = self.results[index]
+            self.destroy()
+            self.on_select(result)
+        return "break"
@@ -11,10 +11,13 @@ def __init__(self, parent):
         self.indicator = ctk.CTkLabel(
             self,
             text="●",
-            text_color=parent.settings.theme_color,
+            text_color=parent.theme.color("accent"),
             font=("Helvetica", 14)
         )
         self.indicator.pack(side="left", padx=5)
+        self.is_connected = True
+        # The indicator shows the theme colour while connected
+        parent.theme.on_change("accent", lambda: self.update_status(self.is_connected))
         
         self.text = ctk.CTkLabel(
             self,
@@ -25,8 +28,8 @@ def __init__(self, parent):
     
     def update_status(self, is_connected: bool):
         """Update connection status"""
-        # Always get current theme color directly from parent
-        current_color = self.parent.settings.theme_color
+        self.is_connected = is_connected
+        current_color = self.parent.theme.color("accent")
         
         # Update indicator color based on connection status
         if is_connected:
@@ -0,0 +1,56 @@
+import threading
+from typing import Callable, List
+
+# Default time between UI updates while text streams in (about 30 a second)
+FLUSH_INTERVAL_MS = 33
+
+
+class StreamSink:
+    """Batches streamed text into at most one UI update per interval
+
+    write() may be called from any thread (the API worker); it only adds
+    to a buffer. While the sink is open the UI thread picks the buffer up
+    every interval_ms and hands everything collected to flush(chars) in one
+    call, so a burst of small chunks costs one redraw instead of one each.
+    """
+
+    def __init__(self, widget, flush: Callable[[str], None], interval_ms: int = FLUSH_INTERVAL_MS):
+        self.widget = widget  # For after()
+        self.flush = flush
+        self.interval_ms = max(1, int(interval_ms))
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._job = None
+
+    def open(self):
+        """Start passing written text on (UI thread)"""
+        if self._job is None:
+            self._job = self.widget.after(self.interval_ms, self._tick)
+
+    def write(self, chars: str):
+        """Add streamed text (any thread)"""
+        if chars:
+            with self._lock:
+                self._buffer.append(chars)
+
+    def _take(self) -> str:
+        with self._lock:
+            chars = "".join(self._buffer)
+            self._buffer = []
+        return chars
+
+    def _tick(self):
+        self._job = None
+        chars = self._take()
+        if chars:
+            self.flush(chars)
+        self._job = self.widget.after(self.interval_ms, self._tick)
+
+    def close(self, discard: bool = False):
+        """Stop, flushing what is left unless discard (UI thread)"""
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        chars = self._take()
+        if chars and not discard:
+            self.flush(chars)
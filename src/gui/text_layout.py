@@ -0,0 +1,156 @@
+import tkinter.font as tkfont
+from typing import Dict, Tuple
+
+from .markdown import heading_size
+
+# Text layout worked out from font metrics instead of asking Tk to lay a
+# widget out and counting its display lines. Sizes are in unscaled CTk
+# units: fonts are made in pixels, as CTk scales them, and widget sizes
+# given to CTk are scaled the same way, so line counts hold at any scaling.
+
+# Space a CTkTextbox puts around its text, top plus bottom (or left plus
+# right): the corner radius it keeps clear, and the tk.Text's padding and
+# border inside that
+TEXTBOX_CHROME = 16
+
+# Cached line counts kept before the cache is started over
+MAX_CACHED_LAYOUTS = 20000
+
+# Monospace font of code blocks, tables and inline code
+CODE_FONT = ("Courier", 12)
+
+_fonts: Dict[Tuple[str, int, str], tkfont.Font] = {}
+_linespace: Dict[Tuple[str, int, str], int] = {}
+_word_widths: Dict[Tuple[str, int, str], Dict[str, int]] = {}
+_line_counts: Dict[Tuple[int, str, int, str, int], int] = {}
+
+
+def get_font(family: str, size: int, weight: str = "normal") -> tkfont.Font:
+    """Shared Font for measuring text shown in (family, size, weight)"""
+    key = (family, size, weight)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = tkfont.Font(family=family, size=-abs(size), weight=weight)
+        _linespace[key] = font.metrics("linespace")
+        _word_widths[key] = {}
+    return font
+
+
+def line_height(family: str, size: int, weight: str = "normal") -> int:
+    get_font(family, size, weight)
+    return _linespace[(family, size, weight)]
+
+
+def _measure(key: Tuple[str, int, str], font: tkfont.Font, word: str) -> int:
+    widths = _word_widths[key]
+    width = widths.get(word)
+    if width is None:
+        width = widths[word] = font.measure(word)
+    return width
+
+
+def count_lines(text: str, family: str, size: int, width: int, weight: str = "normal",
+                cache: bool = True) -> int:
+    """Lines text takes when word-wrapped to width pixels, as a tk.Text wraps it
+
+    Greedy: words are laid out left to right and one that doesn't fit
+    starts a new line; a word wider than the whole line is split over as
+    many lines as it needs. Cached per (text hash, font, width), unless
+    cache is False (text that won't be seen again, like a line still
+    being streamed).
+    """
+    cache_key = (hash(text), family, size, weight, width)
+    lines = _line_counts.get(cache_key) if cache else None
+    if lines is not None:
+        return lines
+
+    font = get_font(family, size, weight)
+    key = (family, size, weight)
+    width = max(width, 1)
+    space = _measure(key, font, " ")
+    lines = 0
+    for paragraph in text.split("\n"):
+        lines += 1
+        x = 0
+        for word in paragraph.split(" "):
+            word_width = _measure(key, font, word)
+            if x and x + space + word_width <= width:
+                x += space + word_width
+                continue
+            if x:
+                lines += 1
+            # Too wide for a line of its own: broken up across lines
+            extra = max(0, (word_width - 1) // width)
+            lines += extra
+            x = word_width - extra * width
+
+    if not cache:
+        return lines
+    if len(_line_counts) >= MAX_CACHED_LAYOUTS:
+        _line_counts.clear()
+    _line_counts[cache_key] = lines
+    return lines
+
+
+def line_font(tags, family: str, size: int) -> Tuple[str, int, str]:
+    """Font a line of markdown spans is measured in, from its tags
+
+    Lines with any bold are measured bold, which can only overestimate.
+    """
+    for level in (1, 2, 3):
+        if f"h{level}" in tags:
+            return family, heading_size(size, level), "bold"
+    if "table" in tags or "code" in tags:
+        return CODE_FONT[0], CODE_FONT[1], "bold" if "table_header" in tags else "normal"
+    return family, size, "bold" if "bold" in tags else "normal"
+
+
+def spans_height(spans, family: str, size: int, width: int) -> int:
+    """Height a CTkTextbox width wide needs for (text, tags) spans"""
+    height = 0
+    line, tags = [], set()
+    for text, span_tags in spans:
+        parts = text.split("\n")
+        for i, part in enumerate(parts):
+            if i > 0:
+                # A line ended
+                line_family, line_size, weight = line_font(tags, family, size)
+                lines = count_lines("".join(line), line_family, line_size, width - TEXTBOX_CHROME, weight)
+                height += lines * line_height(line_family, line_size, weight)
+                line, tags = [], set()
+            if part:
+                line.append(part)
+                tags.update(span_tags)
+    if line:
+        line_family, line_size, weight = line_font(tags, family, size)
+        lines = count_lines("".join(line), line_family, line_size, width - TEXTBOX_CHROME, weight)
+        height += lines * line_height(line_family, line_size, weight)
+    return height + TEXTBOX_CHROME
+
+
+class LineCounter:
+    """Height of plain text that is only ever added to, e.g. a streaming reply
+
+    Finished lines are counted once; each feed re-counts only the last
+    line, the one still being written. Matches spans_height for the same
+    text in a CTkTextbox width wide.
+    """
+
+    def __init__(self, family: str, size: int, width: int):
+        self.family = family
+        self.size = size
+        self.width = width - TEXTBOX_CHROME
+        self.finished = 0  # Wrapped lines of the text up to the last newline
+        self.last = ""  # Text after the last newline
+
+    def feed(self, text: str) -> int:
+        """Add text, returning the new height"""
+        lines = (self.last + text).split("\n")
+        for line in lines[:-1]:
+            self.finished += count_lines(line, self.family, self.size, self.width)
+        self.last = lines[-1]
+        return self.height()
+
+    def height(self) -> int:
+        lines = self.finished + count_lines(self.last, self.family, self.size, self.width, cache=False)
+        return lines * line_height(self.family, self.size) + TEXTBOX_CHROME
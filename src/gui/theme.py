@@ -0,0 +1,163 @@
+import customtkinter as ctk
+import tkinter.font as tkfont
+from typing import Callable, Dict, List, Tuple
+
+from .markdown import heading_size
+from .text_layout import CODE_FONT
+
+# Colours widgets can follow by name; "accent" starts as settings.theme_color
+COLORS = {
+    "accent": "#5a5c69",
+    "user_bubble": "#404040",
+    "text": "#dce4ee",
+    "muted": "gray",
+    "link": "#8ab4f8",
+    "code_bg": "#2b2b2b",
+    "code_text": "#e6e6e6",
+}
+
+# Named fonts made from the message font: heading level (0 for none),
+# weight and slant
+MESSAGE_FONTS = {
+    "message": (0, "normal", "roman"),
+    "message_bold": (0, "bold", "roman"),
+    "message_italic": (0, "normal", "italic"),
+    "h1": (1, "bold", "roman"),
+    "h2": (2, "bold", "roman"),
+    "h3": (3, "bold", "roman"),
+}
+
+# Named fonts that don't follow the settings: family, size and weight
+FIXED_FONTS = {
+    "code": (CODE_FONT[0], CODE_FONT[1], "normal"),
+    "code_bold": (CODE_FONT[0], CODE_FONT[1], "bold"),
+    "name": ("Helvetica", 10, "normal"),
+}
+
+# Token under which on_change() listeners hear of message font changes
+MESSAGE_FONT = "message_font"
+
+
+class ThemeRegistry:
+    """Theme colours and named fonts, shared by every widget that shows them
+
+    A widget showing a theme colour is bound to its token when it is made
+    (bind(widget, "accent", "fg_color")). set_color() only records the new
+    value; once the event loop is idle every bound widget is configured
+    in one pass, however often the colour changed in between (a colour
+    dragged in the settings). Nothing walks the widget tree: widgets that
+    are gone are dropped from the bindings as they are found.
+
+    Fonts are Tk named fonts in pixels, scaled like CTk's own. Changing
+    the message font reconfigures them, and Tk restyles every text using
+    one by itself. Listeners from on_change() are told about both kinds of
+    change, for what depends on them (tag colours, heights worked out
+    from font metrics).
+    """
+
+    def __init__(self, root, settings):
+        self.root = root  # For after_idle()
+        self.colors: Dict[str, str] = dict(COLORS, accent=settings.theme_color)
+        self._bindings: Dict[str, List[Tuple]] = {token: [] for token in self.colors}
+        self._listeners: Dict[str, List[Callable]] = {}
+        self._changed = set()  # Tokens to apply in the next batch
+        self._apply_job = None
+        self._bound = 0  # Bindings counted at the last cleanup
+
+        self._scaling = ctk.ScalingTracker.get_widget_scaling(root)
+        self.message_family = settings.message_font_family
+        self.message_size = settings.message_font_size
+        self.fonts: Dict[str, tkfont.Font] = {}
+        for token, (family, size, weight) in FIXED_FONTS.items():
+            self.fonts[token] = tkfont.Font(root, family=family, size=self._pixels(size), weight=weight)
+        for token in MESSAGE_FONTS:
+            self.fonts[token] = tkfont.Font(root)
+        self._configure_message_fonts()
+
+    def _pixels(self, size: int) -> int:
+        """A CTk font size as Tk's (negative) pixel size, with CTk's scaling"""
+        return -abs(round(size * self._scaling))
+
+    def color(self, token: str) -> str:
+        return self.colors[token]
+
+    def font(self, token: str) -> tkfont.Font:
+        return self.fonts[token]
+
+    def bind(self, widget, token: str, *options: str):
+        """Configure options of widget to the colour token from now on
+
+        The widget is expected to have been made with the current colour.
+        """
+        bindings = self._bindings[token]
+        bindings.append((widget, options))
+        if len(bindings) > 2 * self._bound + 100:
+            self._drop_destroyed()
+
+    def unbind(self, widget, token: str):
+        """Stop following token, e.g. a reused bubble now shown in another colour"""
+        self._bindings[token] = [(bound, options) for bound, options in self._bindings[token]
+                                 if bound is not widget]
+
+    def on_change(self, token: str, callback: Callable):
+        """Call callback() after each batch in which token changed
+        (a colour token, or MESSAGE_FONT)"""
+        self._listeners.setdefault(token, []).append(callback)
+
+    def set_color(self, token: str, color: str):
+        """Change a colour; bound widgets follow when the event loop is idle"""
+        if self.colors.get(token) == color:
+            return
+        self.colors[token] = color
+        self._changed.add(token)
+        self._schedule()
+
+    def set_message_font(self, family: str, size: int):
+        """Change the message font; text using it restyles at once, listeners
+        hear about it with the next batch"""
+        if (family, size) == (self.message_family, self.message_size):
+            return
+        self.message_family, self.message_size = family, size
+        self._configure_message_fonts()
+        self._changed.add(MESSAGE_FONT)
+        self._schedule()
+
+    def _configure_message_fonts(self):
+        for token, (level, weight, slant) in MESSAGE_FONTS.items():
+            size = heading_size(self.message_size, level) if level else self.message_size
+            self.fonts[token].configure(family=self.message_family, size=self._pixels(size),
+                                        weight=weight, slant=slant)
+
+    def _schedule(self):
+        if self._apply_job is None:
+            self._apply_job = self.root.after_idle(self._apply)
+
+    def _apply(self):
+        """Configure everything bound to the tokens changed since the last batch"""
+        self._apply_job = None
+        changed, self._changed = self._changed, set()
+        for token in changed:
+            if token in self._bindings:
+                color = self.colors[token]
+                # Widgets destroyed since they were bound are dropped
+                live = [(widget, options) for widget, options in self._bindings[token]
+                        if widget.winfo_exists()]
+                self._bindings[token] = live
+                for widget, options in live:
+                    try:
+                        widget.configure(**{option: color for option in options})
+                    except Exception as e:
+                        print(f"Error applying theme color: {e}")
+            for callback in self._listeners.get(token, []):
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Error applying theme change: {e}")
+        self._bound = sum(len(bindings) for bindings in self._bindings.values())
+
+    def _drop_destroyed(self):
+        """Forget widgets that were destroyed (message rows come and go)"""
+        for token, bindings in self._bindings.items():
+            self._bindings[token] = [(widget, options) for widget, options in bindings
+                                     if widget.winfo_exists()]
+        self._bound = sum(len(bindings) for bindings in self._bindings.values())
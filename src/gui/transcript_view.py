@@ -0,0 +1,337 @@
+import customtkinter as ctk
+import tkinter as tk
+import tkinter.font as tkfont
+import sys
+from itertools import count
+from typing import Callable, Dict, List, Optional
+
+from . import markdown
+
+# Every message starts at a mark with this prefix
+MESSAGE_MARK = "msg"
+
+
+class TranscriptView(ctk.CTkFrame):
+    """The whole chat drawn into one tk.Text
+
+    An alternative to VirtualMessageList (settings.chat_renderer = "text").
+    Each message is a name line and a block of text whose tags give it
+    its bubble colour, margins and fonts; replies are drawn from their
+    markdown, with code blocks under their own tag.
+    Tags use the theme's named fonts, which Tk restyles by itself, and a
+    theme colour change reconfigures a tag, so nothing is rebuilt. A message starts at
+    a mark, which is how a click is traced back to its message.
+
+    Has the same entry methods as VirtualMessageList, so ChatArea can use
+    either one.
+    """
+
+    def __init__(self, master, theme, display_name: Callable, highlighter=None,
+                 on_context_menu: Callable = None, on_reach_top: Callable = None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.theme = theme
+        self.highlighter = highlighter
+        self.display_name = display_name  # (entry) -> name line text
+        self.on_context_menu = on_context_menu  # (event, message)
+        self.on_reach_top = on_reach_top
+
+        self.entries: List[Dict] = []
+        self._marks = count()
+        self._by_mark: Dict[str, Dict] = {}
+        self._code_marks: List[str] = []  # Starts of code blocks being highlighted
+
+        self.pad_font = tkfont.Font(family="Helvetica", size=4)
+
+        self.scrollbar = ctk.CTkScrollbar(self)
+        self.scrollbar.pack(side="right", fill="y")
+        self.text = tk.Text(
+            self,
+            wrap="word",
+            borderwidth=0,
+            highlightthickness=0,
+            padx=10,
+            pady=10,
+            cursor="arrow",
+            insertwidth=0,
+            background=self._apply_appearance_mode(self._bg_color),
+            foreground=theme.color("text"),
+            font=theme.font("message"),
+            yscrollcommand=self._on_text_scroll
+        )
+        self.text.pack(side="left", fill="both", expand=True)
+        self.scrollbar.configure(command=self.text.yview)
+        self.viewport = self.text  # Where the scrollbar is packed before
+        self._setup_tags()
+        self._setup_bindings()
+        self.text.configure(state="disabled")
+        theme.on_change("accent", lambda: self.set_theme_color(theme.color("accent")))
+
+    def _setup_tags(self):
+        """Tag styles; created lowest priority first (code wins over bubbles)"""
+        text = self.text
+        theme = self.theme
+        text.tag_configure("gap", font=self.pad_font)
+        text.tag_configure("name", font=theme.font("name"), foreground=theme.color("muted"),
+                           spacing1=6, spacing3=2)
+        text.tag_configure("name_user", justify="right", rmargin=15)
+        text.tag_configure("name_assistant", justify="left", lmargin1=15, lmargin2=15)
+        text.tag_configure("bubble_user", background=theme.color("user_bubble"))
+        text.tag_configure("bubble_assistant", background=theme.color("accent"))
+        text.tag_configure("body", font=theme.font("message"), spacing1=1, spacing3=1)
+        text.tag_configure("pad", font=self.pad_font)
+        # Markdown (see markdown.py)
+        text.tag_configure("bold", font=theme.font("message_bold"))
+        text.tag_configure("italic", font=theme.font("message_italic"))
+        text.tag_configure("inline_code", font=theme.font("code"), background=theme.color("code_bg"))
+        for level in (1, 2, 3):
+            text.tag_configure(f"h{level}", font=theme.font(f"h{level}"))
+        text.tag_configure("table", font=theme.font("code"))
+        text.tag_configure("table_header", font=theme.font("code_bold"))
+        text.tag_configure("quote", foreground=theme.color("muted"))
+        text.tag_configure("link", foreground=theme.color("link"), underline=True)
+        text.tag_configure("rule", foreground=theme.color("muted"))
+        text.tag_configure("code", font=theme.font("code"), background=theme.color("code_bg"),
+                           foreground=theme.color("code_text"), wrap="char", spacing1=0, spacing3=0)
+        if self.highlighter:
+            self.highlighter.configure_tags(text)
+        self._set_margins(600)
+
+    def _set_margins(self, width: int):
+        """Bubbles leave a quarter of the width free, on the left for the user"""
+        side = max(20, int(width * 0.25))
+        self.text.tag_configure("bubble_user", lmargin1=side, lmargin2=side, rmargin=10)
+        self.text.tag_configure("bubble_assistant", lmargin1=10, lmargin2=10, rmargin=side)
+        # Code is indented within its bubble
+        self.text.tag_configure("code_user", lmargin1=side + 15, lmargin2=side + 15, rmargin=25)
+        self.text.tag_configure("code_assistant", lmargin1=25, lmargin2=25, rmargin=side + 15)
+
+    def _setup_bindings(self):
+        self.text.bind("<Configure>", lambda e: self._set_margins(e.width))
+        button = "<Button-2>" if sys.platform == "darwin" else "<Button-3>"
+        self.text.bind(button, self._on_context_menu)
+        # Scrolling up while already at the top (e.g. a short chat) loads more
+        if sys.platform.startswith("win") or sys.platform == "darwin":
+            self.text.bind("<MouseWheel>", lambda e: self._wheel(e.delta > 0), add="+")
+        else:  # Linux
+            self.text.bind("<Button-4>", lambda e: self._wheel(True), add="+")
+
+    # Entries
+
+    def _chunks(self, entry: Dict, code: List = None) -> List:
+        """(text, tags) pairs drawing one message (code as in _body_chunks)"""
+        sender = "user" if entry["sender"] == "user" else "assistant"
+        bubble = f"bubble_{sender}"
+        if sender == "assistant":
+            blocks = markdown.parse(entry["text"])
+        else:
+            blocks = markdown.plain_blocks(entry["text"])
+        chunks = [
+            (self.display_name(entry) + "\n", ("name", f"name_{sender}")),
+            ("\n", ("pad", bubble)),
+        ]
+        chunks += self._body_chunks(blocks, 0, sender, code, offset=len(chunks))
+        chunks.append(("\n", ("pad", bubble)))
+        chunks.append(("\n", ("gap",)))
+        return chunks
+
+    def _body_chunks(self, blocks: List[Dict], first: int, sender: str,
+                     code: List = None, offset: int = 0) -> List:
+        """Chunks for blocks, the first of which is block number first of the message
+
+        Closed code blocks are added to code as (chunk number + offset, block),
+        for _highlight.
+        """
+        bubble = f"bubble_{sender}"
+        chunks = []
+        for number, block in enumerate(blocks, start=first):
+            for chars, tags in markdown.block_spans(block, first=number == 0):
+                if "code" in tags:
+                    if code is not None and block.get("closed"):
+                        code.append((offset + len(chunks), block))
+                    chunks.append((chars, tags + (f"code_{sender}", bubble)))
+                else:
+                    chunks.append((chars, tags + ("body", bubble)))
+        return chunks
+
+    def _insert_chunks(self, index: str, chunks: List, code: List):
+        """Insert chunks at index in one call and start highlighting their code"""
+        args = []
+        for chars, tags in chunks:
+            args += [chars, tags]
+        start = self.text.index(index)
+        if args:
+            self.text.insert(index, *args)
+        if not self.highlighter:
+            return
+        for number, block in code:
+            # Code starts on a line of its own, after the lines of the chunks before it
+            lines = sum(chars.count("\n") for chars, _ in chunks[:number])
+            mark = f"code{next(self._marks)}"
+            self.text.mark_set(mark, f"{start} + {lines} lines")
+            self.text.mark_gravity(mark, "left")
+            self._code_marks.append(mark)
+            self.highlighter.highlight(self.text, block["text"], block["lang"], mark)
+
+    def _insert(self, index: str, entries: List[Dict]):
+        """Draw entries starting at index, one Tcl call per message"""
+        for entry in reversed(entries):
+            code = []
+            chunks = self._chunks(entry, code)
+            start = self.text.index(index)
+            self._insert_chunks(index, chunks, code)
+            # Right gravity: a message inserted at this spot later pushes the mark along
+            mark = entry.setdefault("mark", f"{MESSAGE_MARK}{next(self._marks)}")
+            self._by_mark[mark] = entry
+            self.text.mark_set(mark, start)
+            self.text.mark_gravity(mark, "right")
+            index = start
+
+    def _edit(self, action: Callable):
+        self.text.configure(state="normal")
+        try:
+            action()
+        finally:
+            self.text.configure(state="disabled")
+
+    def set_entries(self, entries: List[Dict]):
+        """Replace every message, showing the newest"""
+        self.clear()
+        self.append_entries(entries)
+        self.scroll_to_bottom()
+
+    def append_entries(self, entries: List[Dict]):
+        if not entries:
+            return
+        at_bottom = self.text.yview()[1] >= 1.0
+        self.entries.extend(entries)
+        self._edit(lambda: self._insert_at_end(entries))
+        if at_bottom:
+            self.scroll_to_bottom()
+
+    def _insert_at_end(self, entries: List[Dict]):
+        for entry in entries:
+            self._insert("end-1c", [entry])
+
+    def prepend_entries(self, entries: List[Dict]):
+        """Insert older messages above, keeping what is on screen in place"""
+        if not entries:
+            return
+        self.text.mark_set("view_top", "@0,0")
+        self.text.mark_gravity("view_top", "right")
+        self.entries[:0] = entries
+        self._edit(lambda: self._insert("1.0", entries))
+        self.text.yview("view_top")
+
+    def _range(self, index: int) -> tuple:
+        """Start and end of a message in the text"""
+        start = self.entries[index]["mark"]
+        if index + 1 < len(self.entries):
+            return start, self.entries[index + 1]["mark"]
+        return start, "end-1c"
+
+    def refresh_entry(self, index: int):
+        """Redraw one message after its content changed"""
+        if index < 0:
+            index += len(self.entries)
+        start, end = self._range(index)
+        start = self.text.index(start)
+        # Drawn whole again; streaming into it starts over
+        self.entries[index].pop("markdown", None)
+
+        def redraw():
+            self.text.delete(start, end)
+            self._insert(start, [self.entries[index]])
+
+        at_bottom = self.text.yview()[1] >= 1.0
+        self._edit(redraw)
+        if at_bottom:
+            self.scroll_to_bottom()
+
+    def extend_last(self, chars: str):
+        """Stream more text into the newest message
+
+        Replies are re-parsed only from their last stable block boundary
+        (see markdown.IncrementalMarkdown), and only the blocks from there
+        on are redrawn; the "tail" mark is where they start.
+        """
+        if not self.entries:
+            return
+        entry = self.entries[-1]
+        entry["text"] += chars
+        if entry["sender"] != "assistant":
+            self.refresh_entry(-1)
+            return
+
+        # The message ends with the closing pad and gap lines, followed by
+        # the text widget's own final newline
+        body_end = "end-1c -2c"
+        parser = entry.get("markdown")
+        if parser is None:
+            parser = entry["markdown"] = markdown.IncrementalMarkdown()
+            # After the name and the opening pad line
+            self.text.mark_set("tail", f"{entry['mark']} +2 lines")
+            self.text.mark_gravity("tail", "left")
+        drawn, blocks = parser.feed(entry["text"])
+        stable = len(parser.stable_blocks)
+
+        def redraw_tail():
+            self.text.delete("tail", body_end)
+            # Blocks that just became stable are drawn once more, for the last
+            # time, so their code can be highlighted now
+            code = []
+            chunks = self._body_chunks(blocks[drawn:stable], drawn, "assistant", code)
+            self._insert_chunks(body_end, chunks, code)
+            self.text.mark_set("tail", body_end)
+            for chars, tags in self._body_chunks(blocks[stable:], stable, "assistant"):
+                self.text.insert(body_end, chars, tags)
+
+        at_bottom = self.text.yview()[1] >= 1.0
+        self._edit(redraw_tail)
+        if at_bottom:
+            self.scroll_to_bottom()
+
+    def clear(self):
+        for mark in list(self._by_mark) + self._code_marks:
+            self.text.mark_unset(mark)
+        self._by_mark = {}
+        self._code_marks = []
+        self.entries = []
+        self._edit(lambda: self.text.delete("1.0", "end"))
+
+    def reflow(self):
+        """The theme's named fonts changed; the text reflows by itself"""
+
+    def set_theme_color(self, color: str):
+        self.text.tag_configure("bubble_assistant", background=color)
+
+    # Scrolling
+
+    def scroll_to_bottom(self):
+        self.text.yview_moveto(1.0)
+
+    def _on_text_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(first) <= 0.0 and float(last) < 1.0 and self.on_reach_top:
+            self.on_reach_top()
+
+    def _wheel(self, up: bool):
+        if up and self.text.yview()[0] <= 0.0 and self.on_reach_top:
+            self.on_reach_top()
+
+    def _on_context_menu(self, event):
+        if not self.on_context_menu:
+            return None
+        message = self.message_at(f"@{event.x},{event.y}")
+        if message is None:
+            return None
+        return self.on_context_menu(event, message)
+
+    def message_at(self, index: str) -> Optional[Dict]:
+        """The message drawn at a text index"""
+        mark = self.text.mark_previous(f"{index} +1c")
+        while mark is not None and not mark.startswith(MESSAGE_MARK):
+            mark = self.text.mark_previous(mark)
+        if mark is None:
+            return None
+        entry = self._by_mark.get(mark)
+        return entry["message"] if entry else None
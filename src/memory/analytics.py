@@ -0,0 +1,100 @@
+import sqlite3
+from typing import Dict, List, Optional
+
+# Usage is aggregated as replies are saved, into one row per (day, model)
+# and one row per chat. Totals are stored rather than averages so rows can
+# simply be added to; averages are worked out when read:
+#
+#   avg time to first token = ttft_ms / requests
+#   tokens per second       = completion_tokens / (eval_ms / 1000)
+
+_TOTAL_COLUMNS = "requests, prompt_tokens, completion_tokens, ttft_ms, eval_ms, loads"
+
+
+def record_usage(conn: sqlite3.Connection, chat_id: Optional[int], usage: Dict):
+    """Add one reply's usage (see OllamaAPI.last_usage) to the summary tables"""
+    values = (
+        1,
+        int(usage.get("prompt_tokens") or 0),
+        int(usage.get("completion_tokens") or 0),
+        float(usage.get("ttft_ms") or 0.0),
+        float(usage.get("eval_ms") or 0.0),
+        1 if usage.get("loaded") else 0,
+    )
+    conn.execute(
+        f"""INSERT INTO usage_daily (day, model_name, {_TOTAL_COLUMNS})
+            VALUES (COALESCE(?, date('now', 'localtime')), ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(day, model_name) DO UPDATE SET
+                requests = requests + excluded.requests,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                ttft_ms = ttft_ms + excluded.ttft_ms,
+                eval_ms = eval_ms + excluded.eval_ms,
+                loads = loads + excluded.loads""",
+        (usage.get("day"), usage.get("model") or "unknown") + values
+    )
+    if chat_id is not None:
+        conn.execute(
+            f"""INSERT INTO usage_chats (chat_id, {_TOTAL_COLUMNS})
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    ttft_ms = ttft_ms + excluded.ttft_ms,
+                    eval_ms = eval_ms + excluded.eval_ms,
+                    loads = loads + excluded.loads""",
+            (chat_id,) + values
+        )
+
+
+def _with_rates(row: Dict) -> Dict:
+    """Add average time to first token and tokens/sec to a row of totals"""
+    requests = row["requests"] or 0
+    row["avg_ttft_ms"] = row["ttft_ms"] / requests if requests else 0.0
+    row["tokens_per_sec"] = (row["completion_tokens"] * 1000.0 / row["eval_ms"]
+                             if row["eval_ms"] else 0.0)
+    return row
+
+
+def usage_by_day(conn: sqlite3.Connection, days: int = 30) -> List[Dict]:
+    """Totals per day (all models) for the last ``days`` days, newest first"""
+    conn.row_factory = sqlite3.Row
+    cursor = conn.execute(
+        """SELECT day, SUM(requests) AS requests, SUM(prompt_tokens) AS prompt_tokens,
+                  SUM(completion_tokens) AS completion_tokens, SUM(ttft_ms) AS ttft_ms,
+                  SUM(eval_ms) AS eval_ms, SUM(loads) AS loads
+           FROM usage_daily
+           WHERE day >= date('now', 'localtime', ?)
+           GROUP BY day ORDER BY day DESC""",
+        (f"-{int(days)} days",)
+    )
+    return [_with_rates(dict(row)) for row in cursor.fetchall()]
+
+
+def usage_by_model(conn: sqlite3.Connection, days: int = 30) -> List[Dict]:
+    """Totals per model for the last ``days`` days, busiest first"""
+    conn.row_factory = sqlite3.Row
+    cursor = conn.execute(
+        """SELECT model_name, SUM(requests) AS requests, SUM(prompt_tokens) AS prompt_tokens,
+                  SUM(completion_tokens) AS completion_tokens, SUM(ttft_ms) AS ttft_ms,
+                  SUM(eval_ms) AS eval_ms, SUM(loads) AS loads
+           FROM usage_daily
+           WHERE day >= date('now', 'localtime', ?)
+           GROUP BY model_name ORDER BY requests DESC""",
+        (f"-{int(days)} days",)
+    )
+    return [_with_rates(dict(row)) for row in cursor.fetchall()]
+
+
+def usage_by_chat(conn: sqlite3.Connection, limit: int = 10) -> List[Dict]:
+    """Chats that used the most tokens, with their titles"""
+    conn.row_factory = sqlite3.Row
+    cursor = conn.execute(
+        """SELECT u.chat_id, c.title, u.requests, u.prompt_tokens, u.completion_tokens,
+                  u.ttft_ms, u.eval_ms, u.loads
+           FROM usage_chats u JOIN chats c ON c.id = u.chat_id
+           ORDER BY u.prompt_tokens + u.completion_tokens DESC LIMIT ?""",
+        (limit,)
+    )
+    return [_with_rates(dict(row)) for row in cursor.fetchall()]
@@ -0,0 +1,188 @@
+import hashlib
+import shutil
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .connection import connect
+
+# Pages copied per backup step, and the pause between steps, so a backup
+# trickles along without hogging the disk while the app is in use
+BACKUP_PAGES_PER_STEP = 128
+BACKUP_STEP_SLEEP = 0.02
+
+CHECKSUM_FILE = "SHA256SUMS"
+STAMP_FORMAT = "%Y%m%d-%H%M%S"
+PARTIAL_SUFFIX = ".partial"
+
+# Each backup is a directory named after when it was taken:
+#
+#   backups/20250101-120000/memories.db
+#   backups/20250101-120000/archive/chats-2023.db
+#   backups/20250101-120000/SHA256SUMS
+#
+# It is written as <name>.partial and only renamed once every file has been
+# copied, checked and checksummed, so a listed backup is always complete.
+
+
+class BackupInterrupted(Exception):
+    """Raised when a backup is stopped part way to let the user get on"""
+
+
+def backup_dir_for(db_path: Path) -> Path:
+    """Directory holding the backups of a memories.db"""
+    return db_path.parent / "backups"
+
+
+def _copy_database(src_path: Path, dest_path: Path, should_stop: Optional[Callable[[], bool]] = None):
+    """Copy a live database with the backup API, a few pages at a time"""
+    src = connect(src_path, isolation_level=None)
+    dest = sqlite3.connect(dest_path)
+
+    def progress(status, remaining, total):
+        # Raising here makes sqlite3 abandon the backup
+        if should_stop and should_stop():
+            raise BackupInterrupted()
+
+    try:
+        src.backup(dest, pages=BACKUP_PAGES_PER_STEP, progress=progress, sleep=BACKUP_STEP_SLEEP)
+        # Make the copy a single self-contained file
+        dest.execute("PRAGMA journal_mode = DELETE")
+        result = dest.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise Exception(f"Backup of {src_path.name} failed its integrity check: {result}")
+    finally:
+        dest.close()
+        src.close()
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_backup(db_path: Path, archive_dir: Path, backup_dir: Path,
+                  should_stop: Optional[Callable[[], bool]] = None, label: str = "") -> Path:
+    """Back up memories.db and its cold-storage archives; returns the backup directory
+
+    ``should_stop`` is checked between steps; if it returns True the
+    partial backup is removed and BackupInterrupted is raised.
+    """
+    name = datetime.now().strftime(STAMP_FORMAT) + (f"-{label}" if label else "")
+    partial = backup_dir / (name + PARTIAL_SUFFIX)
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+
+    files = [("memories.db", db_path)]
+    if archive_dir.exists():
+        files += [(f"archive/{path.name}", path) for path in sorted(archive_dir.glob("chats-*.db"))]
+
+    try:
+        for relative, src_path in files:
+            dest_path = partial / relative
+            dest_path.parent.mkdir(exist_ok=True)
+            _copy_database(src_path, dest_path, should_stop)
+
+        with open(partial / CHECKSUM_FILE, "w", encoding="utf-8") as f:
+            for relative, _ in files:
+                f.write(f"{_sha256(partial / relative)}  {relative}\n")
+
+        final = backup_dir / name
+        suffix = 1
+        while final.exists():  # Two backups within a second
+            suffix += 1
+            final = backup_dir / f"{name}-{suffix}"
+        partial.rename(final)
+        return final
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+
+def verify_backup(path: Path) -> bool:
+    """True if every file listed in the backup's checksums is present and matches"""
+    checksum_path = path / CHECKSUM_FILE
+    if not checksum_path.exists():
+        return False
+    with open(checksum_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            expected, relative = line.rstrip("\n").split("  ", 1)
+            file_path = path / relative
+            if not file_path.exists() or _sha256(file_path) != expected:
+                return False
+    return True
+
+
+def _backup_time(path: Path) -> Optional[datetime]:
+    try:
+        return datetime.strptime(path.name[:15], STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_backups(backup_dir: Path) -> List[Dict]:
+    """Completed backups, newest first"""
+    backups = []
+    if not backup_dir.exists():
+        return backups
+    for path in backup_dir.iterdir():
+        created = _backup_time(path)
+        if not path.is_dir() or path.name.endswith(PARTIAL_SUFFIX) or created is None:
+            continue
+        backups.append({
+            "name": path.name,
+            "path": path,
+            "created": created,
+            "size": sum(f.stat().st_size for f in path.rglob("*") if f.is_file()),
+        })
+    backups.sort(key=lambda backup: backup["name"], reverse=True)
+    return backups
+
+
+def rotate_backups(backup_dir: Path, keep: int) -> int:
+    """Delete all but the newest ``keep`` backups (and leftover partial ones)"""
+    removed = 0
+    if backup_dir.exists():
+        for path in backup_dir.glob("*" + PARTIAL_SUFFIX):
+            shutil.rmtree(path, ignore_errors=True)
+    for backup in list_backups(backup_dir)[max(keep, 1):]:
+        shutil.rmtree(backup["path"], ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def restore_backup(path: Path, db_path: Path, archive_dir: Path):
+    """Copy a verified backup over the live database and archives
+
+    Goes through the backup API, so other open connections (and other
+    windows) see the restored data instead of a file swapped underneath them.
+    """
+    if not verify_backup(path):
+        raise Exception(f"Backup {path.name} is incomplete or fails checksum verification")
+
+    targets = [(archive_path, archive_dir / archive_path.name)
+               for archive_path in sorted((path / "archive").glob("chats-*.db"))]
+    targets.append((path / "memories.db", db_path))  # Last, once its archives are in place
+
+    archive_dir.mkdir(exist_ok=True)
+    for src_path, dest_path in targets:
+        src = sqlite3.connect(src_path)
+        dest = connect(dest_path, isolation_level=None)
+        try:
+            src.backup(dest)
+        finally:
+            dest.close()
+            src.close()
+
+    # The backup copies were made self-contained; put the live file back in WAL
+    conn = connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
@@ -0,0 +1,146 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cold_storage import STORAGE_ARCHIVED, archive_chats, delete_archived_chats
+from .messages import STORAGE_ROWS, collect_garbage
+
+# Operations on many chats and folders at once (the sidebar's multi-select).
+# The selection is written to two temp tables, expanded with recursive CTEs
+# (folders to their whole subtree, chats to every branch of their
+# conversation), and each operation is then a handful of set-based
+# statements in one transaction instead of a loop of single-row writes.
+
+_SELECTION_TABLES = """
+    CREATE TEMP TABLE IF NOT EXISTS bulk_folders (id INTEGER PRIMARY KEY);
+    CREATE TEMP TABLE IF NOT EXISTS bulk_chats (id INTEGER PRIMARY KEY);
+    DELETE FROM temp.bulk_folders;
+    DELETE FROM temp.bulk_chats;
+"""
+
+
+def _select(conn: sqlite3.Connection, chat_ids: Iterable[int], folder_ids: Iterable[int]):
+    """Fill temp.bulk_folders/bulk_chats with the selection and everything inside it"""
+    for statement in filter(str.strip, _SELECTION_TABLES.split(";")):
+        conn.execute(statement)
+    conn.executemany("INSERT OR IGNORE INTO temp.bulk_folders (id) VALUES (?)",
+                     ((folder_id,) for folder_id in folder_ids))
+    conn.execute(
+        """INSERT OR IGNORE INTO temp.bulk_folders (id)
+           WITH RECURSIVE subtree(id) AS (
+               SELECT id FROM temp.bulk_folders
+               UNION
+               SELECT f.id FROM folders f JOIN subtree s ON f.parent_id = s.id
+           )
+           SELECT id FROM subtree"""
+    )
+    conn.executemany("INSERT OR IGNORE INTO temp.bulk_chats (id) VALUES (?)",
+                     ((chat_id,) for chat_id in chat_ids))
+    conn.execute(
+        """INSERT OR IGNORE INTO temp.bulk_chats (id)
+           SELECT id FROM chats WHERE folder_id IN (SELECT id FROM temp.bulk_folders)"""
+    )
+    # Whole conversations: the roots of selected branches, then every branch
+    conn.execute(
+        """INSERT OR IGNORE INTO temp.bulk_chats (id)
+           SELECT branch_root FROM chats
+           WHERE id IN (SELECT id FROM temp.bulk_chats) AND branch_root IS NOT NULL"""
+    )
+    conn.execute(
+        """INSERT OR IGNORE INTO temp.bulk_chats (id)
+           SELECT id FROM chats WHERE branch_root IN (SELECT id FROM temp.bulk_chats)"""
+    )
+
+
+def move_items(conn: sqlite3.Connection, chat_ids: List[int], folder_ids: List[int],
+               target_folder_id: Optional[int]) -> int:
+    """Move chats and folders (with everything in them) into target_folder_id
+
+    Selected folders keep their contents; only their parent changes.
+    Returns the number of chats moved directly.
+    """
+    _select(conn, chat_ids, folder_ids)
+    if target_folder_id is not None and conn.execute(
+            "SELECT 1 FROM temp.bulk_folders WHERE id = ?", (target_folder_id,)).fetchone():
+        raise Exception("Cannot move a folder into itself or one of its subfolders")
+
+    placeholders = ", ".join("?" for _ in folder_ids)
+    if folder_ids:
+        conn.execute(f"UPDATE folders SET parent_id = ? WHERE id IN ({placeholders})",
+                     (target_folder_id, *folder_ids))
+    # Selected conversations, branches included, but not the contents of moved folders
+    cursor = conn.execute(
+        """UPDATE chats SET folder_id = ?
+           WHERE id IN (SELECT id FROM temp.bulk_chats)
+             AND (folder_id IS NULL OR folder_id NOT IN (SELECT id FROM temp.bulk_folders))""",
+        (target_folder_id,)
+    )
+    return cursor.rowcount
+
+
+def delete_items(conn: sqlite3.Connection, archive_dir: Path, chat_ids: List[int],
+                 folder_ids: List[int]) -> Dict[str, int]:
+    """Delete chats and whole folder subtrees, with every chat inside them
+
+    ``conn`` must be in autocommit mode (isolation_level None). Everything
+    in memories.db goes in one transaction; messages in cold-storage
+    archives are removed afterwards, one archive file at a time.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _select(conn, chat_ids, folder_ids)
+        archived = conn.execute(
+            """SELECT id, archive FROM chats
+               WHERE id IN (SELECT id FROM temp.bulk_chats) AND storage = ?""",
+            (STORAGE_ARCHIVED,)
+        ).fetchall()
+        conn.execute("DELETE FROM messages WHERE chat_id IN (SELECT id FROM temp.bulk_chats)")
+        # Daily totals are kept; they describe load, not chats
+        conn.execute("DELETE FROM usage_chats WHERE chat_id IN (SELECT id FROM temp.bulk_chats)")
+        conn.execute(
+            "UPDATE chats SET active_branch = NULL WHERE active_branch IN (SELECT id FROM temp.bulk_chats)"
+        )
+        chats = conn.execute("DELETE FROM chats WHERE id IN (SELECT id FROM temp.bulk_chats)").rowcount
+        folders = conn.execute("DELETE FROM folders WHERE id IN (SELECT id FROM temp.bulk_folders)").rowcount
+        collect_garbage(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    by_archive: Dict[str, List[int]] = {}
+    for chat_id, name in archived:
+        by_archive.setdefault(name, []).append(chat_id)
+    for name, archived_ids in by_archive.items():
+        delete_archived_chats(conn, archive_dir, archived_ids, name)
+    return {"chats": chats, "folders": folders}
+
+
+def archive_items(conn: sqlite3.Connection, archive_dir: Path, chat_ids: List[int],
+                  folder_ids: List[int]) -> int:
+    """Move the selected chats to cold storage now, whatever their age
+
+    Branched conversations are skipped, as automatic archiving does.
+    ``conn`` must be in autocommit mode; returns how many were archived.
+    """
+    conn.execute("BEGIN")
+    try:
+        _select(conn, chat_ids, folder_ids)
+        rows: List[Tuple[int, str]] = conn.execute(
+            """SELECT id, last_updated FROM chats
+               WHERE id IN (SELECT id FROM temp.bulk_chats) AND storage = ?
+                 AND branch_root IS NULL
+                 AND NOT EXISTS (SELECT 1 FROM chats b WHERE b.branch_root = chats.id)""",
+            (STORAGE_ROWS,)
+        ).fetchall()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return archive_chats(conn, archive_dir, rows)
+
+
+def selected_chat_ids(conn: sqlite3.Connection, chat_ids: List[int], folder_ids: List[int]) -> List[int]:
+    """Every chat in the selection, branches included (e.g. for export)"""
+    _select(conn, chat_ids, folder_ids)
+    return [chat_id for (chat_id,) in conn.execute("SELECT id FROM temp.bulk_chats ORDER BY id")]
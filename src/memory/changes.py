@@ -0,0 +1,72 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+from .connection import connect
+
+
+class ChangeWatcher:
+    """Notices commits by other connections to memories.db and reads what changed
+
+    ``PRAGMA data_version`` on a long-lived connection changes whenever any
+    other connection commits, which makes polling it nearly free. Only then
+    is the change log (filled by triggers, see migrations) read from the
+    last entry seen. Not thread-safe: poll from the thread that created it.
+    """
+
+    def __init__(self, db_path: Path):
+        self._conn = connect(db_path, isolation_level=None)
+        self._data_version = self._read_data_version()
+        self._last_seq = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM changes"
+        ).fetchone()[0]
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def poll(self) -> List[Dict]:
+        """Changes committed since the last poll, one entry per chat or folder
+
+        Each entry has ``kind`` ("chat" or "folder"), ``item_id``,
+        ``revision`` (set when a chat's messages changed), ``summary_changed``
+        (renamed, moved, or any folder change) and ``deleted``.
+        Returns an empty list if nothing was committed, and a single
+        ``{"kind": "reset"}`` entry if the log went backwards (a backup was
+        restored), meaning everything should be reloaded.
+        """
+        data_version = self._read_data_version()
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+
+        rows = self._conn.execute(
+            "SELECT seq, kind, item_id, revision, deleted FROM changes WHERE seq > ? ORDER BY seq",
+            (self._last_seq,)
+        ).fetchall()
+        if not rows:
+            max_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            if max_seq < self._last_seq:
+                self._last_seq = max_seq
+                return [{"kind": "reset"}]
+            return []
+        self._last_seq = rows[-1][0]
+
+        # Several edits to one item collapse into one entry with the latest state
+        changes: Dict[tuple, Dict] = {}
+        for seq, kind, item_id, revision, deleted in rows:
+            entry = changes.setdefault((kind, item_id), {
+                "kind": kind, "item_id": item_id, "revision": None,
+                "summary_changed": False, "deleted": False
+            })
+            if revision is not None:
+                entry["revision"] = revision
+            else:
+                entry["summary_changed"] = True
+            entry["deleted"] = bool(deleted)
+        return list(changes.values())
+
+    def close(self):
+        try:
+            self._conn.close()
+        except sqlite3.Error:
+            pass
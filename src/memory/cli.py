@@ -0,0 +1,71 @@
+# cli.py
+#
+# Move chat archives between machines:
+#
+#   python -m src.memory.cli export chats.jsonl [--folder ID ...] [--since DATE] [--until DATE]
+#   python -m src.memory.cli import chats.jsonl [--folder ID]
+#
+# and convert a large database from before incremental vacuuming (close the
+# app first; it rewrites the whole file):
+#
+#   python -m src.memory.cli vacuum
+
+import argparse
+import sys
+import time
+
+from .database import ChatMemoryDB
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import the Dark Engine chat archive as JSONL")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write chats to a JSONL file")
+    export_parser.add_argument("path", help="Output file")
+    export_parser.add_argument("--folder", type=int, action="append", dest="folders",
+                               help="Only export this folder and its subfolders (repeatable)")
+    export_parser.add_argument("--since", help="Only chats updated on or after this date (YYYY-MM-DD)")
+    export_parser.add_argument("--until", help="Only chats updated on or before this date (YYYY-MM-DD)")
+
+    import_parser = commands.add_parser("import", help="Load chats from a JSONL file")
+    import_parser.add_argument("path", help="Input file")
+    import_parser.add_argument("--folder", type=int, help="Put imported chats and folders in this folder")
+
+    commands.add_parser("vacuum", help="Convert the database to incremental vacuuming (app must be closed)")
+
+    args = parser.parse_args(argv)
+    db = ChatMemoryDB()
+
+    if args.command == "vacuum":
+        start = time.perf_counter()
+        try:
+            converted = db.convert_to_incremental_vacuum()
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        if converted:
+            print(f"Converted the database in {time.perf_counter() - start:.1f}s")
+        else:
+            print("The database already uses incremental vacuuming")
+        return 0
+
+    start = time.perf_counter()
+    try:
+        if args.command == "export":
+            counts = db.export_jsonl(args.path, folder_ids=args.folders, since=args.since, until=args.until)
+            action = "Exported"
+        else:
+            counts = db.import_jsonl(args.path, folder_id=args.folder)
+            action = "Imported"
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{action} {counts['folders']} folders, {counts['chats']} chats and "
+          f"{counts['messages']} messages in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import zlib
+from typing import Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # Optional - fall back to zlib
+    zstandard = None
+
+# Bodies shorter than this are stored as plain text
+COMPRESS_THRESHOLD = 2048
+
+RAW = "raw"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+DEFAULT_CODEC = ZSTD if zstandard else ZLIB
+
+
+def encode_body(text: str, threshold: int = COMPRESS_THRESHOLD,
+                codec: str = DEFAULT_CODEC) -> Tuple[str, Union[str, bytes]]:
+    """Return (codec, body) for storing a message body"""
+    if len(text) < threshold:
+        return RAW, text
+
+    data = text.encode("utf-8")
+    if codec == ZSTD and zstandard:
+        compressed = zstandard.ZstdCompressor(level=3).compress(data)
+    else:
+        codec = ZLIB
+        compressed = zlib.compress(data, 6)
+
+    # Not everything shrinks (e.g. base64 blobs) - keep those as text
+    if len(compressed) >= len(data):
+        return RAW, text
+    return codec, compressed
+
+
+def decode_body(codec: str, body: Union[str, bytes]) -> str:
+    """Turn a stored (codec, body) pair back into text"""
+    if codec == RAW:
+        return body if isinstance(body, str) else body.decode("utf-8")
+    if codec == ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+    if codec == ZSTD:
+        if not zstandard:
+            raise Exception("Message is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    raise Exception(f"Unknown message codec: {codec}")
+
+
+class StoredMessage(dict):
+    """Chat message loaded from the database whose content is decoded lazily
+
+    Behaves like the plain ``{"role", "content", "timestamp"}`` dicts used
+    everywhere else; the body is only decompressed the first time
+    ``content`` is read (when the message is rendered or sent). Until then
+    the raw body can be written back without a decode/encode round trip.
+    """
+
+    def __init__(self, role: str, timestamp: Optional[str], codec: str,
+                 body: Union[str, bytes], token_count: Optional[int] = None,
+                 chat_id: Optional[int] = None, seq: Optional[int] = None,
+                 body_hash: Optional[str] = None):
+        super().__init__(role=role)
+        if timestamp:
+            self["timestamp"] = timestamp
+        self.codec = codec
+        self.body = body
+        self.token_count = token_count
+        # Where the row lives, so saves can skip messages already stored
+        self.chat_id = chat_id
+        self.seq = seq
+        # Key of the shared body in the bodies table, if it is stored there
+        self.body_hash = body_hash
+
+    @property
+    def is_loaded(self) -> bool:
+        """True once content has been decoded (or replaced)"""
+        return dict.__contains__(self, "content")
+
+    def _load(self):
+        if not self.is_loaded:
+            dict.__setitem__(self, "content", decode_body(self.codec, self.body))
+
+    def __missing__(self, key):
+        if key == "content":
+            self._load()
+            return dict.__getitem__(self, "content")
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "content":
+            # The stored body and token count no longer describe this message
+            self.body = None
+            self.body_hash = None
+            self.token_count = None
+        dict.__setitem__(self, key, value)
+
+    def __contains__(self, key):
+        return key == "content" or dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    # Anything that walks the whole dict (json.dumps, dict(msg), copies)
+    # needs the content, so decode first
+
+    def __iter__(self):
+        self._load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._load()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._load()
+        return dict.keys(self)
+
+    def values(self):
+        self._load()
+        return dict.values(self)
+
+    def items(self):
+        self._load()
+        return dict.items(self)
+
+    def copy(self):
+        self._load()
+        return dict(dict.items(self))
@@ -0,0 +1,244 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from .codec import RAW, decode_body, encode_body
+from .messages import INSERT_MESSAGE_SQL, STORAGE_ROWS, message_row
+
+# chats.storage value for chats whose messages live in an archive database
+STORAGE_ARCHIVED = 2
+
+# Archives compress almost everything, not just large bodies
+ARCHIVE_COMPRESS_THRESHOLD = 256
+
+# Chats moved per archive step, and pages released per vacuum step
+ARCHIVE_BATCH = 20
+VACUUM_PAGES_PER_STEP = 256
+
+# Databases from before auto_vacuum=INCREMENTAL need one full VACUUM to
+# convert, which holds the write lock throughout. Idle maintenance only does
+# that for files this small (well under a second); larger ones are left in
+# auto_vacuum=NONE until converted on purpose (``cli vacuum``).
+AUTO_CONVERT_MAX_BYTES = 16 * 1024 * 1024
+
+# Archived chats keep their row (title, folder, dates) in memories.db so they
+# still show up in the sidebar and title searches; only their message rows
+# move out, to one archive database per year of last update. Opening or
+# saving an archived chat restores it. Branched conversations stay put, as
+# their branches read shared history straight from the messages table.
+
+
+def archive_dir_for(db_path: Path) -> Path:
+    """Directory holding the archives of a memories.db"""
+    return db_path.parent / "archive"
+
+
+def archive_name(last_updated: str) -> str:
+    """Archive file a chat belongs in, by the year it was last updated"""
+    return f"chats-{(last_updated or '0000')[:4]}.db"
+
+
+def _attach(conn: sqlite3.Connection, archive_dir: Path, name: str):
+    """Attach an archive database as "cold", creating it if needed"""
+    archive_dir.mkdir(exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS cold", (str(archive_dir / name),))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cold.messages (
+            chat_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            timestamp TEXT,
+            codec TEXT NOT NULL,
+            body BLOB NOT NULL,
+            token_count INTEGER,
+            PRIMARY KEY (chat_id, seq)
+        )
+    """)
+
+
+def _detach(conn: sqlite3.Connection):
+    conn.execute("DETACH DATABASE cold")
+
+
+def archive_old_chats(conn: sqlite3.Connection, archive_dir: Path, older_than_days: int,
+                      limit: int = ARCHIVE_BATCH) -> int:
+    """Move up to limit chats untouched for older_than_days to archives
+
+    Returns how many chats were archived. ``conn`` must be in autocommit
+    mode (isolation_level None), see archive_chats.
+    """
+    rows = conn.execute(
+        """SELECT id, last_updated FROM chats
+           WHERE storage = ? AND last_updated < datetime('now', ?)
+             AND branch_root IS NULL
+             AND NOT EXISTS (SELECT 1 FROM chats b WHERE b.branch_root = chats.id)
+           ORDER BY last_updated LIMIT ?""",
+        (STORAGE_ROWS, f"-{int(older_than_days)} days", limit)
+    ).fetchall()
+    return archive_chats(conn, archive_dir, rows)
+
+
+def archive_chats(conn: sqlite3.Connection, archive_dir: Path, rows: List[Tuple[int, str]]) -> int:
+    """Move chats, given as (id, last_updated) rows, to their archives
+
+    ``conn`` must be in autocommit mode (isolation_level None): each
+    archive file is handled in its own transaction, which also covers the
+    attached database. Returns how many chats were archived.
+    """
+    by_archive: Dict[str, List[int]] = {}
+    for chat_id, last_updated in rows:
+        by_archive.setdefault(archive_name(last_updated), []).append(chat_id)
+
+    for name, chat_ids in by_archive.items():
+        _attach(conn, archive_dir, name)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for chat_id in chat_ids:
+                    cursor = conn.execute(
+                        """SELECT m.seq, m.role, m.timestamp, COALESCE(b.codec, m.codec),
+                                  COALESCE(b.body, m.body), m.token_count
+                           FROM main.messages m LEFT JOIN main.bodies b ON b.hash = m.body_hash
+                           WHERE m.chat_id = ?""",
+                        (chat_id,)
+                    )
+                    for seq, role, timestamp, codec, body, token_count in cursor.fetchall():
+                        if codec == RAW:
+                            codec, body = encode_body(
+                                decode_body(codec, body), threshold=ARCHIVE_COMPRESS_THRESHOLD
+                            )
+                        conn.execute(
+                            """INSERT OR REPLACE INTO cold.messages
+                               (chat_id, seq, role, timestamp, codec, body, token_count)
+                               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                            (chat_id, seq, role, timestamp, codec, body, token_count)
+                        )
+                    # Shared bodies lose a reference; collect_garbage drops them once unused
+                    conn.execute("DELETE FROM main.messages WHERE chat_id = ?", (chat_id,))
+                    conn.execute(
+                        "UPDATE main.chats SET storage = ?, archive = ? WHERE id = ?",
+                        (STORAGE_ARCHIVED, name, chat_id)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            _detach(conn)
+    return len(rows)
+
+
+def restore_chat(conn: sqlite3.Connection, archive_dir: Path, chat_id: int, name: str):
+    """Move an archived chat's messages back into memories.db
+
+    Bodies are stored as a save would store them: long ones shared through
+    the bodies table (see message_row), the rest inline. ``conn`` must be in autocommit mode (isolation_level None): ATTACH
+    can't run inside a transaction, so the restore is a transaction of its
+    own and has to happen before the caller starts the one using the chat.
+    """
+    if conn.in_transaction:
+        raise Exception("Archived chats must be restored outside a transaction")
+    _attach(conn, archive_dir, name)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT seq, role, timestamp, codec, body, token_count
+                   FROM cold.messages WHERE chat_id = ?""",
+                (chat_id,)
+            ).fetchall()
+            conn.execute("DELETE FROM main.messages WHERE chat_id = ?", (chat_id,))
+            conn.executemany(INSERT_MESSAGE_SQL, [
+                message_row(conn, chat_id, seq,
+                            {"role": role, "content": decode_body(codec, body), "timestamp": timestamp},
+                            token_count=token_count)
+                for seq, role, timestamp, codec, body, token_count in rows
+            ])
+            conn.execute("DELETE FROM cold.messages WHERE chat_id = ?", (chat_id,))
+            conn.execute(
+                "UPDATE main.chats SET storage = ?, archive = NULL WHERE id = ?",
+                (STORAGE_ROWS, chat_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        _detach(conn)
+
+
+def delete_archived_messages(conn: sqlite3.Connection, archive_dir: Path, chat_id: int, name: str):
+    """Remove an archived chat's messages from its archive"""
+    delete_archived_chats(conn, archive_dir, [chat_id], name)
+
+
+def delete_archived_chats(conn: sqlite3.Connection, archive_dir: Path, chat_ids: List[int], name: str):
+    """Remove the messages of several chats from one archive
+
+    ``conn`` must be in autocommit mode, as for restore_chat. Call it once
+    the chats themselves are deleted: if that fails, their messages are
+    still there.
+    """
+    if conn.in_transaction:
+        raise Exception("Archived messages must be deleted outside a transaction")
+    _attach(conn, archive_dir, name)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM cold.messages WHERE chat_id = ?", ((chat_id,) for chat_id in chat_ids))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        _detach(conn)
+
+
+def iter_archived_messages(archive_dir: Path, chat_id: int, name: str) -> Iterator[Dict]:
+    """Yield an archived chat's messages without restoring it"""
+    conn = sqlite3.connect(archive_dir / name)
+    try:
+        cursor = conn.execute(
+            """SELECT seq, role, timestamp, codec, body, token_count FROM messages
+               WHERE chat_id = ? ORDER BY seq""",
+            (chat_id,)
+        )
+        for seq, role, timestamp, codec, body, token_count in cursor:
+            yield {"seq": seq, "role": role, "content": decode_body(codec, body),
+                   "timestamp": timestamp, "token_count": token_count}
+    finally:
+        conn.close()
+
+
+def database_bytes(conn: sqlite3.Connection) -> int:
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_count * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def convert_to_incremental(conn: sqlite3.Connection) -> bool:
+    """Switch the file to auto_vacuum=INCREMENTAL with one full VACUUM
+
+    Holds the write lock until done, so other writers wait (or time out)
+    on a large file. Returns False if it was already converted.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def incremental_vacuum_step(conn: sqlite3.Connection, pages: int = VACUUM_PAGES_PER_STEP) -> int:
+    """Return up to pages free pages to the filesystem; returns pages still free
+
+    A file that predates auto_vacuum=INCREMENTAL is converted first if it
+    is small (see AUTO_CONVERT_MAX_BYTES); a larger one is skipped, with
+    nothing freed, until it has been converted by hand.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if database_bytes(conn) <= AUTO_CONVERT_MAX_BYTES:
+            convert_to_incremental(conn)
+        return 0
+    # The pragma frees one page per result row, so it has to be stepped through
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
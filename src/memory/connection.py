@@ -0,0 +1,17 @@
+import sqlite3
+from pathlib import Path
+
+# How long a connection waits for another writer (this app's other threads,
+# a second window, a script) before giving up with "database is locked"
+BUSY_TIMEOUT = 15.0
+
+
+def connect(db_path: Path, isolation_level: str = "IMMEDIATE") -> sqlite3.Connection:
+    """Open memories.db for a short unit of work
+
+    Transactions start with BEGIN IMMEDIATE, taking the write lock up front:
+    a deferred transaction that reads and then writes can fail with "database
+    is locked" straight away instead of waiting out the busy timeout. Pass
+    ``isolation_level=None`` to manage transactions by hand.
+    """
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=isolation_level)
@@ -1,78 +1,97 @@
 import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable, Tuple
 import json
+from .connection import connect
+from .migrations import migrate, BackfillRunner, BACKFILLS
+from .transfer import export_chats, import_chats
+from .bulk import move_items, delete_items, archive_items, selected_chat_ids
+from .analytics import record_usage, usage_by_day, usage_by_model, usage_by_chat
+from .messages import (store_messages, load_messages, load_message_page, load_message_window,
+                       delete_messages, collect_garbage, copy_messages, window_base, chat_segments,
+                       update_chat_totals, load_own_message, STORAGE_ROWS)
+from .backup import (create_backup, list_backups, rotate_backups, restore_backup,
+                     backup_dir_for)
+from .cold_storage import (archive_old_chats, restore_chat, delete_archived_messages,
+                           incremental_vacuum_step, convert_to_incremental, archive_dir_for,
+                           STORAGE_ARCHIVED)
+
+# Columns returned for chat listings (everything except the messages)
+CHAT_SUMMARY_COLUMNS = "id, title, folder_id, created_at, last_updated, model_name, token_count"
+
+# Chat listings only show conversations; their branches are reached from the chat
+ROOT_CHATS = "branch_parent IS NULL"
+
+# Entries kept in the change log for other instances to catch up from
+CHANGE_LOG_KEEP = 10000
 
 class ChatMemoryDB:
     def __init__(self):
         self.db_path = Path.home() / ".ollama_chat" / "memories.db"
         print(f"Database path: {self.db_path}")  # Debug print
         self.db_path.parent.mkdir(exist_ok=True)
+        self.archive_dir = archive_dir_for(self.db_path)
+        self.backup_dir = backup_dir_for(self.db_path)
         self.init_db()
     
     def init_db(self):
-        """Initialize database with proper prompt engineering support"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS folders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    parent_id INTEGER NULL,
-                    FOREIGN KEY (parent_id) REFERENCES folders (id)
-                )
-            """)
-            
-            # Add timestamp column to messages JSON structure
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    folder_id INTEGER NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    model_name TEXT NOT NULL,
-                    messages TEXT NOT NULL,  -- Each message will include a timestamp field
-                    FOREIGN KEY (folder_id) REFERENCES folders (id)
-                )
-            """)
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS prompt_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    role TEXT NOT NULL,
-                    template TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_used TIMESTAMP,
-                    effectiveness_score FLOAT DEFAULT 0.0  -- Track which templates work best
-                )
-            """)
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS personality_modifiers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    personality TEXT NOT NULL,
-                    effect TEXT NOT NULL,
-                    context TEXT,  -- Store when this modifier works best
-                    usage_count INTEGER DEFAULT 0
-                )
-            """)
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS writing_styles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    style TEXT NOT NULL,
-                    impact TEXT NOT NULL,
-                    best_use_cases TEXT,  -- JSON array of scenarios where this style shines
-                    performance_metrics TEXT  -- JSON object of effectiveness metrics
-                )
-            """)
+        """Initialize the database and apply any pending schema migrations"""
+        with connect(self.db_path) as conn:
+            # Only takes effect on a new file; older ones are converted by
+            # vacuum_step if small, otherwise by convert_to_incremental_vacuum
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # Readers don't block the writer (or other windows) and vice versa
+            conn.execute("PRAGMA journal_mode = WAL")
+            migrate(conn)
+            conn.execute(
+                "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+                (CHANGE_LOG_KEEP,)
+            )
         print("Database initialized")  # Debug print
     
+    def start_background_migrations(self, on_progress: Optional[Callable] = None) -> BackfillRunner:
+        """Start upgrading existing data in the background and return the runner"""
+        runner = BackfillRunner(self.db_path, BACKFILLS, on_progress=on_progress)
+        runner.start()
+        return runner
+    
+    def _restore_archived(self, chat_ids: List[int]) -> bool:
+        """Bring archived chats' messages back before they are read or written
+        
+        Each restore commits on its own connection (ATTACH can't run inside
+        a transaction), so call this before opening the connection whose
+        transaction uses the chats. Returns whether anything was restored.
+        """
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            restored = False
+            for chat_id in chat_ids:
+                row = conn.execute(
+                    "SELECT storage, archive FROM chats WHERE id = ?", (chat_id,)
+                ).fetchone()
+                if row and row[0] == STORAGE_ARCHIVED:
+                    restore_chat(conn, self.archive_dir, chat_id, row[1])
+                    restored = True
+            return restored
+        finally:
+            conn.close()
+    
+    def _chat_messages(self, conn: sqlite3.Connection, row: sqlite3.Row) -> List[Dict]:
+        """Messages of a chat row, from the JSON blob or the messages table
+        
+        conn mustn't be in a transaction if the chat may be archived.
+        """
+        if row["storage"] == STORAGE_ARCHIVED:
+            self._restore_archived([row["id"]])
+            return load_messages(conn, row["id"])
+        if row["storage"] == STORAGE_ROWS:
+            return load_messages(conn, row["id"])
+        return json.loads(row["messages"])
+    
     def create_folder(self, name: str, parent_id: Optional[int] = None) -> int:
         """Create a new folder and return its ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             cursor = conn.execute(
                 "INSERT INTO folders (name, parent_id) VALUES (?, ?)",
                 (name, parent_id)
@@ -81,22 +100,39 @@ def create_folder(self, name: str, parent_id: Optional[int] = None) -> int:
     
     def save_chat(self, title: str, messages: List[Dict], model_name: str, folder_id: Optional[int] = None) -> int:
         """Save a new chat and return its ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             cursor = conn.execute(
                 """INSERT INTO chats (title, messages, model_name, folder_id) 
-                   VALUES (?, ?, ?, ?)""",
-                (title, json.dumps(messages), model_name, folder_id)
+                   VALUES (?, '[]', ?, ?)""",
+                (title, model_name, folder_id)
             )
+            store_messages(conn, cursor.lastrowid, messages)
             return cursor.lastrowid
     
-    def get_chat(self, chat_id: int) -> Optional[Dict]:
-        """Retrieve a chat by ID"""
+    def get_chat(self, chat_id: int, message_limit: Optional[int] = None,
+                 token_budget: Optional[int] = None) -> Optional[Dict]:
+        """Retrieve a chat by ID
+        
+        With ``message_limit`` only the system prompt and the newest messages
+        are loaded (see load_message_window); older ones can be fetched with
+        get_messages_page. Without it the whole history is returned.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            # Opening an archived chat brings it back to the main file
+            self._restore_archived([chat_id])
+            with connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.execute("SELECT * FROM chats WHERE id = ?", (chat_id,))
                 row = cursor.fetchone()
                 
+                if row and message_limit is not None:
+                    if row["storage"] != STORAGE_ROWS:
+                        # Not reached by the background upgrade yet - convert it now
+                        store_messages(conn, chat_id, json.loads(row["messages"]))
+                    messages = load_message_window(conn, chat_id, message_limit, token_budget)
+                elif row:
+                    messages = self._chat_messages(conn, row)
+                
                 if row:
                     return {
                         "id": row["id"],
@@ -105,7 +141,10 @@ def get_chat(self, chat_id: int) -> Optional[Dict]:
                         "created_at": row["created_at"],
                         "last_updated": row["last_updated"],
                         "model_name": row["model_name"],
-                        "messages": json.loads(row["messages"])
+                        "token_count": row["token_count"],
+                        "revision": row["revision"],
+                        "root_id": row["branch_root"] or row["id"],
+                        "messages": messages
                     }
         except sqlite3.Error as e:
             print(f"Database error: {e}")
@@ -118,9 +157,119 @@ def get_chat(self, chat_id: int) -> Optional[Dict]:
             raise
         return None
     
+    def get_messages_page(self, chat_id: int, before_seq: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        """Get the messages just before before_seq (the newest if None), oldest first"""
+        with connect(self.db_path) as conn:
+            return load_message_page(conn, chat_id, before_seq, limit)
+    
+    def list_chats(self, folder_id: Optional[int] = None, before: Optional[Tuple[str, int]] = None,
+                   limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Get one page of chat summaries in a folder, most recently updated first
+        
+        Pass the ``(last_updated, id)`` of the last chat of a page as ``before``
+        to get the next one, or an ``offset`` to jump to any page (the
+        skipped rows are only counted in the index, never read).
+        """
+        with connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            if before is None:
+                cursor = conn.execute(
+                    f"""SELECT {CHAT_SUMMARY_COLUMNS} FROM chats
+                        WHERE folder_id IS ? AND {ROOT_CHATS}
+                        ORDER BY last_updated DESC, id DESC LIMIT ? OFFSET ?""",
+                    (folder_id, limit, offset)
+                )
+            else:
+                cursor = conn.execute(
+                    f"""SELECT {CHAT_SUMMARY_COLUMNS} FROM chats
+                        WHERE folder_id IS ? AND {ROOT_CHATS} AND (last_updated, id) < (?, ?)
+                        ORDER BY last_updated DESC, id DESC LIMIT ?""",
+                    (folder_id, before[0], before[1], limit)
+                )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def count_chats(self, folder_id: Optional[int] = None) -> int:
+        """Number of conversations in a folder"""
+        with connect(self.db_path) as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM chats WHERE folder_id IS ? AND {ROOT_CHATS}",
+                (folder_id,)
+            ).fetchone()[0]
+    
+    def get_chat_summary(self, chat_id: int) -> Optional[Dict]:
+        """Listing columns of a chat, or of its conversation if it is a branch"""
+        with connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                f"""SELECT {CHAT_SUMMARY_COLUMNS} FROM chats
+                    WHERE id = (SELECT COALESCE(branch_root, id) FROM chats WHERE id = ?)""",
+                (chat_id,)
+            ).fetchone()
+            return dict(row) if row else None
+    
+    def list_subfolders(self, parent_id: Optional[int] = None) -> List[Dict]:
+        """Folders directly inside parent_id, by name, each with a has_children flag
+
+        The top level (None) includes folders whose parent no longer exists.
+        """
+        if parent_id is None:
+            where = "f.parent_id IS NULL OR NOT EXISTS (SELECT 1 FROM folders p WHERE p.id = f.parent_id)"
+            params = ()
+        else:
+            where = "f.parent_id = ?"
+            params = (parent_id,)
+        with connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                f"""SELECT f.id, f.name, f.parent_id, f.created_at,
+                           EXISTS (SELECT 1 FROM folders c WHERE c.parent_id = f.id) AS has_children
+                    FROM folders f WHERE {where} ORDER BY f.name, f.id""",
+                params
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def list_titles(self) -> Tuple[List[Tuple], List[Tuple]]:
+        """Every chat as (id, title, folder_id, last_updated) and folder as (id, name)
+
+        Plain tuples, read in one go, for building the quick-switcher index.
+        """
+        with connect(self.db_path) as conn:
+            chats = conn.execute(
+                f"SELECT id, title, folder_id, last_updated FROM chats WHERE {ROOT_CHATS}"
+            ).fetchall()
+            folders = conn.execute("SELECT id, name FROM folders").fetchall()
+            return chats, folders
+    
+    def list_folder_paths(self) -> List[Tuple[int, str]]:
+        """Every folder as (id, "Parent / Child" path), sorted by path"""
+        with connect(self.db_path) as conn:
+            return conn.execute(
+                """WITH RECURSIVE paths(id, path, depth) AS (
+                       SELECT id, name, 0 FROM folders
+                       WHERE parent_id IS NULL OR parent_id NOT IN (SELECT id FROM folders)
+                       UNION ALL
+                       SELECT f.id, p.path || ' / ' || f.name, p.depth + 1
+                       FROM folders f JOIN paths p ON f.parent_id = p.id
+                       WHERE p.depth < 32
+                   )
+                   SELECT id, path FROM paths ORDER BY path COLLATE NOCASE"""
+            ).fetchall()
+    
+    def get_folder(self, folder_id: int) -> Optional[Dict]:
+        """One folder (as list_subfolders returns it), or None if it doesn't exist"""
+        with connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                """SELECT f.id, f.name, f.parent_id, f.created_at,
+                          EXISTS (SELECT 1 FROM folders c WHERE c.parent_id = f.id) AS has_children
+                   FROM folders f WHERE f.id = ?""",
+                (folder_id,)
+            ).fetchone()
+            return dict(row) if row else None
+    
     def get_folder_contents(self, folder_id: Optional[int] = None) -> Dict:
-        """Get contents of a folder"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Get contents of a folder (chat summaries only, without messages)"""
+        with connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             
             # Get subfolders
@@ -132,14 +281,10 @@ def get_folder_contents(self, folder_id: Optional[int] = None) -> Dict:
             
             # Get chats in this folder
             cursor = conn.execute(
-                "SELECT * FROM chats WHERE folder_id IS ? ORDER BY created_at DESC",
+                f"SELECT {CHAT_SUMMARY_COLUMNS} FROM chats WHERE folder_id IS ? AND {ROOT_CHATS} ORDER BY created_at DESC",
                 (folder_id,)
             )
-            chats = []
-            for row in cursor.fetchall():
-                chat_dict = dict(row)
-                chat_dict['messages'] = json.loads(chat_dict['messages'])
-                chats.append(chat_dict)
+            chats = [dict(row) for row in cursor.fetchall()]
             
             return {
                 "folders": folders,
@@ -148,7 +293,7 @@ def get_folder_contents(self, folder_id: Optional[int] = None) -> Dict:
     
     def rename_folder(self, folder_id: int, new_name: str):
         """Rename a folder"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.execute(
                 "UPDATE folders SET name = ? WHERE id = ?",
                 (new_name, folder_id)
@@ -156,7 +301,7 @@ def rename_folder(self, folder_id: int, new_name: str):
     
     def rename_chat(self, chat_id: int, new_title: str):
         """Rename a chat"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.execute(
                 "UPDATE chats SET title = ? WHERE id = ?",
                 (new_title, chat_id)
@@ -164,31 +309,99 @@ def rename_chat(self, chat_id: int, new_title: str):
     
     def move_chat(self, chat_id: int, new_folder_id: Optional[int]):
         """Move a chat to a different folder"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.execute(
                 "UPDATE chats SET folder_id = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
                 (new_folder_id, chat_id)
             )
     
     def delete_chat(self, chat_id: int):
-        """Delete a chat by ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+        """Delete a chat by ID, with the branches continuing it"""
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT storage, archive FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()
+            branch_ids = [branch_id for (branch_id,) in conn.execute(
+                """WITH RECURSIVE subtree(id) AS (
+                       SELECT id FROM chats WHERE branch_parent = ?
+                       UNION ALL
+                       SELECT c.id FROM chats c JOIN subtree s ON c.branch_parent = s.id
+                   )
+                   SELECT id FROM subtree""",
+                (chat_id,)
+            )]
+            for doomed_id in reversed([chat_id] + branch_ids):  # Leaves first
+                delete_messages(conn, doomed_id)
+                # Daily totals are kept; they describe load, not chats
+                conn.execute("DELETE FROM usage_chats WHERE chat_id = ?", (doomed_id,))
+                conn.execute("DELETE FROM chats WHERE id = ?", (doomed_id,))
+                conn.execute(
+                    "UPDATE chats SET active_branch = NULL WHERE active_branch = ?", (doomed_id,)
+                )
+        if row and row[0] == STORAGE_ARCHIVED:
+            # Once the chat is gone, in a transaction of its own (as bulk.delete_items)
+            conn = connect(self.db_path, isolation_level=None)
+            try:
+                delete_archived_messages(conn, self.archive_dir, chat_id, row[1])
+            finally:
+                conn.close()
     
     def delete_folder(self, folder_id: int):
-        """Delete a folder and all its contents"""
-        with sqlite3.connect(self.db_path) as conn:
-            # First move all chats to root level
+        """Delete a folder and its subfolders, moving their chats to the top level"""
+        with connect(self.db_path) as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS doomed_folders (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.doomed_folders")
             conn.execute(
-                "UPDATE chats SET folder_id = NULL WHERE folder_id = ?",
+                """INSERT INTO temp.doomed_folders (id)
+                   WITH RECURSIVE subtree(id) AS (
+                       SELECT id FROM folders WHERE id = ?
+                       UNION
+                       SELECT f.id FROM folders f JOIN subtree s ON f.parent_id = s.id
+                   )
+                   SELECT id FROM subtree""",
                 (folder_id,)
             )
-            # Then delete the folder
-            conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+            # First move all chats to root level
+            conn.execute(
+                "UPDATE chats SET folder_id = NULL WHERE folder_id IN (SELECT id FROM temp.doomed_folders)"
+            )
+            # Then delete the folders
+            conn.execute("DELETE FROM folders WHERE id IN (SELECT id FROM temp.doomed_folders)")
+    
+    def move_items(self, chat_ids: List[int], folder_ids: List[int], target_folder_id: Optional[int]) -> int:
+        """Move many chats and folders into a folder (None for the top level) at once"""
+        with connect(self.db_path) as conn:
+            return move_items(conn, chat_ids, folder_ids, target_folder_id)
+    
+    def delete_items(self, chat_ids: List[int], folder_ids: List[int]) -> Dict[str, int]:
+        """Delete many chats, and folders with everything in them, at once"""
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            return delete_items(conn, self.archive_dir, chat_ids, folder_ids)
+        finally:
+            conn.close()
+    
+    def archive_items(self, chat_ids: List[int], folder_ids: List[int]) -> int:
+        """Move many chats (and those in folders) to cold storage now"""
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            return archive_items(conn, self.archive_dir, chat_ids, folder_ids)
+        finally:
+            conn.close()
+    
+    def export_items(self, path: Path, chat_ids: List[int], folder_ids: List[int]) -> Dict[str, int]:
+        """Export the chats and folders picked in the sidebar to a JSONL archive"""
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            export_ids = selected_chat_ids(conn, chat_ids, folder_ids)
+        finally:
+            conn.close()
+        with open(path, "w", encoding="utf-8") as out:
+            return export_chats(self.db_path, out, folder_ids=folder_ids, chat_ids=export_ids)
     
     def debug_print_contents(self):
         """Print all database contents for debugging"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             
             print("\n=== Database Contents ===")
@@ -211,18 +424,257 @@ def debug_print_contents(self):
     
     def update_chat(self, chat_id: int, messages: List[Dict]):
         """Update an existing chat's messages"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._restore_archived([chat_id])
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE chats SET last_updated = CURRENT_TIMESTAMP, revision = revision + 1 WHERE id = ?",
+                (chat_id,)
+            )
+            store_messages(conn, chat_id, messages)
+    
+    def _save_conflict_copy(self, conn: sqlite3.Connection, chat_id: int, write: Dict) -> int:
+        """Save a write whose chat changed underneath it as a new chat; returns its ID
+        
+        The other version stays as it is, so neither side loses anything.
+        Messages older than the written window are copied from the original.
+        """
+        row = conn.execute(
+            "SELECT title, model_name, folder_id, branch_parent, branch_seq, branch_root FROM chats WHERE id = ?",
+            (chat_id,)
+        ).fetchone()
+        if row:
+            title, model_name, folder_id, branch_parent, branch_seq, branch_root = row
+        else:  # Deleted elsewhere
+            title = write.get("title") or "Recovered chat"
+            model_name = write.get("model_name") or "unknown"
+            folder_id = write.get("folder_id")
+            branch_parent, branch_seq, branch_root = None, 0, None
+        print(f"Chat {chat_id} was changed by another window; saving a copy")  # Debug print
+        
+        # A branch's copy becomes a sibling branch sharing the same history
+        cursor = conn.execute(
+            """INSERT INTO chats (title, messages, model_name, folder_id, branch_parent, branch_seq, branch_root) 
+               VALUES (?, '[]', ?, ?, ?, ?, ?)""",
+            (f"{title} (conflict copy)", model_name, folder_id, branch_parent, branch_seq, branch_root)
+        )
+        copy_id = cursor.lastrowid
+        copy_messages(conn, chat_id, copy_id, window_base(write["messages"]))
+        store_messages(conn, copy_id, write["messages"])
+        return copy_id
+    
+    def write_chats(self, writes: List[Dict]) -> List[Tuple[int, int]]:
+        """Apply several chat saves in a single transaction
+        
+        Each write is a dict with ``chat_id`` (None for a new chat), ``messages``
+        and optionally ``title``, ``model_name``, ``folder_id``, ``usage``
+        (replies to add to the usage summaries, see record_usage) and
+        ``revision``: the chat revision the messages are based on. If the chat
+        has moved past it (another window saved it), the write goes to a
+        conflict copy instead of overwriting. ``written`` (see
+        written_positions) describes the last write of the chat at that
+        revision, so messages it stored aren't written again.
+        
+        Returns ``(chat_id, revision)`` per write; chat_id differs from the
+        write's when a new chat or conflict copy was created.
+        """
+        results = []
+        # Restores commit on their own, so they happen before the batch starts
+        self._restore_archived([write["chat_id"] for write in writes if write.get("chat_id") is not None])
+        with connect(self.db_path) as conn:
+            for write in writes:
+                chat_id = write.get("chat_id")
+                if chat_id is None:
+                    cursor = conn.execute(
+                        """INSERT INTO chats (title, messages, model_name, folder_id) 
+                           VALUES (?, '[]', ?, ?)""",
+                        (write["title"], write["model_name"], write.get("folder_id"))
+                    )
+                    chat_id = cursor.lastrowid
+                    store_messages(conn, chat_id, write["messages"])
+                else:
+                    expected = write.get("revision")
+                    cursor = conn.execute(
+                        """UPDATE chats SET last_updated = CURRENT_TIMESTAMP, revision = revision + 1
+                           WHERE id = ? AND (? IS NULL OR revision = ?)""",
+                        (chat_id, expected, expected)
+                    )
+                    if cursor.rowcount:
+                        store_messages(conn, chat_id, write["messages"], write.get("written"))
+                    else:
+                        chat_id = self._save_conflict_copy(conn, chat_id, write)
+                    # Continuing a branch moves its conversation up the sidebar
+                    conn.execute(
+                        """UPDATE chats SET last_updated = CURRENT_TIMESTAMP
+                           WHERE id = (SELECT branch_root FROM chats WHERE id = ?)""",
+                        (chat_id,)
+                    )
+                
+                for usage in write.get("usage") or ():
+                    record_usage(conn, chat_id, usage)
+                revision = conn.execute(
+                    "SELECT revision FROM chats WHERE id = ?", (chat_id,)
+                ).fetchone()[0]
+                results.append((chat_id, revision))
+        return results
+    
+    def create_branch(self, chat_id: int, at_seq: int) -> int:
+        """Start a new branch of a conversation at ``at_seq``; returns its chat ID
+        
+        The branch shares every message before at_seq with ``chat_id`` (its
+        parent is whichever chat in the tree stores seq at_seq - 1) and holds
+        nothing of its own until it is saved. It becomes the conversation's
+        active branch.
+        """
+        self._restore_archived([chat_id])
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT title, model_name, folder_id, branch_root, storage, messages FROM chats WHERE id = ?",
+                (chat_id,)
+            ).fetchone()
+            if not row:
+                raise Exception(f"Chat {chat_id} not found")
+            title, model_name, folder_id, branch_root, storage, blob = row
+            if storage != STORAGE_ROWS:
+                # Branches share rows, so the chat has to be upgraded first
+                store_messages(conn, chat_id, json.loads(blob))
+            root_id = branch_root or chat_id
+            at_seq = max(at_seq, 1)  # The system prompt always belongs to the root
+            
+            parent_id = chat_id
+            for segment_id, first_seq, end_seq in chat_segments(conn, chat_id):
+                if first_seq <= at_seq - 1 and (end_seq is None or at_seq - 1 < end_seq):
+                    parent_id = segment_id
+            
+            cursor = conn.execute(
+                """INSERT INTO chats (title, messages, model_name, folder_id, storage,
+                                      branch_parent, branch_seq, branch_root) 
+                   VALUES (?, '[]', ?, ?, ?, ?, ?, ?)""",
+                (title, model_name, folder_id, STORAGE_ROWS, parent_id, at_seq, root_id)
+            )
+            branch_id = cursor.lastrowid
+            update_chat_totals(conn, branch_id)
+            conn.execute("UPDATE chats SET active_branch = ? WHERE id = ?", (branch_id, root_id))
+            return branch_id
+    
+    def list_branches(self, chat_id: int) -> List[Dict]:
+        """Every branch of the conversation chat_id belongs to, root first
+        
+        Each has ``id``, ``branch_parent``, ``branch_seq``, ``last_updated``,
+        ``token_count`` and ``preview``: the start of its first own message.
+        """
+        with connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            root_id = conn.execute(
+                "SELECT COALESCE(branch_root, id) FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()
+            if not root_id:
+                return []
+            cursor = conn.execute(
+                """SELECT id, branch_parent, branch_seq, last_updated, token_count FROM chats
+                   WHERE id = ? OR branch_root = ? ORDER BY id""",
+                (root_id[0], root_id[0])
+            )
+            branches = [dict(row) for row in cursor.fetchall()]
+            for branch in branches:
+                first = load_own_message(conn, branch["id"], max(branch["branch_seq"], 1))
+                branch["preview"] = first["content"][:40] if first else ""
+            return branches
+    
+    def get_active_branch(self, chat_id: int) -> int:
+        """The branch to open when a conversation is selected (chat_id if none)"""
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                """SELECT b.id FROM chats r JOIN chats b ON b.id = r.active_branch
+                   WHERE r.id = ?""",
+                (chat_id,)
+            ).fetchone()
+            return row[0] if row else chat_id
+    
+    def set_active_branch(self, chat_id: int):
+        """Remember chat_id as the branch to open for its conversation"""
+        with connect(self.db_path) as conn:
             conn.execute(
-                """UPDATE chats 
-                   SET messages = ?, last_updated = CURRENT_TIMESTAMP 
-                   WHERE id = ?""",
-                (json.dumps(messages), chat_id)
-            ) 
+                """UPDATE chats SET active_branch = ?
+                   WHERE id = (SELECT COALESCE(branch_root, id) FROM chats WHERE id = ?)""",
+                (chat_id, chat_id)
+            )
+    
+    def get_usage_summary(self, days: int = 30, top_chats: int = 10) -> Dict[str, List[Dict]]:
+        """Usage totals by day, by model and for the busiest chats"""
+        with connect(self.db_path) as conn:
+            return {
+                "days": usage_by_day(conn, days),
+                "models": usage_by_model(conn, days),
+                "chats": usage_by_chat(conn, top_chats),
+            }
+    
+    def archive_step(self, older_than_days: int) -> int:
+        """Move a small batch of stale chats to cold storage; returns how many moved"""
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            return archive_old_chats(conn, self.archive_dir, older_than_days)
+        finally:
+            conn.close()
+    
+    def collect_garbage_step(self) -> int:
+        """Drop a batch of shared message bodies nothing refers to; returns how many"""
+        with connect(self.db_path) as conn:
+            return collect_garbage(conn)
+    
+    def vacuum_step(self) -> int:
+        """Release some free pages back to the filesystem; returns pages still free"""
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            return incremental_vacuum_step(conn)
+        finally:
+            conn.close()
+    
+    def convert_to_incremental_vacuum(self) -> bool:
+        """Convert an older database so idle maintenance can vacuum it in steps
+        
+        Rewrites the whole file in one go and blocks other writers until it
+        is done; run it when the app is closed (see cli.py). Returns False
+        if there was nothing to convert.
+        """
+        conn = connect(self.db_path, isolation_level=None)
+        try:
+            return convert_to_incremental(conn)
+        finally:
+            conn.close()
+    
+    def create_backup(self, should_stop: Optional[Callable[[], bool]] = None, label: str = "") -> Path:
+        """Take an online backup of the database and its archives"""
+        return create_backup(self.db_path, self.archive_dir, self.backup_dir,
+                             should_stop=should_stop, label=label)
+    
+    def list_backups(self) -> List[Dict]:
+        """Completed backups, newest first"""
+        return list_backups(self.backup_dir)
+    
+    def rotate_backups(self, keep: int) -> int:
+        """Delete all but the newest keep backups"""
+        return rotate_backups(self.backup_dir, keep)
+    
+    def restore_backup(self, path: Path):
+        """Replace the current data with a backup, keeping a backup of it first"""
+        create_backup(self.db_path, self.archive_dir, self.backup_dir, label="pre-restore")
+        restore_backup(path, self.db_path, self.archive_dir)
+    
+    def export_jsonl(self, path: Path, folder_ids: Optional[List[int]] = None,
+                     since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """Stream chats (optionally filtered) to a JSONL archive file"""
+        with open(path, "w", encoding="utf-8") as out:
+            return export_chats(self.db_path, out, folder_ids=folder_ids, since=since, until=until)
+    
+    def import_jsonl(self, path: Path, folder_id: Optional[int] = None) -> Dict[str, int]:
+        """Stream a JSONL archive file into the database"""
+        with open(path, "r", encoding="utf-8") as lines:
+            return import_chats(self.db_path, lines, folder_id=folder_id)
     
     def debug_print_folders(self):
         """Print all folders for debugging"""
         print("\n=== All Folders ===")
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute("SELECT * FROM folders")
             folders = cursor.fetchall()
@@ -233,7 +685,7 @@ def debug_print_folders(self):
     def move_folder_chats_to_root(self, folder_id: int):
         """Move all chats in a folder to root level"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with connect(self.db_path) as conn:
                 conn.execute(
                     "UPDATE chats SET folder_id = NULL WHERE folder_id = ?",
                     (folder_id,)
@@ -244,12 +696,13 @@ def move_folder_chats_to_root(self, folder_id: int):
     
     def get_recent_chats(self, limit: int = 10) -> list:
         """Get most recent chats"""
-        with sqlite3.connect(self.db_path) as conn:  # Create connection
+        with connect(self.db_path) as conn:  # Create connection
+            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, title, messages, model_name, created_at
+                SELECT id, title, messages, storage, model_name, created_at
                 FROM chats
-                WHERE folder_id IS NULL
+                WHERE folder_id IS NULL AND branch_parent IS NULL
                 ORDER BY created_at DESC
                 LIMIT ?
             """, (limit,))
@@ -257,18 +710,18 @@ def get_recent_chats(self, limit: int = 10) -> list:
             chats = []
             for row in cursor.fetchall():
                 chats.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'messages': json.loads(row[2]),
-                    'model_name': row[3],
-                    'created_at': row[4]
+                    'id': row['id'],
+                    'title': row['title'],
+                    'messages': self._chat_messages(conn, row),
+                    'model_name': row['model_name'],
+                    'created_at': row['created_at']
                 })
             
             return chats 
     
     def save_prompt_template(self, role: str, template: str):
         """Save a prompt template that actually kicks ass"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.execute("""
                 INSERT INTO prompt_templates (role, template)
                 VALUES (?, ?)
@@ -279,7 +732,7 @@ def save_prompt_template(self, role: str, template: str):
     
     def get_prompt_template(self, role: str) -> Optional[str]:
         """Get a prompt template that's actually worth a damn"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             cursor = conn.execute(
                 "SELECT template FROM prompt_templates WHERE role = ?",
                 (role,)
@@ -289,7 +742,7 @@ def get_prompt_template(self, role: str) -> Optional[str]:
     
     def update_template_effectiveness(self, role: str, score: float):
         """Track which templates are actually doing their fucking job"""
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             conn.execute("""
                 UPDATE prompt_templates 
                 SET effectiveness_score = (effectiveness_score + ?) / 2
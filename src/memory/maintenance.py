@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from .backup import BackupInterrupted
+
+
+class MaintenanceTask:
+    """A housekeeping job split into small steps
+
+    ``step`` does a bounded amount of work and returns True while there is
+    more to do, so a step never holds the database for long.
+    """
+    name = "maintenance"
+
+    def step(self) -> bool:
+        raise NotImplementedError
+
+
+class ArchiveTask(MaintenanceTask):
+    """Move chats untouched for a while to cold storage"""
+    name = "archive"
+
+    def __init__(self, db, get_days: Callable[[], int]):
+        self.db = db
+        self.get_days = get_days  # Read on every step so settings changes apply
+
+    def step(self) -> bool:
+        days = self.get_days()
+        if days <= 0:
+            return False
+        return self.db.archive_step(days) > 0
+
+
+class GarbageCollectTask(MaintenanceTask):
+    """Drop shared message bodies that no message uses any more"""
+    name = "collect_garbage"
+
+    def __init__(self, db):
+        self.db = db
+
+    def step(self) -> bool:
+        return self.db.collect_garbage_step() > 0
+
+
+class BackupTask(MaintenanceTask):
+    """Take a backup when the last one is older than the configured interval
+
+    The backup copies a few pages at a time and gives up as soon as
+    ``is_idle`` turns False; it starts over the next time the app is idle.
+    """
+    name = "backup"
+
+    def __init__(self, db, get_interval_hours: Callable[[], int], get_keep: Callable[[], int],
+                 is_idle: Callable[[], bool]):
+        self.db = db
+        self.get_interval_hours = get_interval_hours
+        self.get_keep = get_keep
+        self.is_idle = is_idle
+
+    def step(self) -> bool:
+        hours = self.get_interval_hours()
+        if hours <= 0:
+            return False
+        backups = self.db.list_backups()
+        if backups and datetime.now() - backups[0]["created"] < timedelta(hours=hours):
+            return False
+        try:
+            path = self.db.create_backup(should_stop=lambda: not self.is_idle())
+        except BackupInterrupted:
+            return True
+        print(f"Backed up chats to {path}")  # Debug print
+        self.db.rotate_backups(self.get_keep())
+        return False
+
+
+class VacuumTask(MaintenanceTask):
+    """Give pages freed by deletes and archiving back to the filesystem"""
+    name = "vacuum"
+
+    def __init__(self, db):
+        self.db = db
+
+    def step(self) -> bool:
+        return self.db.vacuum_step() > 0
+
+
+class IdleMaintenance:
+    """Runs maintenance steps one at a time on a background thread
+
+    Call ``run_step`` whenever the app has been idle for a while. Tasks run
+    in order: a task only gets a step once the ones before it are done, so
+    vacuuming waits until archiving has caught up.
+    """
+
+    def __init__(self, tasks: List[MaintenanceTask]):
+        self.tasks = tasks
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self._idle_tasks = set()  # Tasks with nothing left to do this session
+        self._lock = threading.Lock()
+
+    def run_step(self) -> bool:
+        """Queue one step of the first task with work left; False if all are done"""
+        if self._future is not None and not self._future.done():
+            return True  # Previous step still running
+        task = self._next_task()
+        if task is None:
+            return False
+        self._future = self._executor.submit(self._run, task)
+        return True
+
+    def reset(self):
+        """Look for new work again, e.g. after chats were deleted"""
+        with self._lock:
+            self._idle_tasks.clear()
+
+    def _next_task(self) -> Optional[MaintenanceTask]:
+        with self._lock:
+            for task in self.tasks:
+                if task not in self._idle_tasks:
+                    return task
+        return None
+
+    def _run(self, task: MaintenanceTask):
+        try:
+            more = task.step()
+        except Exception as e:
+            print(f"Maintenance step '{task.name}' failed: {e}")
+            more = False
+        if not more:
+            with self._lock:
+                self._idle_tasks.add(task)
+
+    def stop(self):
+        """Wait for a running step to finish and shut the worker down"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,347 @@
+import hashlib
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from ..utils import count_tokens
+from .codec import RAW, StoredMessage, encode_body
+
+# chats.storage values
+STORAGE_BLOB = 0  # Messages live in the chats.messages JSON column
+STORAGE_ROWS = 1  # Messages live in the messages table
+
+# Bodies at least this long are stored once in the bodies table, keyed by
+# their hash, and shared by every message with the same text (the system
+# prompt of every chat, copied histories). Shorter ones stay inline, where a
+# separate row and a hash would cost more than they save.
+DEDUP_THRESHOLD = 256
+
+# Message columns in StoredMessage argument order. Shared bodies are looked
+# up through the join; inline rows keep theirs in messages.body.
+_MESSAGE_SELECT = """SELECT m.role, m.timestamp, COALESCE(b.codec, m.codec), COALESCE(b.body, m.body),
+                            m.token_count, m.chat_id, m.seq, m.body_hash
+                     FROM messages m LEFT JOIN bodies b ON b.hash = m.body_hash"""
+
+INSERT_MESSAGE_SQL = """INSERT INTO messages (chat_id, seq, role, timestamp, codec, body, token_count, body_hash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def body_hash_of(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def intern_body(conn: sqlite3.Connection, text: str) -> str:
+    """Store a body in the bodies table unless it is already there; returns its hash
+
+    Known bodies aren't compressed again, so re-saving a shared system
+    prompt writes nothing but the message row. Reference counts are kept
+    by triggers on the messages table.
+    """
+    body_hash = body_hash_of(text)
+    if conn.execute("SELECT 1 FROM bodies WHERE hash = ?", (body_hash,)).fetchone() is None:
+        codec, body = encode_body(text)
+        conn.execute(
+            "INSERT INTO bodies (hash, codec, body) VALUES (?, ?, ?)",
+            (body_hash, codec, body)
+        )
+    return body_hash
+
+
+def collect_garbage(conn: sqlite3.Connection, limit: int = 500) -> int:
+    """Delete up to limit shared bodies no message refers to; returns how many"""
+    return conn.execute(
+        """DELETE FROM bodies WHERE hash IN (
+               SELECT hash FROM bodies WHERE refcount <= 0 LIMIT ?
+           )""",
+        (limit,)
+    ).rowcount
+
+
+def chat_segments(conn: sqlite3.Connection, chat_id: int) -> List[Tuple[int, int, Optional[int]]]:
+    """Where a chat's messages are stored, as (chat_id, first_seq, end_seq), oldest first
+
+    A plain chat is a single segment, (chat_id, 0, None). A branch reads
+    the seqs before its branch_seq from its parent, which may itself be a
+    branch; end_seq is exclusive and None for the chat itself.
+    """
+    rows = conn.execute(
+        """WITH RECURSIVE chain(id, parent, first_seq, end_seq) AS (
+               SELECT id, branch_parent, branch_seq, NULL FROM chats WHERE id = ?
+               UNION ALL
+               SELECT c.id, c.branch_parent, c.branch_seq, chain.first_seq
+               FROM chats c JOIN chain ON c.id = chain.parent
+           )
+           SELECT id, first_seq, end_seq FROM chain""",
+        (chat_id,)
+    ).fetchall()
+    if not rows:
+        return [(chat_id, 0, None)]
+    rows.reverse()
+    return [(row[0], row[1] if i else 0, row[2]) for i, row in enumerate(rows)]
+
+
+def segments_filter(segments: List[Tuple[int, int, Optional[int]]], alias: str = "m") -> Tuple[str, Tuple]:
+    """SQL condition (and its parameters) matching the rows of a chat's segments"""
+    if len(segments) == 1:
+        return f"{alias}.chat_id = ?", (segments[0][0],)
+    clauses = []
+    params = []
+    for chat_id, first_seq, end_seq in segments:
+        if end_seq is None:
+            clauses.append(f"({alias}.chat_id = ? AND {alias}.seq >= ?)")
+            params += [chat_id, first_seq]
+        else:
+            clauses.append(f"({alias}.chat_id = ? AND {alias}.seq >= ? AND {alias}.seq < ?)")
+            params += [chat_id, first_seq, end_seq]
+    return "(" + " OR ".join(clauses) + ")", tuple(params)
+
+
+def _segment_owner(segments: List[Tuple[int, int, Optional[int]]], seq: int) -> int:
+    """ID of the chat whose rows hold seq"""
+    for chat_id, first_seq, end_seq in reversed(segments):
+        if seq >= first_seq:
+            return chat_id
+    return segments[0][0]
+
+
+def _is_stored_at(msg: Dict, chat_id: int, seq: int) -> bool:
+    """True if msg is an unmodified row already saved at this position"""
+    return (isinstance(msg, StoredMessage) and msg.body is not None
+            and msg.chat_id == chat_id and msg.seq == seq)
+
+
+def message_row(conn: sqlite3.Connection, chat_id: int, seq: int, msg: Dict,
+                token_count: Optional[int] = None) -> Tuple:
+    """Values for INSERT_MESSAGE_SQL, encoding the body unless it is already stored
+
+    Long bodies go to the bodies table and the row only gets their hash.
+    """
+    body_hash = None
+    if isinstance(msg, StoredMessage) and msg.body is not None:
+        codec, body, tokens = msg.codec, msg.body, msg.token_count
+        if msg.body_hash:
+            # Shared body - make sure it wasn't collected since it was loaded
+            conn.execute(
+                "INSERT OR IGNORE INTO bodies (hash, codec, body) VALUES (?, ?, ?)",
+                (msg.body_hash, codec, body)
+            )
+            codec, body, body_hash = RAW, "", msg.body_hash
+    elif len(msg["content"]) >= DEDUP_THRESHOLD:
+        codec, body, body_hash = RAW, "", intern_body(conn, msg["content"])
+        tokens = token_count
+    else:
+        codec, body = encode_body(msg["content"])
+        tokens = token_count
+    if tokens is None:
+        tokens = int(count_tokens(msg["content"]))
+    return (chat_id, seq, msg["role"], msg.get("timestamp"), codec, body, tokens, body_hash)
+
+
+def window_base(messages: List[Dict]) -> int:
+    """Seq of messages[1] if the list is a window loaded from storage, else 1
+
+    Copies of a chat (see copy_messages) keep the original's seqs, so a
+    window loaded from the original still lines up with the copy.
+    """
+    if len(messages) > 1 and isinstance(messages[1], StoredMessage) and messages[1].seq is not None:
+        return messages[1].seq
+    return 1
+
+
+def copy_messages(conn: sqlite3.Connection, from_chat: int, to_chat: int, below_seq: int):
+    """Copy the rows of from_chat with 0 < seq < below_seq to to_chat
+
+    Shared bodies are copied by reference, so this only writes small rows.
+    """
+    conn.execute(
+        """INSERT INTO messages (chat_id, seq, role, timestamp, codec, body, token_count, body_hash)
+           SELECT ?, seq, role, timestamp, codec, body, token_count, body_hash
+           FROM messages WHERE chat_id = ? AND seq > 0 AND seq < ?""",
+        (to_chat, from_chat, below_seq)
+    )
+
+
+def written_positions(messages: List[Dict]) -> Dict[int, Dict]:
+    """Seq -> message of a list store_messages has just saved (and committed)
+
+    Passed as ``written`` to the chat's next save, it lets messages added
+    in this session (plain dicts, not loaded rows) count as stored.
+    """
+    if not messages:
+        return {}
+    base_seq = window_base(messages)
+    positions = {0: messages[0]}
+    for i, msg in enumerate(messages[1:]):
+        positions[base_seq + i] = msg
+    return positions
+
+
+def store_messages(conn: sqlite3.Connection, chat_id: int, messages: List[Dict],
+                   written: Optional[Dict[int, Dict]] = None) -> int:
+    """Save a chat's messages and return the chat's total token count
+
+    ``messages[0]`` is the system prompt (seq 0). The rest may be only the
+    newest window of the chat, as returned by load_message_window: if
+    ``messages[1]`` came from stored rows, its seq says where the window
+    starts and older rows are left alone. Messages already stored at their
+    position are skipped, so saving after a reply only writes the reply:
+    rows that were loaded, and the very objects the last save of this chat
+    wrote, if ``written`` (see written_positions) describes it. The caller
+    must know those rows are unchanged since, e.g. by the chat's revision.
+
+    A branch only writes from its branch_seq on; the history it shares with
+    its parent is never rewritten through it (edits make a new branch). Its
+    system prompt is the conversation's and is saved with the root: saving
+    a branch with a different one raises an exception.
+    """
+    segments = chat_segments(conn, chat_id)
+    own_first_seq = segments[-1][1]
+
+    def is_stored(msg: Dict, owner: int, seq: int) -> bool:
+        return _is_stored_at(msg, owner, seq) or (
+            owner == chat_id and written is not None and written.get(seq) is msg)
+
+    if not messages:
+        conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+    else:
+        base_seq = window_base(messages)
+
+        root_id = segments[0][0]
+        if root_id != chat_id and not _is_stored_at(messages[0], root_id, 0):
+            stored = load_own_message(conn, root_id, 0)
+            if stored is None or stored["content"] != messages[0]["content"]:
+                raise Exception(
+                    f"Chat {chat_id} is a branch; its system prompt belongs to chat {root_id}"
+                )
+        elif not is_stored(messages[0], root_id, 0):
+            conn.execute("DELETE FROM messages WHERE chat_id = ? AND seq = 0", (root_id,))
+            conn.execute(INSERT_MESSAGE_SQL, message_row(conn, root_id, 0, messages[0]))
+
+        # Skip the stored prefix of the window, rewrite everything after it
+        window = messages[1:]
+        first_dirty = 0
+        while first_dirty < len(window) and is_stored(
+                window[first_dirty], _segment_owner(segments, base_seq + first_dirty), base_seq + first_dirty):
+            first_dirty += 1
+        first_dirty = max(first_dirty, own_first_seq - base_seq)
+
+        conn.execute(
+            "DELETE FROM messages WHERE chat_id = ? AND seq >= ?",
+            (chat_id, base_seq + first_dirty)
+        )
+        conn.executemany(
+            INSERT_MESSAGE_SQL,
+            [message_row(conn, chat_id, base_seq + i, msg)
+             for i, msg in enumerate(window) if i >= first_dirty]
+        )
+
+    return update_chat_totals(conn, chat_id, segments)
+
+
+def update_chat_totals(conn: sqlite3.Connection, chat_id: int,
+                       segments: Optional[List[Tuple[int, int, Optional[int]]]] = None) -> int:
+    """Mark a chat as row-stored and refresh its token count from its rows
+
+    A branch's count includes the history it shares with its parent.
+    """
+    where, params = segments_filter(segments or chat_segments(conn, chat_id))
+    total_tokens = conn.execute(
+        f"SELECT COALESCE(SUM(m.token_count), 0) FROM messages m WHERE {where}",
+        params
+    ).fetchone()[0]
+    conn.execute(
+        "UPDATE chats SET messages = '[]', storage = ?, token_count = ? WHERE id = ?",
+        (STORAGE_ROWS, total_tokens, chat_id)
+    )
+    return total_tokens
+
+
+def load_messages(conn: sqlite3.Connection, chat_id: int) -> List[StoredMessage]:
+    """Load all of a chat's message rows without decoding their bodies"""
+    where, params = segments_filter(chat_segments(conn, chat_id))
+    cursor = conn.execute(
+        f"{_MESSAGE_SELECT} WHERE {where} ORDER BY m.seq",
+        params
+    )
+    return [StoredMessage(*row) for row in cursor.fetchall()]
+
+
+def load_message_page(conn: sqlite3.Connection, chat_id: int,
+                      before_seq: Optional[int] = None, limit: int = 50) -> List[StoredMessage]:
+    """Load up to limit messages just before before_seq (newest if None), oldest first
+
+    Never includes the system prompt at seq 0.
+    """
+    where, params = segments_filter(chat_segments(conn, chat_id))
+    if before_seq is None:
+        cursor = conn.execute(
+            f"""{_MESSAGE_SELECT}
+                WHERE {where} AND m.seq > 0
+                ORDER BY m.seq DESC LIMIT ?""",
+            params + (limit,)
+        )
+    else:
+        cursor = conn.execute(
+            f"""{_MESSAGE_SELECT}
+                WHERE {where} AND m.seq > 0 AND m.seq < ?
+                ORDER BY m.seq DESC LIMIT ?""",
+            params + (before_seq, limit)
+        )
+    page = [StoredMessage(*row) for row in cursor.fetchall()]
+    page.reverse()
+    return page
+
+
+def load_message_window(conn: sqlite3.Connection, chat_id: int, limit: int,
+                        token_budget: Optional[int] = None) -> List[StoredMessage]:
+    """System prompt plus the newest messages of a chat
+
+    Loads at least ``limit`` messages, and keeps going back while the window
+    still fits in ``token_budget`` so the model sees the same context it
+    would have with the full history. Only the (chat_id, seq, token_count)
+    index is walked to size the window.
+    """
+    where, params = segments_filter(chat_segments(conn, chat_id))
+    start_seq = None
+    if token_budget:
+        tokens = 0
+        cursor = conn.execute(
+            f"""SELECT m.seq, m.token_count FROM messages m
+                WHERE {where} AND m.seq > 0 ORDER BY m.seq DESC""",
+            params
+        )
+        for count, (seq, token_count) in enumerate(cursor):
+            tokens += token_count or 0
+            if count >= limit and tokens > token_budget:
+                break
+            start_seq = seq
+        cursor.close()
+
+    if start_seq is not None:
+        cursor = conn.execute(
+            f"{_MESSAGE_SELECT} WHERE {where} AND m.seq >= ? ORDER BY m.seq",
+            params + (start_seq,)
+        )
+        window = [StoredMessage(*row) for row in cursor.fetchall()]
+    else:
+        window = load_message_page(conn, chat_id, limit=limit)
+
+    system = conn.execute(
+        f"{_MESSAGE_SELECT} WHERE {where} AND m.seq = 0",
+        params
+    ).fetchone()
+    return ([StoredMessage(*system)] if system else []) + window
+
+
+def load_own_message(conn: sqlite3.Connection, chat_id: int, seq: int) -> Optional[StoredMessage]:
+    """The message stored in chat_id itself at seq (not one shared from a parent)"""
+    row = conn.execute(
+        f"{_MESSAGE_SELECT} WHERE m.chat_id = ? AND m.seq = ?",
+        (chat_id, seq)
+    ).fetchone()
+    return StoredMessage(*row) if row else None
+
+
+def delete_messages(conn: sqlite3.Connection, chat_id: int):
+    """Delete a chat's message rows and any shared bodies only it used"""
+    conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+    collect_garbage(conn)
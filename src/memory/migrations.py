@@ -0,0 +1,478 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+import json
+
+from ..utils import count_tokens
+from .codec import RAW, decode_body
+from .connection import connect
+from .messages import store_messages, intern_body, DEDUP_THRESHOLD, STORAGE_BLOB
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    """Total token estimate for a list of chat messages"""
+    return int(sum(count_tokens(msg.get("content", "")) for msg in messages))
+
+
+# --- Schema migrations -----------------------------------------------------
+#
+# Each migration is a function taking an open connection. They run in order
+# inside a transaction and bump PRAGMA user_version when they succeed, so an
+# existing memories.db upgrades in place. Keep these cheap: anything that has
+# to touch every chat belongs in a Backfill below.
+
+def _v1_base_schema(conn: sqlite3.Connection):
+    """Tables from before versioned migrations existed"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            parent_id INTEGER NULL,
+            FOREIGN KEY (parent_id) REFERENCES folders (id)
+        )
+    """)
+
+    # Add timestamp column to messages JSON structure
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            folder_id INTEGER NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            model_name TEXT NOT NULL,
+            messages TEXT NOT NULL,  -- Each message will include a timestamp field
+            FOREIGN KEY (folder_id) REFERENCES folders (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS prompt_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT NOT NULL,
+            template TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used TIMESTAMP,
+            effectiveness_score FLOAT DEFAULT 0.0  -- Track which templates work best
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS personality_modifiers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            personality TEXT NOT NULL,
+            effect TEXT NOT NULL,
+            context TEXT,  -- Store when this modifier works best
+            usage_count INTEGER DEFAULT 0
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS writing_styles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            style TEXT NOT NULL,
+            impact TEXT NOT NULL,
+            best_use_cases TEXT,  -- JSON array of scenarios where this style shines
+            performance_metrics TEXT  -- JSON object of effectiveness metrics
+        )
+    """)
+
+
+def _v2_unique_template_roles(conn: sqlite3.Connection):
+    """Give save_prompt_template's upsert the unique constraint it targets"""
+    # Keep only the newest template per role before adding the constraint
+    conn.execute("""
+        DELETE FROM prompt_templates
+        WHERE id NOT IN (SELECT MAX(id) FROM prompt_templates GROUP BY role)
+    """)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_prompt_templates_role ON prompt_templates (role)"
+    )
+
+
+def _v3_chat_token_counts(conn: sqlite3.Connection):
+    """Add a cached token count per chat and index folder listings"""
+    # NULL means "not counted yet"; the token_counts backfill fills it in
+    conn.execute("ALTER TABLE chats ADD COLUMN token_count INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chats_folder ON chats (folder_id, created_at)"
+    )
+
+
+def _v4_message_rows(conn: sqlite3.Connection):
+    """Store messages as rows with an optional compression codec"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,  -- Position within the chat
+            role TEXT NOT NULL,
+            timestamp TEXT,
+            codec TEXT NOT NULL DEFAULT 'raw',  -- raw, zlib or zstd (see codec.py)
+            body BLOB NOT NULL,
+            token_count INTEGER,
+            FOREIGN KEY (chat_id) REFERENCES chats (id),
+            UNIQUE (chat_id, seq)
+        )
+    """)
+    # Existing chats keep their JSON blob until the message_rows backfill moves them
+    conn.execute(f"ALTER TABLE chats ADD COLUMN storage INTEGER NOT NULL DEFAULT {STORAGE_BLOB}")
+
+
+def _v5_keyset_indexes(conn: sqlite3.Connection):
+    """Indexes for paging chats by (last_updated, id) and sizing message windows"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chats_folder_updated ON chats (folder_id, last_updated, id)"
+    )
+    # Covers window sizing so it never has to read message bodies
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_tokens ON messages (chat_id, seq, token_count)"
+    )
+
+
+def _v6_cold_storage(conn: sqlite3.Connection):
+    """Track which archive database holds an archived chat's messages"""
+    conn.execute("ALTER TABLE chats ADD COLUMN archive TEXT")
+
+
+def _v7_shared_bodies(conn: sqlite3.Connection):
+    """Content-addressed message bodies with reference counts"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bodies (
+            hash TEXT PRIMARY KEY,  -- sha256 of the message text
+            codec TEXT NOT NULL,
+            body BLOB NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0  -- Messages pointing here
+        )
+    """)
+    # Rows with a body_hash keep an empty inline body
+    conn.execute("ALTER TABLE messages ADD COLUMN body_hash TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bodies_unused ON bodies (refcount) WHERE refcount <= 0"
+    )
+
+    # Keep refcounts right however rows are written, rewritten or deleted
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_body_insert AFTER INSERT ON messages
+        WHEN NEW.body_hash IS NOT NULL
+        BEGIN
+            UPDATE bodies SET refcount = refcount + 1 WHERE hash = NEW.body_hash;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_body_delete AFTER DELETE ON messages
+        WHEN OLD.body_hash IS NOT NULL
+        BEGIN
+            UPDATE bodies SET refcount = refcount - 1 WHERE hash = OLD.body_hash;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_body_update AFTER UPDATE OF body_hash ON messages
+        WHEN OLD.body_hash IS NOT NEW.body_hash
+        BEGIN
+            UPDATE bodies SET refcount = refcount - 1 WHERE hash = OLD.body_hash;
+            UPDATE bodies SET refcount = refcount + 1 WHERE hash = NEW.body_hash;
+        END
+    """)
+
+
+def _v8_usage_summaries(conn: sqlite3.Connection):
+    """Usage totals per (day, model) and per chat, kept up to date on save"""
+    # ttft_ms and eval_ms are summed time to first token and generation time;
+    # loads counts replies that had to load the model first
+    totals = """requests INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                ttft_ms REAL NOT NULL DEFAULT 0,
+                eval_ms REAL NOT NULL DEFAULT 0,
+                loads INTEGER NOT NULL DEFAULT 0"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            day TEXT NOT NULL,  -- YYYY-MM-DD, local time
+            model_name TEXT NOT NULL,
+            {totals},
+            PRIMARY KEY (day, model_name)
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS usage_chats (
+            chat_id INTEGER PRIMARY KEY,
+            {totals}
+        )
+    """)
+
+
+def _v9_revisions_and_changes(conn: sqlite3.Connection):
+    """Per-chat revision counter and a log of changes for other instances"""
+    # Bumped on every message write; saves based on an older revision conflict
+    conn.execute("ALTER TABLE chats ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,  -- 'chat' or 'folder'
+            item_id INTEGER NOT NULL,
+            revision INTEGER,  -- New revision when a chat's messages changed
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Filled by triggers so every writer (other windows, scripts) is logged.
+    # Only what another window shows is logged - not token counts or archiving.
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS chats_logged_insert AFTER INSERT ON chats
+        BEGIN
+            INSERT INTO changes (kind, item_id, revision) VALUES ('chat', NEW.id, NEW.revision);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS chats_logged_update AFTER UPDATE OF title, folder_id, revision ON chats
+        BEGIN
+            INSERT INTO changes (kind, item_id, revision)
+            VALUES ('chat', NEW.id, CASE WHEN NEW.revision != OLD.revision THEN NEW.revision END);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS chats_logged_delete AFTER DELETE ON chats
+        BEGIN
+            INSERT INTO changes (kind, item_id, deleted) VALUES ('chat', OLD.id, 1);
+        END
+    """)
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS folders_logged_{event.lower()} AFTER {event} ON folders
+            BEGIN
+                INSERT INTO changes (kind, item_id, deleted)
+                VALUES ('folder', {row}.id, {1 if event == "DELETE" else 0});
+            END
+        """)
+
+
+def _v10_branches(conn: sqlite3.Connection):
+    """Conversation trees: a branch is a chat that continues another one part way"""
+    # A branch stores only its own messages, from branch_seq on; the ones
+    # before are read from branch_parent (and its parents), so every variant
+    # of a conversation shares the history it was forked from
+    conn.execute("ALTER TABLE chats ADD COLUMN branch_parent INTEGER REFERENCES chats (id)")
+    conn.execute("ALTER TABLE chats ADD COLUMN branch_seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE chats ADD COLUMN branch_root INTEGER REFERENCES chats (id)")
+    # Set on the root: the branch opened when the conversation is selected
+    conn.execute("ALTER TABLE chats ADD COLUMN active_branch INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chats_branch_root ON chats (branch_root) WHERE branch_root IS NOT NULL"
+    )
+
+
+def _v11_folder_parent_index(conn: sqlite3.Connection):
+    """Index for reading one level of the folder tree at a time"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders (parent_id, name)")
+
+
+MIGRATIONS = [
+    _v1_base_schema,
+    _v2_unique_template_roles,
+    _v3_chat_token_counts,
+    _v4_message_rows,
+    _v5_keyset_indexes,
+    _v6_cold_storage,
+    _v7_shared_bodies,
+    _v8_usage_summaries,
+    _v9_revisions_and_changes,
+    _v10_branches,
+    _v11_folder_parent_index,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Bring the schema up to SCHEMA_VERSION and return the starting version"""
+    start_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if start_version > SCHEMA_VERSION:
+        raise Exception(
+            f"memories.db schema version {start_version} is newer than this app supports ({SCHEMA_VERSION})"
+        )
+
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # Manage transactions explicitly so DDL is atomic
+    try:
+        for version in range(start_version + 1, SCHEMA_VERSION + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                MIGRATIONS[version - 1](conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"Migrated database to schema version {version}")  # Debug print
+    finally:
+        conn.isolation_level = previous_isolation
+    return start_version
+
+
+# --- Background backfills --------------------------------------------------
+#
+# A backfill walks existing rows in small batches after startup. Each batch is
+# its own short transaction, and progress is tracked by the data itself (e.g.
+# rows whose column is still NULL), so an interrupted backfill simply resumes
+# on the next launch.
+
+class Backfill:
+    """Incremental data upgrade run by BackfillRunner"""
+    name = ""
+    description = ""
+
+    def pending_count(self, conn: sqlite3.Connection) -> int:
+        """Number of rows still waiting to be processed"""
+        raise NotImplementedError
+
+    def run_batch(self, conn: sqlite3.Connection, batch_size: int) -> int:
+        """Process up to batch_size rows and return how many were done"""
+        raise NotImplementedError
+
+
+class TokenCountBackfill(Backfill):
+    """Fill chats.token_count for chats saved before it existed"""
+    name = "token_counts"
+    description = "Counting tokens"
+
+    def pending_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM chats WHERE token_count IS NULL").fetchone()[0]
+
+    def run_batch(self, conn: sqlite3.Connection, batch_size: int) -> int:
+        rows = conn.execute(
+            "SELECT id, messages FROM chats WHERE token_count IS NULL LIMIT ?",
+            (batch_size,)
+        ).fetchall()
+        for chat_id, messages in rows:
+            try:
+                token_count = count_message_tokens(json.loads(messages))
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                token_count = 0  # Unreadable blob - don't retry it forever
+            conn.execute(
+                "UPDATE chats SET token_count = ? WHERE id = ?",
+                (token_count, chat_id)
+            )
+        return len(rows)
+
+
+class MessageRowsBackfill(Backfill):
+    """Move messages out of chats.messages JSON into compressed rows"""
+    name = "message_rows"
+    description = "Compressing messages"
+
+    def pending_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COUNT(*) FROM chats WHERE storage = ?", (STORAGE_BLOB,)
+        ).fetchone()[0]
+
+    def run_batch(self, conn: sqlite3.Connection, batch_size: int) -> int:
+        rows = conn.execute(
+            "SELECT id, messages FROM chats WHERE storage = ? LIMIT ?",
+            (STORAGE_BLOB, batch_size)
+        ).fetchall()
+        for chat_id, messages in rows:
+            try:
+                messages = json.loads(messages)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable messages for chat {chat_id}")
+                messages = []
+            store_messages(conn, chat_id, messages)
+        return len(rows)
+
+
+class SharedBodiesBackfill(Backfill):
+    """Move long inline message bodies into the shared bodies table"""
+    name = "shared_bodies"
+    description = "Deduplicating messages"
+
+    _PENDING = f"""body_hash IS NULL AND (codec != '{RAW}' OR length(body) >= {DEDUP_THRESHOLD})"""
+
+    def pending_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(f"SELECT COUNT(*) FROM messages WHERE {self._PENDING}").fetchone()[0]
+
+    def run_batch(self, conn: sqlite3.Connection, batch_size: int) -> int:
+        rows = conn.execute(
+            f"SELECT id, codec, body FROM messages WHERE {self._PENDING} LIMIT ?",
+            (batch_size,)
+        ).fetchall()
+        for message_id, codec, body in rows:
+            body_hash = intern_body(conn, decode_body(codec, body))
+            conn.execute(
+                "UPDATE messages SET body_hash = ?, codec = ?, body = '' WHERE id = ?",
+                (body_hash, RAW, message_id)
+            )
+        return len(rows)
+
+
+# Moving messages to rows also counts their tokens, so run it first
+BACKFILLS = [
+    MessageRowsBackfill(),
+    SharedBodiesBackfill(),
+    TokenCountBackfill(),
+]
+
+
+class BackfillRunner:
+    """Runs pending backfills on a background thread
+
+    ``on_progress(backfill, done, total)`` is called from the runner thread
+    after every batch, and once more with ``backfill=None`` when all
+    backfills have finished.
+    """
+
+    def __init__(self, db_path: Path, backfills: List[Backfill],
+                 on_progress: Optional[Callable] = None,
+                 batch_size: int = 50, pause: float = 0.05):
+        self.db_path = db_path
+        self.backfills = backfills
+        self.on_progress = on_progress
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db-backfill", daemon=True)
+
+    def start(self):
+        """Start working through the backfills"""
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop after the current batch; remaining work resumes next launch"""
+        self.on_progress = None
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _report(self, backfill: Optional[Backfill], done: int, total: int):
+        on_progress = self.on_progress
+        if on_progress:
+            try:
+                on_progress(backfill, done, total)
+            except Exception as e:
+                print(f"Error reporting backfill progress: {e}")
+
+    def _run(self):
+        """Runner thread main loop"""
+        conn = connect(self.db_path)
+        try:
+            for backfill in self.backfills:
+                total = backfill.pending_count(conn)
+                done = 0
+                while done < total and not self._stop.is_set():
+                    with conn:  # One short transaction per batch
+                        processed = backfill.run_batch(conn, self.batch_size)
+                    if not processed:
+                        break
+                    done += processed
+                    self._report(backfill, min(done, total), total)
+                    # Let the UI's writer get at the database between batches
+                    self._stop.wait(self.pause)
+                if self._stop.is_set():
+                    return
+            self._report(None, 0, 0)
+        except sqlite3.Error as e:
+            print(f"Database backfill error: {e}")
+        finally:
+            conn.close()
@@ -1,8 +1,17 @@
 import customtkinter as ctk
-from typing import Optional, Callable, Dict
+from typing import Optional, Callable, Dict, List
 from .database import ChatMemoryDB
+from .sidebar_model import SidebarModel, ChatIndex
 import tkinter as tk
 import tkinter.messagebox as messagebox
+import tkinter.filedialog as filedialog
+import sys
+import threading
+from pathlib import Path
+
+# Chat list rows are all this tall, plus this many spare rows above and below the view
+CHAT_ROW_HEIGHT = 34
+CHAT_ROW_OVERSCAN = 4
 
 class ToolTip:
     def __init__(self, widget):
@@ -33,6 +42,199 @@ def hidetip(self):
         if tw:
             tw.destroy()
 
+class VirtualChatList(ctk.CTkFrame):
+    """Scrolling chat list with widgets only for the rows on screen
+
+    Rows have a fixed height, so which chats are visible follows from the
+    scroll offset alone. A pool of row widgets - enough to fill the view
+    plus a few rows of overscan - is pointed at other chats as the list
+    scrolls. Chats come from a ChatIndex, which reads only the pages that
+    come into view, so scrolling or refreshing costs the same for ten
+    chats or ten thousand.
+    """
+
+    def __init__(self, master, is_current: Callable, on_click: Callable,
+                 on_delete: Callable, on_rename: Callable, is_selected: Callable = None,
+                 on_select: Callable = None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.is_current = is_current  # chat_id -> True for the open chat
+        self.on_click = on_click
+        self.on_delete = on_delete
+        self.on_rename = on_rename  # (event, chat_id, button)
+        self.is_selected = is_selected or (lambda chat_id: False)
+        self.on_select = on_select  # (chat_id, index, extend) on Ctrl/Shift+click
+        
+        self._index: Optional[ChatIndex] = None
+        self._offset = 0  # Pixels scrolled from the top
+        self._rows: List[ctk.CTkFrame] = []
+        self._bound: Dict[int, ctk.CTkFrame] = {}  # Index -> row showing that chat
+        self._enabled = True
+        
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.pack(side="left", fill="both", expand=True)
+        self.viewport.bind("<Configure>", lambda e: self._render())
+        self._bind_scroll(self.viewport)
+    
+    @property
+    def index(self) -> Optional[ChatIndex]:
+        return self._index
+    
+    @property
+    def _total(self) -> int:
+        return self._index.total if self._index is not None else 0
+    
+    def show(self, index: ChatIndex):
+        """Show another folder's chats, from the top"""
+        self._index = index
+        self._offset = 0
+        self.refresh_rows()
+    
+    def refresh_rows(self):
+        """Point the rows on screen at the chats now in their place"""
+        for position in list(self._bound):
+            self._release(position)
+        self._render()
+    
+    def update_row(self, position: int):
+        """Redraw the row of one chat that changed in place"""
+        row = self._bound.get(position)
+        chat = self._index.get(position) if self._index is not None else None
+        if row is not None and chat is not None:
+            self._bind(row, position, chat)
+    
+    def repaint(self):
+        """Update highlighting and enabled state of the rows on screen"""
+        for row in self._bound.values():
+            self._paint(row)
+    
+    def set_enabled(self, enabled: bool):
+        """Enable or disable every row, including ones created later"""
+        self._enabled = enabled
+        self.repaint()
+    
+    def _make_row(self) -> ctk.CTkFrame:
+        row = ctk.CTkFrame(self.viewport, fg_color="transparent", height=CHAT_ROW_HEIGHT)
+        row._chat_id = None
+        row.button = ctk.CTkButton(
+            row,
+            text="",
+            anchor="w",
+            fg_color="transparent",
+            text_color="gray",
+            hover_color="#333333",
+            command=lambda: self.on_click(row._chat_id)
+        )
+        row.button._chat_id = None
+        row.button.pack(side="left", fill="x", expand=True)
+        row.button.bind("<Double-Button-1>", lambda e: self.on_rename(e, row._chat_id, row.button))
+        # More specific than the plain release the button opens the chat on, so these replace it
+        row.button.bind("<Control-ButtonRelease-1>", lambda e: self._select(row, extend=False))
+        row.button.bind("<Shift-ButtonRelease-1>", lambda e: self._select(row, extend=True))
+        
+        row.delete_btn = ctk.CTkButton(
+            row,
+            text="🗑",
+            width=30,
+            fg_color="transparent",
+            hover_color="#333333",
+            text_color="gray",
+            command=lambda: self.on_delete(row._chat_id)
+        )
+        row.delete_btn.pack(side="right")
+        
+        for widget in (row, row.button, row.delete_btn):
+            self._bind_scroll(widget)
+        self._rows.append(row)
+        return row
+    
+    def _select(self, row: ctk.CTkFrame, extend: bool):
+        if self.on_select is not None and row._chat_id is not None and self._enabled:
+            self.on_select(row._chat_id, row._list_index, extend)
+        return "break"
+    
+    def _paint(self, row: ctk.CTkFrame):
+        state = "normal" if self._enabled else "disabled"
+        row.button.configure(
+            text_color="white" if self.is_current(row._chat_id) else "gray",
+            fg_color="#2b2b2b" if self.is_selected(row._chat_id) else "transparent",
+            state=state
+        )
+        row.delete_btn.configure(state=state)
+    
+    def _bind(self, row: ctk.CTkFrame, index: int, chat: Dict):
+        row._chat_id = chat["id"]
+        row._list_index = index
+        row.button._chat_id = chat["id"]
+        row.button.configure(text=f"💬 {chat['title']}")
+        self._paint(row)
+        self._bound[index] = row
+    
+    def _release(self, index: int):
+        row = self._bound.pop(index)
+        row._chat_id = None
+        row.place_forget()
+    
+    def _render(self):
+        """Point the row pool at the chats in view and position it"""
+        height = self.viewport.winfo_height()
+        if height <= 1:
+            return  # Not laid out yet
+        content_height = self._total * CHAT_ROW_HEIGHT
+        self._offset = max(0, min(self._offset, content_height - height))
+        
+        first = max(0, self._offset // CHAT_ROW_HEIGHT - CHAT_ROW_OVERSCAN)
+        end = min(self._total, (self._offset + height) // CHAT_ROW_HEIGHT + 1 + CHAT_ROW_OVERSCAN)
+        
+        for index in [index for index in self._bound if not first <= index < end]:
+            self._release(index)
+        free = [row for row in self._rows if row._chat_id is None]
+        for index in range(first, end):
+            if index in self._bound:
+                continue
+            chat = self._index.get(index)
+            if chat is None:
+                break  # Fewer chats than counted (deleted meanwhile)
+            self._bind(free.pop() if free else self._make_row(), index, chat)
+        
+        for index, row in self._bound.items():
+            row.place(x=0, y=index * CHAT_ROW_HEIGHT - self._offset, relwidth=1.0, height=CHAT_ROW_HEIGHT)
+        
+        if content_height > height:
+            self.scrollbar.set(self._offset / content_height, (self._offset + height) / content_height)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def _scroll_to(self, offset: int):
+        self._offset = int(offset)
+        self._render()
+    
+    def _on_scrollbar(self, action: str, amount, unit: str = None):
+        if action == "moveto":
+            self._scroll_to(float(amount) * self._total * CHAT_ROW_HEIGHT)
+        elif unit == "pages":
+            self._scroll_to(self._offset + int(amount) * self.viewport.winfo_height())
+        else:
+            self._scroll_to(self._offset + int(amount) * CHAT_ROW_HEIGHT)
+    
+    def _on_mousewheel(self, event):
+        if event.num == 4:  # Linux scroll up
+            steps = -1
+        elif event.num == 5:  # Linux scroll down
+            steps = 1
+        else:  # Windows/macOS
+            steps = -1 if event.delta > 0 else 1
+        self._scroll_to(self._offset + steps * CHAT_ROW_HEIGHT)
+        return "break"
+    
+    def _bind_scroll(self, widget):
+        if sys.platform.startswith("win") or sys.platform == "darwin":
+            widget.bind("<MouseWheel>", self._on_mousewheel, add="+")
+        else:  # Linux
+            widget.bind("<Button-4>", self._on_mousewheel, add="+")
+            widget.bind("<Button-5>", self._on_mousewheel, add="+")
+
 class MemorySidebar(ctk.CTkFrame):
     def __init__(self, parent, on_chat_selected: Callable, on_new_chat: Callable):
         super().__init__(parent, width=250)
@@ -49,14 +251,29 @@ def __init__(self, parent, on_chat_selected: Callable, on_new_chat: Callable):
         self.configure(width=self.expanded_width)
         self._force_width = True
         
-        self.db = ChatMemoryDB()
+        # Share the app's database so migrations and writes go through one instance
+        self.db = parent.memory_db if hasattr(parent, 'memory_db') else ChatMemoryDB()
         self.on_chat_selected = on_chat_selected
         self.on_new_chat = on_new_chat
         self.current_folder_id = None
         self.current_chat_id = None
         
-        # Mapping from folder_id to subfolder_container for toggle functionality
-        self.folder_containers = {}
+        # Folder ID -> tree node (row plus a frame for its subfolders)
+        self._folder_nodes = {}
+        # Multi-selection (Ctrl/Shift+click) for bulk actions
+        self.selected_chats = set()
+        self.selected_folders = set()
+        self._selection_anchor = None  # List index Shift+click extends from
+        # Folders showing their subfolders; kept across rebuilds
+        self._expanded_folders = set()
+        self._prefetching = set()
+        
+        # Folders and chats shown, patched by change events instead of reloading
+        self.model = SidebarModel(self.db)
+        self.model.subscribe(self._on_model_event)
+        
+        # Folder whose chats the chat list shows
+        self._chats_folder_id = None
         
         # Create context menus
         self._setup_context_menus()
@@ -132,10 +349,11 @@ def setup_ui(self):
             text="+ New Folder",
             width=120,
             command=self.create_folder,  # Will be updated when showing folder contents
-            fg_color=self.parent.settings.theme_color,
+            fg_color=self.parent.theme.color("accent"),
             hover_color="#000000"
         )
         self.folder_action_btn.pack(side="right", padx=5)
+        self.parent.theme.bind(self.folder_action_btn, "accent", "fg_color")
         
         # Folder tree
         self.folder_tree = ctk.CTkScrollableFrame(
@@ -163,53 +381,82 @@ def setup_ui(self):
             text="+ New Chat",
             width=120,
             command=self._handle_new_chat,
-            fg_color=self.parent.settings.theme_color,
+            fg_color=self.parent.theme.color("accent"),
             hover_color="#000000"
         )
         self.new_chat_btn.pack(side="right", padx=5)
+        self.parent.theme.bind(self.new_chat_btn, "accent", "fg_color")
         
-        # Recent chats list (scrollable)
-        self.recent_list = ctk.CTkScrollableFrame(
+        # Recent chats list (only the visible rows have widgets)
+        self.recent_list = VirtualChatList(
             self,
+            is_current=lambda chat_id: chat_id is not None and chat_id == self.current_chat_id,
+            on_click=self._handle_chat_click,
+            on_delete=self.delete_chat,
+            on_rename=self._start_rename,
+            is_selected=lambda chat_id: chat_id in self.selected_chats,
+            on_select=self._select_chat,
             height=200
         )
         self.recent_list.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        # Actions for everything Ctrl/Shift+clicked; shown only while something is selected
+        self.bulk_bar = ctk.CTkFrame(self, fg_color="transparent")
+        self.bulk_label = ctk.CTkLabel(self.bulk_bar, text="", font=("Helvetica", 11))
+        self.bulk_label.pack(side="left", padx=(10, 0))
+        for text, command in (("✕", self.clear_selection), ("🗑", self._bulk_delete),
+                              ("⤓", self._bulk_export), ("🗄", self._bulk_archive),
+                              ("Move", self._show_bulk_move_menu)):
+            ctk.CTkButton(
+                self.bulk_bar,
+                text=text,
+                width=30 if len(text) == 1 else 50,
+                fg_color="transparent",
+                hover_color="#333333",
+                command=command
+            ).pack(side="right", padx=1)
+
+    def _show_chats(self, folder_id: Optional[int]):
+        """Show the chats in a folder, from the top"""
+        self._chats_folder_id = folder_id
+        self.recent_list.show(self.model.chat_index(folder_id))
+    
+    def highlight_chat(self, chat_id: Optional[int]):
+        """Mark chat_id as the open chat"""
+        self.current_chat_id = chat_id
+        self.recent_list.repaint()
 
     def load_contents(self):
-        """Load folders and recent chats"""
+        """Build the folder tree and chat list from the model"""
         # Clear existing content
         for widget in self.folder_tree.winfo_children():
             widget.destroy()
-        for widget in self.recent_list.winfo_children():
-            widget.destroy()
+        self._folder_nodes = {}
+        self._folder_buttons = []
         
-        # Load root folders
-        self._load_folder_contents(None, self.folder_tree, 0)
+        # Top-level folders; subfolders are added as folders are expanded
+        for folder in self.model.subfolders(None):
+            self._add_folder_node(folder)
         
         # If we're in a folder, show its contents
-        if self.current_folder_id is not None:
-            contents = self.db.get_folder_contents(self.current_folder_id)
-            folder_name = None
-            
-            # Find the folder name
-            for folder in self.db.get_folder_contents(None)['folders']:
-                if folder['id'] == self.current_folder_id:
-                    folder_name = folder['name']
-                    break
-            
-            if folder_name:
-                # Update header text and buttons
-                self.chats_label.configure(text=f"📂 {folder_name}")
-                self.new_chat_btn.configure(text=f"+ 💬 in {folder_name}")
-                
-                # Change folder action button to exit
-                self.folder_action_btn.configure(
-                    text="← Exit Folder",
-                    command=self._handle_back_click
-                )
+        folder_name = self.model.folder_name(self.current_folder_id)
+        if self.current_folder_id is not None and folder_name is None:
+            self.current_folder_id = None  # Deleted
+        self._show_folder_header(folder_name)
+        self._show_chats(self.current_folder_id)
+    
+    def _show_folder_header(self, folder_name: Optional[str]):
+        """Header and buttons for the selected folder (None for the top level)"""
+        if folder_name:
+            # Update header text and buttons
+            self.chats_label.configure(text=f"📂 {folder_name}")
+            self.new_chat_btn.configure(text=f"+ 💬 in {folder_name}")
             
-            for chat in contents['chats']:
-                self.add_chat_item(chat)
+            # Change folder action button to exit
+            self.folder_action_btn.configure(
+                text="← Exit Folder",
+                command=self._handle_back_click
+            )
         else:
             # Reset to default state
             self.chats_label.configure(text="💬 Quick Chats")
@@ -218,25 +465,127 @@ def load_contents(self):
                 text="+ New Folder",
                 command=self.create_folder
             )
-            
-            contents = self.db.get_folder_contents(None)
-            for chat in contents["chats"]:
-                self.add_chat_item(chat)
-    
-    def _load_folder_contents(self, folder_id: Optional[int], parent_widget: ctk.CTkFrame, level: int):
-        """Recursively load folder contents"""
-        contents = self.db.get_folder_contents(folder_id)
-        print(f"Loading folder contents for folder_id={folder_id}")  # Debug print
-        print(f"Folders found: {contents['folders']}")  # NEW DEBUG LINE
-        
-        # Add folders
-        for folder in contents['folders']:
-            print(f"Creating folder UI for: {folder['name']}")  # NEW DEBUG LINE
-            folder_frame = self.create_folder_item(folder, level, parent_widget)
-            folder_frame.pack(fill="x", pady=2)
-            
-            # Recursively load subfolders
-            self._load_folder_contents(folder['id'], folder_frame, level + 1)
+    
+    def _folder_level(self, folder: Dict) -> int:
+        level = 0
+        parent_id = folder["parent_id"]
+        while parent_id in self.model.folders and level < 32:
+            level += 1
+            parent_id = self.model.folders[parent_id]["parent_id"]
+        return level
+    
+    def _add_folder_node(self, folder: Dict):
+        """Add a folder to the tree, in name order, if its parent is open"""
+        parent_id = folder["parent_id"] if folder["parent_id"] in self.model.folders else None
+        parent = self._folder_nodes.get(parent_id)
+        if parent_id is not None and (parent is None or not parent.children_built):
+            return  # Built when the parent is first expanded
+        container = parent.children_frame if parent is not None else self.folder_tree
+        
+        node = ctk.CTkFrame(container, fg_color="transparent")
+        node.children_frame = ctk.CTkFrame(node, fg_color="transparent")
+        node.children_built = False
+        node.row = self.create_folder_item(folder, self._folder_level(folder), node)
+        self._folder_nodes[folder["id"]] = node
+        
+        # Keep siblings sorted by name: go before the first later one already shown
+        sibling_ids = [sibling["id"] for sibling in self.model.subfolders(parent_id)]
+        later = [self._folder_nodes[sibling_id]
+                 for sibling_id in sibling_ids[sibling_ids.index(folder["id"]) + 1:]
+                 if sibling_id in self._folder_nodes]
+        if later:
+            node.pack(fill="x", before=later[0])
+        else:
+            node.pack(fill="x")
+        
+        if folder["id"] in self._expanded_folders:
+            if folder["has_children"]:
+                self._expand_folder(folder["id"])
+            else:
+                self._expanded_folders.discard(folder["id"])
+    
+    def _expand_folder(self, folder_id: int):
+        """Show a folder's subfolders, reading them the first time"""
+        node = self._folder_nodes.get(folder_id)
+        if node is None or node.toggle_btn is None:
+            return
+        self._expanded_folders.add(folder_id)
+        if not node.children_built:
+            node.children_built = True
+            for subfolder in self.model.subfolders(folder_id):
+                self._add_folder_node(subfolder)
+        node.children_frame.pack(fill="x")
+        node.toggle_btn.configure(text="▾")
+    
+    def _collapse_folder(self, folder_id: int):
+        """Hide a folder's subfolders (their rows are kept for next time)"""
+        self._expanded_folders.discard(folder_id)
+        node = self._folder_nodes.get(folder_id)
+        if node is None or node.toggle_btn is None:
+            return
+        node.children_frame.pack_forget()
+        node.toggle_btn.configure(text="▸")
+    
+    def _toggle_folder(self, folder_id: int):
+        if folder_id in self._expanded_folders:
+            self._collapse_folder(folder_id)
+        else:
+            self._expand_folder(folder_id)
+    
+    def _prefetch_folder(self, folder_id: int):
+        """Read a hovered folder's subfolders in the background so expanding is instant"""
+        if (not self.parent.settings.prefetch_folders_on_hover or folder_id in self._prefetching
+                or self.model.is_loaded(folder_id)):
+            return
+        self._prefetching.add(folder_id)
+        
+        def fetch():
+            try:
+                fetched = self.model.fetch_subfolders(folder_id)
+            except Exception as e:
+                print(f"Error prefetching folder {folder_id}: {e}")
+                fetched = None
+            self.after(0, lambda: store(fetched))
+        
+        def store(fetched):
+            self._prefetching.discard(folder_id)
+            if fetched is not None:
+                self.model.store_subfolders(folder_id, fetched)
+        
+        threading.Thread(target=fetch, daemon=True).start()
+    
+    def _remove_folder_node(self, folder_id: int):
+        node = self._folder_nodes.pop(folder_id, None)
+        if node is None:
+            return
+        for child_id in [fid for fid, child in self._folder_nodes.items() if child.master is node.children_frame]:
+            self._remove_folder_node(child_id)
+        node.destroy()
+    
+    def _on_model_event(self, event: str, item_id: Optional[int] = None, position: Optional[int] = None):
+        """Patch the widgets affected by one change in the model"""
+        if event == "reset":
+            self.load_contents()
+        elif event == "chat_updated":
+            if item_id == self._chats_folder_id:
+                self.recent_list.update_row(position)
+        elif event == "chats_changed":
+            if item_id == self._chats_folder_id:
+                self.recent_list.refresh_rows()
+        elif event in ("folder_added", "folder_updated"):
+            # Renames can change its place among its siblings, so re-add it
+            # (its open subfolders are rebuilt from the model's cache)
+            self._remove_folder_node(item_id)
+            self._add_folder_node(self.model.folders[item_id])
+            if item_id == self.current_folder_id:
+                self._show_folder_header(self.model.folder_name(item_id))
+        elif event == "folder_removed":
+            self._remove_folder_node(item_id)
+            self._expanded_folders.discard(item_id)
+            if item_id == self.current_folder_id:
+                self.current_folder_id = None
+                self._show_folder_header(None)
+                self._show_chats(None)
     
     def create_folder_item(self, folder: Dict, level: int, parent: ctk.CTkFrame) -> ctk.CTkFrame:
         """Create a folder item in the tree"""
@@ -250,6 +599,23 @@ def create_folder_item(self, folder: Dict, level: int, parent: ctk.CTkFrame) ->
             indent = ctk.CTkFrame(row, width=20 * level, fg_color="transparent")
             indent.pack(side="left")
         
+        # Expander, only for folders with subfolders (a spacer keeps names aligned)
+        if folder['has_children']:
+            toggle_btn = ctk.CTkButton(
+                row,
+                text="▾" if folder['id'] in self._expanded_folders else "▸",
+                width=16,
+                fg_color="transparent",
+                hover_color="#333333",
+                text_color="gray",
+                command=lambda fid=folder['id']: self._toggle_folder(fid)
+            )
+            toggle_btn.pack(side="left")
+            parent.toggle_btn = toggle_btn
+        else:
+            ctk.CTkFrame(row, width=16, fg_color="transparent").pack(side="left")
+            parent.toggle_btn = None
+        
         # Folder button - use closed folder emoji by default
         folder_btn = ctk.CTkButton(
             row,
@@ -268,6 +634,10 @@ def create_folder_item(self, folder: Dict, level: int, parent: ctk.CTkFrame) ->
         
         # Store reference to update colors later
         folder_btn._folder_id = folder['id']  # Store ID for reference
+        parent.folder_btn = folder_btn
+        if folder['id'] in self.selected_folders:
+            folder_btn.configure(fg_color="#2b2b2b")
+        folder_btn.bind("<Control-ButtonRelease-1>", lambda e, fid=folder['id']: self._select_folder(fid))
         if not hasattr(self, '_folder_buttons'):
             self._folder_buttons = []
         self._folder_buttons.append(folder_btn)
@@ -286,6 +656,8 @@ def create_folder_item(self, folder: Dict, level: int, parent: ctk.CTkFrame) ->
         )
         
         def on_enter(event=None):
+            if folder['has_children'] and event is not None and event.type == tk.EventType.Enter:
+                self._prefetch_folder(folder['id'])
             x = row.winfo_width() - delete_btn.winfo_reqwidth() - 5
             y = (row.winfo_height() - delete_btn.winfo_reqheight()) // 2
             delete_btn.place(x=x, y=y)
@@ -327,78 +699,156 @@ def _handle_folder_click(self, folder_id: int):
                 )
         
         # Reset chat button colors
-        for btn in getattr(self, '_chat_buttons', []):
-            if btn.winfo_exists():
-                btn.configure(text_color="gray")
-        
-        # Update UI for folder contents
-        contents = self.db.get_folder_contents(folder_id)
-        folder_name = None
+        self.recent_list.repaint()
         
-        # Find the folder name
-        for folder in self.db.get_folder_contents(None)['folders']:
-            if folder['id'] == folder_id:
-                folder_name = folder['name']
-                break
+        # Update header text and buttons
+        self._show_folder_header(self.model.folder_name(folder_id))
         
-        # Update UI
-        if folder_name:
-            # Update header text and buttons
-            self.chats_label.configure(text=f"📂 {folder_name}")
-            self.new_chat_btn.configure(text=f"+ 💬 in {folder_name}")
-            
-            # Change folder action button to exit
-            self.folder_action_btn.configure(
-                text="← Exit Folder",
-                command=self._handle_back_click
-            )
-        
-        # Clear and update recent list
-        for widget in self.recent_list.winfo_children():
-            widget.destroy()
-        
-        # Show chats in this folder
-        for chat in contents['chats']:
-            self.add_chat_item(chat)
+        # Show the first page of chats in this folder
+        self._show_chats(folder_id)
     
-    def add_chat_item(self, chat: Dict):
-        """Add a chat item to the list"""
-        # Create container frame
-        container = ctk.CTkFrame(self.recent_list, fg_color="transparent")
-        container.pack(fill="x", pady=2)
-        
-        # Create button with chat title - add 💬 emoji before title
-        chat_btn = ctk.CTkButton(
-            container,
-            text=f"💬 {chat['title']}",
-            anchor="w",
-            fg_color="transparent",
-            text_color="white" if chat["id"] == self.current_chat_id else "gray",
-            hover_color="#333333",
-            command=lambda: self._handle_chat_click(chat["id"])
-        )
-        chat_btn._chat_id = chat["id"]  # Store chat ID
-        chat_btn.pack(side="left", fill="x", expand=True)
-        
-        # Add double-click binding for rename
-        chat_btn.bind("<Double-Button-1>", lambda e, cid=chat["id"]: self._start_rename(e, cid, chat_btn))
-        
-        # Create delete button with transparent background
-        delete_btn = ctk.CTkButton(
-            container,
-            text="🗑",
-            width=30,
-            fg_color="transparent",
-            hover_color="#333333",
-            text_color="gray",
-            command=lambda: self.delete_chat(chat["id"])
+    def _select_chat(self, chat_id: int, index: int, extend: bool):
+        """Ctrl+click toggles a chat; Shift+click selects the range from the last one"""
+        if extend and self._selection_anchor is not None and self.recent_list.index is not None:
+            low, high = sorted((self._selection_anchor, index))
+            for position in range(low, high + 1):
+                chat = self.recent_list.index.get(position)
+                if chat is not None:
+                    self.selected_chats.add(chat["id"])
+        elif chat_id in self.selected_chats:
+            self.selected_chats.discard(chat_id)
+        else:
+            self.selected_chats.add(chat_id)
+        if not extend:
+            self._selection_anchor = index
+        self.recent_list.repaint()
+        self._update_bulk_bar()
+    
+    def _select_folder(self, folder_id: int):
+        """Ctrl+click on a folder toggles it (and so everything in it)"""
+        if folder_id in self.selected_folders:
+            self.selected_folders.discard(folder_id)
+        else:
+            self.selected_folders.add(folder_id)
+        node = self._folder_nodes.get(folder_id)
+        if node is not None:
+            node.folder_btn.configure(fg_color="#2b2b2b" if folder_id in self.selected_folders else "transparent")
+        self._update_bulk_bar()
+        return "break"
+    
+    def clear_selection(self):
+        for folder_id in self.selected_folders:
+            node = self._folder_nodes.get(folder_id)
+            if node is not None:
+                node.folder_btn.configure(fg_color="transparent")
+        self.selected_chats.clear()
+        self.selected_folders.clear()
+        self._selection_anchor = None
+        self.recent_list.repaint()
+        self._update_bulk_bar()
+    
+    def _update_bulk_bar(self):
+        """Show how much is selected, or hide the bar when nothing is"""
+        if not (self.selected_chats or self.selected_folders) or not self.recent_list.winfo_manager():
+            self.bulk_bar.pack_forget()
+            return
+        parts = []
+        if self.selected_folders:
+            parts.append(f"{len(self.selected_folders)} 📁")
+        if self.selected_chats:
+            parts.append(f"{len(self.selected_chats)} 💬")
+        self.bulk_label.configure(text=" ".join(parts))
+        if not self.bulk_bar.winfo_manager():
+            self.bulk_bar.pack(fill="x", padx=5, before=self.recent_list)
+    
+    def _selection(self):
+        return list(self.selected_chats), list(self.selected_folders)
+    
+    def _after_bulk_change(self):
+        """Refresh once after a bulk write, however many items it touched"""
+        deleted_current = (self.current_chat_id is not None
+                           and self.db.get_chat_summary(self.current_chat_id) is None)
+        self.selected_chats.clear()
+        self.selected_folders.clear()
+        self._selection_anchor = None
+        self.model.reload()
+        self._update_bulk_bar()
+        if deleted_current:
+            self.current_chat_id = None
+            self.on_new_chat(self.current_folder_id)
+    
+    def _show_bulk_move_menu(self):
+        """Pick where the selection goes"""
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Top level", command=lambda: self._bulk_move(None))
+        menu.add_separator()
+        for folder_id, path in self.db.list_folder_paths():
+            menu.add_command(label=path, command=lambda fid=folder_id: self._bulk_move(fid))
+        menu.tk_popup(self.winfo_pointerx(), self.winfo_pointery())
+    
+    def _bulk_move(self, target_folder_id: Optional[int]):
+        chat_ids, folder_ids = self._selection()
+        try:
+            self.db.move_items(chat_ids, folder_ids, target_folder_id)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not move: {str(e)}")
+            return
+        self._after_bulk_change()
+    
+    def _bulk_delete(self):
+        chat_ids, folder_ids = self._selection()
+        what = []
+        if folder_ids:
+            what.append(f"{len(folder_ids)} folder(s) with everything in them")
+        if chat_ids:
+            what.append(f"{len(chat_ids)} chat(s)")
+        if not messagebox.askyesno("Delete", f"Delete {' and '.join(what)}? This cannot be undone."):
+            return
+        try:
+            counts = self.db.delete_items(chat_ids, folder_ids)
+            print(f"Deleted {counts['chats']} chats and {counts['folders']} folders")  # Debug print
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not delete: {str(e)}")
+            return
+        self._after_bulk_change()
+    
+    def _bulk_archive(self):
+        chat_ids, folder_ids = self._selection()
+        try:
+            archived = self.db.archive_items(chat_ids, folder_ids)
+            print(f"Archived {archived} chats")  # Debug print
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not archive: {str(e)}")
+            return
+        # Archived chats stay listed; only their messages moved
+        self.clear_selection()
+    
+    def _bulk_export(self):
+        path = filedialog.asksaveasfilename(
+            title="Export chats",
+            defaultextension=".jsonl",
+            filetypes=[("Chat archive", "*.jsonl"), ("All files", "*.*")]
         )
-        delete_btn.pack(side="right")
-        
-        # Store reference to chat button
-        if not hasattr(self, '_chat_buttons'):
-            self._chat_buttons = []
-        self._chat_buttons.append(chat_btn)
+        if not path:
+            return
+        chat_ids, folder_ids = self._selection()
+        try:
+            counts = self.db.export_items(Path(path), chat_ids, folder_ids)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not export: {str(e)}")
+            return
+        messagebox.showinfo("Export", f"Exported {counts['chats']} chats and {counts['messages']} messages")
+        self.clear_selection()
+    
+    def open_folder(self, folder_id: int):
+        """Expand the tree down to a folder and select it"""
+        ancestors = self.model.reveal(folder_id)
+        if ancestors is None:
+            return
+        for ancestor_id in ancestors:
+            self._expand_folder(ancestor_id)
+        if self.current_folder_id != folder_id:
+            self._handle_folder_click(folder_id)
     
     def _show_chat_menu(self, event, chat_id: int):
         """Show chat context menu"""
@@ -469,7 +919,7 @@ def save_folder():
             if name:
                 try:
                     folder_id = self.db.create_folder(name)
-                    self.load_contents()
+                    self.model.folder_changed(folder_id)
                     dialog.destroy()
                 except Exception as e:
                     messagebox.showerror("Error", f"Could not create folder: {str(e)}")
@@ -512,8 +962,8 @@ def delete_chat(self, chat_id: int):
         # Delete from database
         self.db.delete_chat(chat_id)
         
-        # Refresh sidebar
-        self.load_contents()
+        # Remove its row from the sidebar
+        self.model.chat_changed(chat_id)
         
         # Only create new chat if we deleted the current one
         if chat_id == self.current_chat_id:
@@ -530,13 +980,8 @@ def _handle_new_chat(self):
         if self.current_chat_id is not None:
             self.parent.save_current_chat()
         
-        # Clear current chat ID
-        self.current_chat_id = None
-        
-        # Reset all chat button colors to gray
-        for btn in getattr(self, '_chat_buttons', []):
-            if btn.winfo_exists():
-                btn.configure(text_color="gray")
+        # Clear current chat ID and reset all chat button colors to gray
+        self.highlight_chat(None)
         
         # Create new chat
         self.on_new_chat(self.current_folder_id)
@@ -545,8 +990,8 @@ def _delete_folder(self, folder_id: int):
         """Delete a folder after confirmation"""
         if messagebox.askyesno("Confirm Delete", "Delete this folder and all its contents?"):
             try:
-                self.db.delete_folder(folder_id)
-                self.load_contents()
+                self.db.delete_items([], [folder_id])
+                self._after_bulk_change()
             except Exception as e:
                 messagebox.showerror("Error", f"Could not delete folder: {str(e)}")
 
@@ -560,7 +1005,7 @@ def _rename_folder(self, folder_id: int):
         if new_name:
             try:
                 self.db.rename_folder(folder_id, new_name)
-                self.load_contents()
+                self.model.folder_changed(folder_id)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not rename folder: {str(e)}")
 
@@ -573,7 +1018,7 @@ def _rename_chat(self, chat_id: int):
         new_name = dialog.get_input()
         if new_name:
             self.db.rename_chat(chat_id, new_name)
-            self.load_contents() 
+            self.model.chat_changed(chat_id)
 
     def _confirm_folder_delete(self, folder_id: int):
         """Show folder deletion confirmation dialog"""
@@ -606,8 +1051,8 @@ def _confirm_folder_delete(self, folder_id: int):
         
         # Delete everything
         def delete_everything():
-            self.db.delete_folder(folder_id)  # This deletes folder and all chats
-            self.load_contents()
+            self.db.delete_items([], [folder_id])  # Subfolders and every chat in them too
+            self._after_bulk_change()
             dialog.destroy()
         
         everything_btn = ctk.CTkButton(
@@ -621,9 +1066,8 @@ def delete_everything():
         
         # Keep chats
         def delete_folder_keep_chats():
-            self.db.move_folder_chats_to_root(folder_id)
-            self.db.delete_folder(folder_id)
-            self.load_contents()
+            self.db.delete_folder(folder_id)  # Chats of it and its subfolders go to the top level
+            self.model.reload()
             dialog.destroy()
         
         keep_chats_btn = ctk.CTkButton(
@@ -671,16 +1115,18 @@ def _start_rename(self, event, item_id: int, button: ctk.CTkButton):
         entry.focus_set()
         
         def finish_rename(event=None):
+            if not entry.winfo_exists():
+                return  # Already finished (Return, then FocusOut)
             new_name = entry.get().strip()
+            entry.destroy()
             if new_name and new_name != current_name:
+                # The model patches the renamed row (and re-sorts folders)
                 if "📁" in button.cget("text"):  # It's a folder
                     self.db.rename_folder(item_id, new_name)
-                    button.configure(text=f"📁 {new_name}")
+                    self.model.folder_changed(item_id)
                 else:  # It's a chat
                     self.db.rename_chat(item_id, new_name)
-                    button.configure(text=f"💬 {new_name}")
-                self.load_contents()  # Refresh to ensure everything is updated
-            entry.destroy()
+                    self.model.chat_changed(item_id)
         
         def cancel_rename(event=None):
             entry.destroy()
@@ -712,7 +1158,7 @@ def _handle_back_click(self):
             command=self.create_folder
         )
         
-        self.load_contents()
+        self._show_chats(None)
 
     def _handle_chat_click(self, chat_id: int):
         """Handle chat selection and update highlighting"""
@@ -720,14 +1166,8 @@ def _handle_chat_click(self, chat_id: int):
         if self.parent.is_processing:
             return
         
-        # Update current chat ID first
-        self.current_chat_id = chat_id
-        
-        # Update highlighting immediately
-        for btn in getattr(self, '_chat_buttons', []):
-            if btn.winfo_exists():
-                is_current = btn._chat_id == chat_id
-                btn.configure(text_color="white" if is_current else "gray")
+        # Update current chat ID and highlighting immediately
+        self.highlight_chat(chat_id)
         
         # Keep folder highlighted if we're in one
         if self.current_folder_id is not None:
@@ -786,9 +1226,7 @@ def toggle_sidebar(self):
             # Restore chats section
             self.chats_header.pack(fill="x", padx=5, pady=(5,0))
             self.recent_list.pack(fill="both", expand=True, padx=5, pady=5)
-            
-            # Refresh contents
-            self.load_contents()
+            self._update_bulk_bar()
         
         self.is_expanded = not self.is_expanded
         self._force_width = True
@@ -884,7 +1322,7 @@ def disable_buttons_recursive(container):
                     disable_buttons_recursive(child)
         
         # Disable all chat buttons in recent list
-        disable_buttons_recursive(self.recent_list)
+        self.recent_list.set_enabled(False)
         
         # Disable all folder buttons in folder tree
         disable_buttons_recursive(self.folder_tree)
@@ -907,7 +1345,7 @@ def enable_buttons_recursive(container):
                     enable_buttons_recursive(child)
         
         # Enable all chat buttons in recent list
-        enable_buttons_recursive(self.recent_list)
+        self.recent_list.set_enabled(True)
         
         # Enable all folder buttons in folder tree
         enable_buttons_recursive(self.folder_tree)
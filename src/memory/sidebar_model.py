@@ -0,0 +1,306 @@
+from typing import Callable, Dict, List, Optional
+
+# Chats fetched per page as the chat list is scrolled
+CHAT_PAGE_SIZE = 50
+
+
+class ChatIndex:
+    """Chat summaries of one folder, most recently updated first
+
+    Holds one slot per chat; slots are filled a page at a time (by offset)
+    when first read, so only the parts of a long list that were looked at
+    are ever loaded. Edits from SidebarModel keep the filled slots and the
+    positions of the empty ones in step with the database.
+    """
+
+    def __init__(self, db, folder_id: Optional[int]):
+        self.db = db
+        self.folder_id = folder_id
+        self._items: List[Optional[Dict]] = []
+        self.invalidate()
+
+    @property
+    def total(self) -> int:
+        return len(self._items)
+
+    def invalidate(self):
+        """Forget everything read so far and recount"""
+        self._items = [None] * self.db.count_chats(self.folder_id)
+
+    def get(self, index: int) -> Optional[Dict]:
+        """Summary of the chat at index, reading its page if needed"""
+        if not 0 <= index < len(self._items):
+            return None
+        if self._items[index] is None:
+            start = index - index % CHAT_PAGE_SIZE
+            page = self.db.list_chats(self.folder_id, limit=CHAT_PAGE_SIZE, offset=start)
+            self._items[start:start + len(page)] = page
+            if len(page) < CHAT_PAGE_SIZE and start + len(page) < len(self._items):
+                # Chats deleted since counting
+                del self._items[start + len(page):]
+            if index >= len(self._items):
+                return None
+        return self._items[index]
+
+    def position(self, chat_id: int) -> Optional[int]:
+        """Index of a chat among the loaded slots, or None"""
+        for index, item in enumerate(self._items):
+            if item is not None and item["id"] == chat_id:
+                return index
+        return None
+
+    def is_newest(self, summary: Dict) -> bool:
+        """True if summary sorts at the top of this folder"""
+        top = self.get(0)
+        return top is None or (summary["last_updated"], summary["id"]) >= (top["last_updated"], top["id"])
+
+    def replace(self, index: int, summary: Dict):
+        self._items[index] = summary
+
+    def insert(self, index: int, summary: Dict):
+        self._items.insert(index, summary)
+
+    def remove(self, index: int):
+        del self._items[index]
+
+
+class SidebarModel:
+    """In-memory copy of the folders and chats the sidebar shows
+
+    The folder tree is read one level at a time: the top level up front,
+    a folder's subfolders the first time they're asked for, after which
+    that level is kept here. Writes made here, by the chat writer or by
+    other windows are reported with chat_changed/folder_changed, which read
+    back just that item and patch the model. Listeners are then called
+    with one small event:
+
+      ("chat_updated", folder_id, index)  a row changed in place
+      ("chats_changed", folder_id)        rows were added, removed or reordered
+      ("folder_added", folder_id)
+      ("folder_updated", folder_id)       renamed, or gained/lost subfolders
+      ("folder_removed", folder_id)
+      ("reset",)                          everything was reloaded
+
+    plus, for listeners that keep their own copy (the quick switcher's
+    index), the item as read back, or None if it was deleted:
+
+      ("chat_summary", chat_id, summary)
+      ("folder_summary", folder_id, folder)
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.folders: Dict[int, Dict] = {}  # Every folder read so far
+        self._subfolders: Dict[Optional[int], List[int]] = {}  # Parent -> child IDs, for levels read
+        self._generation = 0  # Bumped by every folder change, to spot stale prefetches
+        self._indexes: Dict[Optional[int], ChatIndex] = {}
+        self._listeners: List[Callable] = []
+        self._store_level(None, self.db.list_subfolders(None))
+
+    def subscribe(self, listener: Callable):
+        """Call listener(*event) for every change"""
+        self._listeners.append(listener)
+
+    def _emit(self, *event):
+        for listener in list(self._listeners):
+            try:
+                listener(*event)
+            except Exception as e:
+                print(f"Error in sidebar listener: {e}")
+
+    def reload(self):
+        """Drop everything cached and start over (e.g. after restoring a backup)"""
+        self.folders = {}
+        self._subfolders = {}
+        self._generation += 1
+        self._store_level(None, self.db.list_subfolders(None))
+        self._indexes = {}
+        self._emit("reset")
+
+    def folder_name(self, folder_id: Optional[int]) -> Optional[str]:
+        folder = self.folders.get(folder_id)
+        return folder["name"] if folder else None
+
+    def _store_level(self, parent_id: Optional[int], folders: List[Dict]):
+        for folder in folders:
+            self.folders[folder["id"]] = folder
+        self._subfolders[parent_id] = [folder["id"] for folder in folders]
+
+    def _sort_level(self, parent_id: Optional[int]):
+        self._subfolders[parent_id].sort(key=lambda fid: (self.folders[fid]["name"], fid))
+
+    def is_loaded(self, parent_id: Optional[int]) -> bool:
+        """True if the subfolders of parent_id have been read"""
+        return parent_id in self._subfolders
+
+    def subfolders(self, parent_id: Optional[int]) -> List[Dict]:
+        """Folders directly inside parent_id (None for top level), by name
+
+        Read from the database the first time, then kept up to date here.
+        """
+        if parent_id not in self._subfolders:
+            self._store_level(parent_id, self.db.list_subfolders(parent_id))
+        return [self.folders[fid] for fid in self._subfolders[parent_id]]
+
+    def fetch_subfolders(self, parent_id: int) -> tuple:
+        """Read a level for store_subfolders; safe to call from another thread"""
+        generation = self._generation
+        return generation, self.db.list_subfolders(parent_id)
+
+    def store_subfolders(self, parent_id: int, fetched: tuple) -> bool:
+        """Keep a level read by fetch_subfolders, unless folders changed meanwhile"""
+        generation, folders = fetched
+        if generation != self._generation or parent_id in self._subfolders or parent_id not in self.folders:
+            return False
+        self._store_level(parent_id, folders)
+        return True
+
+    def reveal(self, folder_id: int) -> Optional[List[int]]:
+        """Read the levels down to a folder; returns its ancestors, top first
+
+        None if the folder doesn't exist.
+        """
+        folder = self.folders.get(folder_id) or self.db.get_folder(folder_id)
+        if folder is None:
+            return None
+        ancestors = []
+        while folder["parent_id"] is not None and len(ancestors) < 32:
+            parent = self.folders.get(folder["parent_id"]) or self.db.get_folder(folder["parent_id"])
+            if parent is None:
+                break  # Orphan, listed at the top level
+            ancestors.insert(0, parent["id"])
+            folder = parent
+        for parent_id in ancestors:
+            self.subfolders(parent_id)
+        return ancestors
+
+    def chat_index(self, folder_id: Optional[int]) -> ChatIndex:
+        """The chats of a folder, created on first use"""
+        index = self._indexes.get(folder_id)
+        if index is None:
+            index = self._indexes[folder_id] = ChatIndex(self.db, folder_id)
+        return index
+
+    def chat_changed(self, chat_id: int):
+        """A chat (or one of its branches) was saved, renamed, moved or deleted"""
+        summary = self.db.get_chat_summary(chat_id)
+        self._emit("chat_summary", chat_id, summary)
+        if summary is not None:
+            chat_id = summary["id"]  # Branches are listed as their conversation
+
+        changed = []
+        for folder_id, index in self._indexes.items():
+            position = index.position(chat_id)
+            if position is None:
+                continue
+            if summary is not None and summary["folder_id"] == folder_id and (
+                    position == 0 or summary["last_updated"] == index.get(position)["last_updated"]):
+                # Renamed, or saved again while already the newest (the usual
+                # case after a reply) - the row stays where it is
+                index.replace(position, summary)
+                self._emit("chat_updated", folder_id, position)
+                return
+            index.remove(position)
+            changed.append(folder_id)
+            break
+
+        if summary is not None:
+            index = self._indexes.get(summary["folder_id"])
+            if index is not None and index.position(chat_id) is None:
+                if index.is_newest(summary):
+                    index.insert(0, summary)
+                else:
+                    # Lands somewhere in the middle; let the list be read again
+                    index.invalidate()
+                if summary["folder_id"] not in changed:
+                    changed.append(summary["folder_id"])
+
+        for folder_id in changed:
+            self._emit("chats_changed", folder_id)
+
+    def chats_changed(self, folder_id: Optional[int]):
+        """Many chats of a folder changed at once"""
+        index = self._indexes.get(folder_id)
+        if index is not None:
+            index.invalidate()
+            self._emit("chats_changed", folder_id)
+
+    def _parent_key(self, folder: Dict) -> Optional[int]:
+        """The level a folder is listed under: its parent, or None if that's gone"""
+        parent_id = folder["parent_id"]
+        if parent_id is None or parent_id in self.folders or self.db.get_folder(parent_id):
+            return parent_id
+        return None
+
+    def _forget(self, folder_id: int):
+        """Drop a folder and every level read below it"""
+        for child_id in self._subfolders.pop(folder_id, []):
+            self._forget(child_id)
+        self.folders.pop(folder_id, None)
+        self._indexes.pop(folder_id, None)
+
+    def _set_has_children(self, folder_id: Optional[int]):
+        """Recheck a parent's flag after a child came or went"""
+        folder = self.folders.get(folder_id)
+        if folder is None:
+            return
+        if folder_id in self._subfolders:
+            has_children = bool(self._subfolders[folder_id])
+        else:
+            has_children = bool(self.db.list_subfolders(folder_id))
+        if bool(folder["has_children"]) != has_children:
+            folder["has_children"] = has_children
+            self._emit("folder_updated", folder_id)
+
+    def folder_changed(self, folder_id: int):
+        """A folder was created, renamed or deleted"""
+        self._generation += 1
+        folder = self.db.get_folder(folder_id)
+        self._emit("folder_summary", folder_id, folder)
+        old = self.folders.get(folder_id)
+        old_parent = None
+        if old is not None:
+            old_parent = next((pid for pid, ids in self._subfolders.items() if folder_id in ids), None)
+
+        if folder is None:
+            if old is None:
+                return
+            self._subfolders[old_parent].remove(folder_id)
+            self._forget(folder_id)
+            # Its chats are gone or were moved to the top level
+            self.chats_changed(None)
+            self._emit("folder_removed", folder_id)
+            self._set_has_children(old_parent)
+            if old["has_children"]:
+                self._adopt_orphans()
+            return
+
+        parent_id = self._parent_key(folder)
+        if old is not None and old_parent != parent_id:
+            # Moved to another level
+            self._subfolders[old_parent].remove(folder_id)
+            self._forget(folder_id)
+            self._emit("folder_removed", folder_id)
+            self._set_has_children(old_parent)
+            old = None
+
+        if parent_id not in self._subfolders:
+            # Inside a folder that hasn't been opened; it may need an expander now
+            self._set_has_children(parent_id)
+            return
+        self.folders[folder_id] = folder
+        if old is None:
+            self._subfolders[parent_id].append(folder_id)
+        self._sort_level(parent_id)
+        self._emit("folder_updated" if old is not None else "folder_added", folder_id)
+        self._set_has_children(parent_id)
+
+    def _adopt_orphans(self):
+        """Show subfolders left behind by a deleted folder at the top level"""
+        shown = set(self._subfolders[None])
+        for folder in self.db.list_subfolders(None):
+            if folder["id"] not in shown:
+                self.folders[folder["id"]] = folder
+                self._subfolders[None].append(folder["id"])
+                self._sort_level(None)
+                self._emit("folder_added", folder["id"])
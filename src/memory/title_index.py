@@ -0,0 +1,261 @@
+import heapq
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+# Results returned per search
+SEARCH_LIMIT = 12
+
+# Trigrams of a query the fuzzy pass looks at, rarest first: enough to
+# rank near misses without counting every title sharing a common piece
+FUZZY_GRAMS = 8
+
+# Removed entries leave their slot behind (a saved chat is re-added at the
+# end); once there are this many and more than live ones, the index is
+# rebuilt in the background without them
+COMPACT_MIN_DEAD = 1000
+
+# A chat saved since the index was built is re-added at the end, so a
+# higher doc number always means more recently updated (see _build)
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace, so matching ignores both"""
+    return " ".join(text.lower().split())
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """Trigram index over chat titles and folder names for the quick switcher
+
+    Every title is split into overlapping three-letter pieces (padded with
+    spaces so word starts have their own); a search intersects the sets
+    of titles holding each piece of the query, then walks those newest
+    first and stops as soon as enough titles matching at a word start are
+    found. Built once on a background thread from the chat summaries, then
+    kept current by SidebarModel events. Search and updates run on the UI
+    thread.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.ready = False
+        self._lock = threading.RLock()
+        self._building = False
+        self._pending: List[Tuple] = []  # Updates that arrived during a build
+        self._clear()
+
+    def _clear(self):
+        # One slot per entry ("doc"); removed entries leave a None text
+        self._keys: List[Tuple[str, int]] = []  # ("chat" | "folder", id)
+        self._texts: List[Optional[str]] = []  # Normalized, for matching
+        self._titles: List[str] = []  # As shown
+        self._folders: List[Optional[int]] = []  # Folder of a chat
+        self._docs: Dict[Tuple[str, int], int] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._folder_names: Dict[int, str] = {}
+        self._dead = 0  # Slots of removed entries
+
+    def start(self):
+        """Build the index on a background thread"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build, daemon=True).start()
+
+    def _build(self):
+        try:
+            chats, folders = self.db.list_titles()
+        except Exception as e:
+            print(f"Error building title index: {e}")
+            with self._lock:
+                self._building = False
+            return
+
+        fresh = TitleIndex.__new__(TitleIndex)
+        fresh._clear()
+        # Oldest first, so doc numbers follow last_updated; folders go last
+        # so a folder outranks chats that merely mention its name
+        chats.sort(key=lambda chat: (chat[3] or "", chat[0]))
+        for chat_id, title, folder_id, _ in chats:
+            fresh._add(("chat", chat_id), title, folder_id)
+        for folder_id, name in folders:
+            fresh._add(("folder", folder_id), name, None)
+            fresh._folder_names[folder_id] = name
+
+        with self._lock:
+            self.__dict__.update(fresh.__dict__)
+            # Replay what changed while the summaries were being read
+            self._building = False
+            pending, self._pending = self._pending, []
+            for method, args in pending:
+                getattr(self, method)(*args)  # May start the next compaction
+            self.ready = True
+        print(f"Indexed {len(chats)} chat titles")  # Debug print
+
+    def _add(self, key: Tuple[str, int], title: str, folder_id: Optional[int]):
+        text = normalize(title)
+        doc = len(self._keys)
+        self._keys.append(key)
+        self._texts.append(text)
+        self._titles.append(title)
+        self._folders.append(folder_id)
+        self._docs[key] = doc
+        postings = self._postings
+        for gram in trigrams(f" {text} "):
+            docs = postings.get(gram)
+            if docs is None:
+                postings[gram] = {doc}
+            else:
+                docs.add(doc)
+
+    def _remove(self, key: Tuple[str, int]):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for gram in trigrams(f" {self._texts[doc]} "):
+            docs = self._postings.get(gram)
+            if docs is not None:
+                docs.discard(doc)
+                if not docs:
+                    del self._postings[gram]
+        self._texts[doc] = None
+        self._dead += 1
+
+    def _compact_if_needed(self):
+        """Rebuild without dead slots once there are too many; called after
+        an update is complete, as updates from now on are queued and replayed"""
+        if self._dead >= COMPACT_MIN_DEAD and self._dead > len(self._docs):
+            self.start()
+
+    def _queue(self, method: str, *args) -> bool:
+        """Hold an update back while a build is running; True if queued"""
+        with self._lock:
+            if self._building:
+                self._pending.append((method, args))
+                return True
+        return False
+
+    def set_chat(self, chat_id: int, title: str, folder_id: Optional[int]):
+        """Add or update a chat; it becomes the most recent"""
+        if self._queue("set_chat", chat_id, title, folder_id):
+            return
+        self._remove(("chat", chat_id))
+        self._add(("chat", chat_id), title, folder_id)
+        self._compact_if_needed()
+
+    def remove_chat(self, chat_id: int):
+        if self._queue("remove_chat", chat_id):
+            return
+        self._remove(("chat", chat_id))
+        self._compact_if_needed()
+
+    def set_folder(self, folder_id: int, name: str):
+        if self._queue("set_folder", folder_id, name):
+            return
+        self._remove(("folder", folder_id))
+        self._add(("folder", folder_id), name, None)
+        self._folder_names[folder_id] = name
+        self._compact_if_needed()
+
+    def remove_folder(self, folder_id: int):
+        if self._queue("remove_folder", folder_id):
+            return
+        self._remove(("folder", folder_id))
+        self._folder_names.pop(folder_id, None)
+        # Its chats were moved to the top level
+        for doc, folder in enumerate(self._folders):
+            if folder == folder_id:
+                self._folders[doc] = None
+        self._compact_if_needed()
+
+    def on_model_event(self, event: str, item_id: Optional[int] = None, detail=None):
+        """SidebarModel listener keeping the index current"""
+        if event == "chat_summary":
+            if detail is None:
+                self.remove_chat(item_id)
+            else:
+                self.set_chat(detail["id"], detail["title"], detail["folder_id"])
+        elif event == "folder_summary":
+            if detail is None:
+                self.remove_folder(item_id)
+            else:
+                self.set_folder(item_id, detail["name"])
+        elif event == "reset":
+            self.ready = False
+            self.start()
+
+    def _fuzzy(self, query: str, limit: int) -> List[int]:
+        """Titles sharing most of the query's trigrams (typos, missing letters)
+
+        Only the FUZZY_GRAMS rarest trigrams are counted, which bounds the
+        work however common the other pieces of the query are.
+        """
+        postings = sorted((self._postings.get(gram, set()) for gram in trigrams(query) or {query}),
+                          key=len)[:FUZZY_GRAMS]
+        counts = Counter()
+        for docs in postings:
+            counts.update(docs)
+        need = max(1, len(postings) // 2)
+        # Most pieces in common, then newest
+        best = heapq.nlargest(limit, ((count, doc) for doc, count in counts.items() if count >= need))
+        return [doc for _, doc in best]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> List[Dict]:
+        """Best matches for query, most recently updated first within each kind
+
+        Titles with a word starting with the query come first, then ones
+        containing it elsewhere, then ones holding all its pieces in another
+        order, then near misses. Each result has kind ("chat" or "folder"),
+        id, title and folder (the name of a chat's folder, or None).
+        """
+        query = normalize(query)
+        # A background build (or compaction) swaps every structure at once
+        with self._lock:
+            if not query or not self.ready:
+                return []
+
+            if len(query) >= 3:
+                postings = sorted((self._postings.get(gram, set()) for gram in trigrams(query)), key=len)
+                candidates = sorted(postings[0].intersection(*postings[1:]), reverse=True)
+            elif len(query) == 2:
+                # Too short for a trigram; words starting with it have " xy"
+                candidates = sorted(self._postings.get(" " + query, ()), reverse=True)
+            else:
+                candidates = range(len(self._texts) - 1, -1, -1)
+
+            spaced = " " + query
+            at_word, inside, scattered = [], [], []
+            for doc in candidates:
+                text = self._texts[doc]
+                if text is None:
+                    continue
+                if text.startswith(query) or spaced in text:
+                    at_word.append(doc)
+                    if len(at_word) >= limit:
+                        break  # Nothing later can beat these
+                elif len(inside) < limit and query in text:
+                    inside.append(doc)
+                elif len(scattered) < limit and len(query) >= 3:
+                    scattered.append(doc)
+
+            ranked = (at_word + inside + scattered)[:limit]
+            if len(ranked) < limit and len(query) >= 3:
+                seen = set(ranked)
+                ranked += [doc for doc in self._fuzzy(query, limit) if doc not in seen][:limit - len(ranked)]
+
+            results = []
+            for doc in ranked:
+                kind, item_id = self._keys[doc]
+                folder_id = self._folders[doc]
+                results.append({
+                    "kind": kind,
+                    "id": item_id,
+                    "title": self._titles[doc],
+                    "folder": self._folder_names.get(folder_id) if folder_id is not None else None,
+                })
+            return results
@@ -0,0 +1,259 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+from .codec import decode_body
+from .connection import connect
+from .cold_storage import STORAGE_ARCHIVED, archive_dir_for, iter_archived_messages
+from .messages import (INSERT_MESSAGE_SQL, STORAGE_ROWS, chat_segments, message_row, segments_filter,
+                       update_chat_totals)
+
+# Archive format: one JSON object per line, each with a "type":
+#
+#   {"type": "header", "format": "dark-engine-chats", "version": 1}
+#   {"type": "folder", "id": 3, "name": "...", "parent_id": null, "created_at": "..."}
+#   {"type": "chat", "id": 7, "title": "...", "folder_id": 3, "model_name": "...", ...}
+#   {"type": "message", "chat_id": 7, "seq": 0, "role": "system", "content": "...", ...}
+#
+# Folders come parents-first and every chat is followed by its messages, so
+# both export and import only ever hold one line in memory. IDs are those of
+# the exporting database; import maps them to fresh ones. Branches are
+# written as complete chats of their own.
+
+ARCHIVE_FORMAT = "dark-engine-chats"
+ARCHIVE_VERSION = 1
+
+# Chats read per query on export, so the database isn't held locked while writing
+EXPORT_CHAT_PAGE = 100
+EXPORT_MESSAGE_FETCH = 500
+
+
+def _folder_subtree_sql(folder_ids: Optional[List[int]], chat_ids: Optional[List[int]] = None) -> tuple:
+    """Recursive CTE selecting the folders to export, with their depth"""
+    if chat_ids is not None and not folder_ids:
+        # Picked chats only: no folders
+        roots = "SELECT id, 0 FROM folders WHERE 0"
+        params = ()
+    elif folder_ids:
+        placeholders = ", ".join("?" for _ in folder_ids)
+        roots = f"SELECT id, 0 FROM folders WHERE id IN ({placeholders})"
+        params = tuple(folder_ids)
+    else:
+        # Top-level folders, plus any whose parent was deleted
+        roots = """SELECT id, 0 FROM folders
+                   WHERE parent_id IS NULL OR parent_id NOT IN (SELECT id FROM folders)"""
+        params = ()
+    sql = f"""WITH RECURSIVE subtree(id, depth) AS (
+                  {roots}
+                  UNION
+                  SELECT f.id, s.depth + 1 FROM folders f JOIN subtree s ON f.parent_id = s.id
+              )"""
+    return sql, params
+
+
+def _chat_filter(folder_ids: Optional[List[int]], since: Optional[str], until: Optional[str],
+                 chat_ids: Optional[List[int]] = None) -> tuple:
+    """WHERE clause (after a subtree CTE) selecting the chats to export"""
+    clauses = []
+    params = []
+    if chat_ids is not None:
+        clauses.append("id IN (SELECT id FROM temp.export_chats)")
+    elif folder_ids:
+        clauses.append("folder_id IN (SELECT id FROM subtree)")
+    if since:
+        clauses.append("last_updated >= ?")
+        params.append(since)
+    if until:
+        # Dates without a time include the whole day
+        clauses.append("last_updated < datetime(?, '+1 day')" if len(until) == 10 else "last_updated <= ?")
+        params.append(until)
+    return (" AND ".join(clauses) or "1"), tuple(params)
+
+
+def _iter_chat_messages(conn: sqlite3.Connection, chat: sqlite3.Row, archive_dir: Path) -> Iterator[Dict]:
+    """Yield a chat's messages one at a time"""
+    if chat["storage"] == STORAGE_ARCHIVED:
+        # Read straight from cold storage - exporting shouldn't restore anything
+        yield from iter_archived_messages(archive_dir, chat["id"], chat["archive"])
+        return
+
+    if chat["storage"] != STORAGE_ROWS:
+        # Not upgraded yet - the blob has to be parsed whole
+        for seq, msg in enumerate(json.loads(chat["messages"])):
+            yield {"seq": seq, "role": msg["role"], "content": msg["content"],
+                   "timestamp": msg.get("timestamp"), "token_count": None}
+        return
+
+    # A branch is exported whole, including the history it shares
+    where, params = segments_filter(chat_segments(conn, chat["id"]))
+    cursor = conn.execute(
+        f"""SELECT m.seq, m.role, m.timestamp, COALESCE(b.codec, m.codec), COALESCE(b.body, m.body),
+                   m.token_count
+            FROM messages m LEFT JOIN bodies b ON b.hash = m.body_hash
+            WHERE {where} ORDER BY m.seq""",
+        params
+    )
+    while True:
+        rows = cursor.fetchmany(EXPORT_MESSAGE_FETCH)
+        if not rows:
+            break
+        for seq, role, timestamp, codec, body, token_count in rows:
+            yield {"seq": seq, "role": role, "content": decode_body(codec, body),
+                   "timestamp": timestamp, "token_count": token_count}
+
+
+def export_chats(db_path: Path, out: IO[str], folder_ids: Optional[List[int]] = None,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 chat_ids: Optional[List[int]] = None) -> Dict[str, int]:
+    """Stream chats to a JSONL archive and return counts of what was written
+
+    ``folder_ids`` limits the export to those folders and their subfolders;
+    ``since``/``until`` ("YYYY-MM-DD" or a full timestamp) filter chats by
+    last update. ``chat_ids``, if given, is exactly the chats to write
+    (folder_ids then only picks which folder records go along).
+    """
+    counts = {"folders": 0, "chats": 0, "messages": 0}
+
+    def write(record: Dict):
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+
+    conn = connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        write({"type": "header", "format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION})
+
+        if chat_ids is not None:
+            conn.execute("CREATE TEMP TABLE export_chats (id INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO temp.export_chats (id) VALUES (?)",
+                             ((chat_id,) for chat_id in chat_ids))
+            conn.commit()  # Don't hold the write lock while exporting
+
+        subtree_sql, subtree_params = _folder_subtree_sql(folder_ids, chat_ids)
+        cursor = conn.execute(
+            f"""{subtree_sql}
+                SELECT f.id, f.name, f.parent_id, f.created_at FROM folders f
+                JOIN subtree s ON s.id = f.id
+                ORDER BY s.depth, f.id""",
+            subtree_params
+        )
+        for folder in cursor:
+            parent_id = folder["parent_id"]
+            if folder_ids and folder["id"] in folder_ids:
+                parent_id = None  # Exported subtrees become top-level on import
+            write({"type": "folder", "id": folder["id"], "name": folder["name"],
+                   "parent_id": parent_id, "created_at": folder["created_at"]})
+            counts["folders"] += 1
+
+        where, where_params = _chat_filter(folder_ids, since, until, chat_ids)
+        last_id = 0
+        while True:
+            # Page through chats by ID so no read stays open across the whole export
+            chats = conn.execute(
+                f"""{subtree_sql}
+                    SELECT * FROM chats WHERE {where} AND id > ?
+                    ORDER BY id LIMIT ?""",
+                subtree_params + where_params + (last_id, EXPORT_CHAT_PAGE)
+            ).fetchall()
+            if not chats:
+                break
+
+            for chat in chats:
+                write({"type": "chat", "id": chat["id"], "title": chat["title"],
+                       "folder_id": chat["folder_id"], "model_name": chat["model_name"],
+                       "created_at": chat["created_at"], "last_updated": chat["last_updated"]})
+                counts["chats"] += 1
+                for msg in _iter_chat_messages(conn, chat, archive_dir_for(db_path)):
+                    write({"type": "message", "chat_id": chat["id"], **msg})
+                    counts["messages"] += 1
+            last_id = chats[-1]["id"]
+    finally:
+        conn.close()
+    return counts
+
+
+def _read_records(lines: Iterable[str]) -> Iterator[Dict]:
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid archive line {line_number}: {e}")
+
+
+def import_chats(db_path: Path, lines: Iterable[str], folder_id: Optional[int] = None,
+                 batch_size: int = 1000) -> Dict[str, int]:
+    """Load a JSONL archive into the database and return counts of what was added
+
+    Records are streamed and committed once ``batch_size`` lines have been
+    read, at the next chat boundary, so a failed import leaves no chat with
+    only some of its messages. Imported top-level folders and chats are
+    placed under ``folder_id`` (root if None).
+    """
+    counts = {"folders": 0, "chats": 0, "messages": 0}
+    folder_map = {}  # Archive folder ID -> new folder ID
+    chat_map = {}  # Archive chat ID -> new chat ID
+    current_chat = None  # New ID of the chat whose messages are streaming in
+    pending = 0
+
+    conn = connect(db_path)
+    try:
+        for record in _read_records(lines):
+            kind = record.get("type")
+
+            if kind == "header":
+                if record.get("format") != ARCHIVE_FORMAT or record.get("version", 0) > ARCHIVE_VERSION:
+                    raise Exception(f"Unsupported archive format: {record.get('format')} v{record.get('version')}")
+                continue
+
+            if kind == "folder":
+                parent_id = folder_map.get(record.get("parent_id"), folder_id)
+                cursor = conn.execute(
+                    "INSERT INTO folders (name, parent_id, created_at) VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                    (record["name"], parent_id, record.get("created_at"))
+                )
+                folder_map[record["id"]] = cursor.lastrowid
+                counts["folders"] += 1
+
+            elif kind == "chat":
+                if current_chat is not None:
+                    update_chat_totals(conn, current_chat)
+                if pending >= batch_size:
+                    conn.commit()  # Every chat so far is complete
+                    pending = 0
+                cursor = conn.execute(
+                    """INSERT INTO chats (title, folder_id, model_name, messages, storage, created_at, last_updated)
+                       VALUES (?, ?, ?, '[]', ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))""",
+                    (record["title"], folder_map.get(record.get("folder_id"), folder_id),
+                     record.get("model_name") or "unknown", STORAGE_ROWS,
+                     record.get("created_at"), record.get("last_updated"))
+                )
+                current_chat = cursor.lastrowid
+                chat_map[record["id"]] = current_chat
+                counts["chats"] += 1
+
+            elif kind == "message":
+                chat_id = chat_map.get(record.get("chat_id"))
+                if chat_id is None:
+                    raise Exception(f"Message for unknown chat {record.get('chat_id')} in archive")
+                conn.execute(
+                    INSERT_MESSAGE_SQL,
+                    message_row(conn, chat_id, record["seq"], record, token_count=record.get("token_count"))
+                )
+                counts["messages"] += 1
+
+            pending += 1
+
+        if current_chat is not None:
+            update_chat_totals(conn, current_chat)
+        conn.commit()
+    except Exception:
+        # Keep the whole chats committed so far; the one being read is rolled back
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return counts
@@ -0,0 +1,225 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .database import ChatMemoryDB
+from .messages import written_positions
+
+# Attempts at a failing batch once the writer is closing, before giving up
+# on it (each after retry_delay) so closing the app can't hang on it
+CLOSE_ATTEMPTS = 3
+
+
+class PendingChat:
+    """Placeholder key for a chat that has not been inserted yet"""
+    def __init__(self):
+        self.chat_id: Optional[int] = None
+
+
+class ChatWriter:
+    """Write-behind queue that persists chats on a background thread
+
+    Saves are keyed by chat ID (or a PendingChat for new chats). Repeated
+    saves of the same chat before the writer gets to them are coalesced so
+    only the latest message list is written, and everything collected within
+    ``batch_delay`` seconds goes to the database in one transaction.
+
+    ``on_saved(key, chat_id, summary_changed)`` is called from the writer
+    thread after each write. ``summary_changed`` is True only when the title
+    or folder shown in the sidebar differs from what was last written.
+
+    Each write carries the revision of the chat it was based on (set with
+    expect_revision when a chat is loaded, then advanced by every write), so
+    a chat saved meanwhile by another window isn't overwritten: the write
+    becomes a conflict copy, ``on_saved`` reports the copy's ID, and later
+    saves of the original key follow it there.
+    """
+
+    def __init__(self, db: ChatMemoryDB, on_saved: Optional[Callable] = None,
+                 batch_delay: float = 0.25, retry_delay: float = 2.0):
+        self.db = db
+        self.on_saved = on_saved
+        self.batch_delay = batch_delay
+        self.retry_delay = retry_delay
+
+        self._pending: Dict[object, Dict] = {}
+        self._summaries: Dict[int, Tuple] = {}
+        self._revisions: Dict[int, int] = {}  # Chat ID -> revision last loaded or written
+        self._redirects: Dict[int, int] = {}  # Chat ID -> conflict copy taking its saves
+        self._written: Dict[int, Dict[int, Dict]] = {}  # Chat ID -> seq -> message last written
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._writing = False
+        self._in_flight: List = []  # Keys of the batch being written
+        self._unsaved: List = []  # Keys given up on while closing
+        self._wakeup = threading.Event()
+        self._closing = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, key, messages: List[Dict], title: Optional[str] = None,
+             model_name: Optional[str] = None, folder_id: Optional[int] = None,
+             usage: Optional[Dict] = None):
+        """Queue a chat save, replacing any save of the same chat not yet written
+
+        ``usage`` describes the reply being saved and is added to the usage
+        summaries in the same transaction.
+        """
+        write = {
+            # Snapshot the list so later appends by the API thread don't leak in
+            "messages": list(messages),
+            "title": title,
+            "model_name": model_name,
+            "folder_id": folder_id,
+            "usage": [usage] if usage else [],
+        }
+        with self._lock:
+            previous = self._pending.get(key)
+            if previous is not None:
+                # Keep the creation details of a new chat if a later save omits them
+                for field in ("title", "model_name", "folder_id"):
+                    if write[field] is None:
+                        write[field] = previous[field]
+                # Usage accumulates; a newer message list doesn't replace it
+                write["usage"] = previous["usage"] + write["usage"]
+            self._pending[key] = write
+            self._wakeup.set()
+
+    def expect_revision(self, chat_id: int, revision: int):
+        """Record the revision of a chat just loaded; later saves build on it"""
+        with self._lock:
+            self._revisions[chat_id] = revision
+            self._redirects.pop(chat_id, None)
+            self._written.pop(chat_id, None)  # Loaded messages are stored rows
+
+    def revision_of(self, chat_id: int) -> Optional[int]:
+        """Latest revision of a chat this writer loaded or wrote"""
+        with self._lock:
+            return self._revisions.get(chat_id)
+
+    def has_pending(self, chat_id: int) -> bool:
+        """True if a save of this chat is queued or being written"""
+        with self._lock:
+            return any(self._key_id(key) == chat_id for key in (*self._pending, *self._in_flight))
+    
+    @staticmethod
+    def _key_id(key) -> Optional[int]:
+        return key.chat_id if isinstance(key, PendingChat) else key
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued save has been written"""
+        with self._idle:
+            self._wakeup.set()
+            return self._idle.wait_for(
+                lambda: not self._pending and not self._writing,
+                timeout=timeout
+            )
+
+    def close(self, timeout: Optional[float] = 10.0) -> List:
+        """Write everything still queued and stop the writer thread
+
+        Callbacks are dropped first: the UI is usually being torn down and
+        is blocked waiting on us, so calling back into Tk would deadlock.
+        A batch that keeps failing is tried CLOSE_ATTEMPTS times. Returns the
+        keys of chats whose latest save could not be written.
+        """
+        self.on_saved = None
+        self._closing.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        with self._lock:
+            unsaved = self._unsaved + list(self._in_flight) + list(self._pending)
+        if unsaved:
+            print(f"Chats not saved: {[self._key_id(key) or 'new chat' for key in unsaved]}")
+        return unsaved
+
+    def _run(self):
+        """Writer thread main loop"""
+        failures = 0  # Failed attempts in a row since closing began
+        while True:
+            self._wakeup.wait()
+            if not self._closing.is_set():
+                # Give rapid successive saves a moment to coalesce
+                self._closing.wait(self.batch_delay)
+
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+                self._writing = bool(batch)
+                self._in_flight = list(batch)
+                self._wakeup.clear()
+
+            if batch and not self._write_batch(batch):
+                if not self._closing.is_set():
+                    self._closing.wait(self.retry_delay)
+                else:
+                    failures += 1
+                    if failures >= CLOSE_ATTEMPTS:
+                        with self._lock:
+                            self._unsaved = list(self._pending)
+                            self._pending = {}
+                    else:
+                        time.sleep(self.retry_delay)
+
+            with self._idle:
+                self._writing = False
+                self._in_flight = []
+                if self._pending:
+                    self._wakeup.set()
+                self._idle.notify_all()
+                if self._closing.is_set() and not self._pending:
+                    return
+
+    def _write_batch(self, batch: Dict[object, Dict]) -> bool:
+        """Write one coalesced batch, requeueing it on failure"""
+        keys = list(batch)
+        writes = []
+        with self._lock:
+            for key in keys:
+                write = dict(batch[key])
+                chat_id = key.chat_id if isinstance(key, PendingChat) else key
+                while chat_id in self._redirects:
+                    chat_id = self._redirects[chat_id]
+                write["chat_id"] = chat_id
+                write["revision"] = self._revisions.get(chat_id)
+                write["written"] = self._written.get(chat_id)
+                writes.append(write)
+
+        try:
+            results = self.db.write_chats(writes)
+        except Exception as e:
+            print(f"Error saving chats: {e}")
+            with self._lock:
+                # Put back anything that hasn't been superseded by a newer save
+                for key in keys:
+                    newer = self._pending.setdefault(key, batch[key])
+                    if newer is not batch[key]:
+                        newer["usage"] = batch[key]["usage"] + newer["usage"]
+            return False
+
+        for key, write, (chat_id, revision) in zip(keys, writes, results):
+            if isinstance(key, PendingChat):
+                key.chat_id = chat_id
+
+            conflicted = write["chat_id"] is not None and chat_id != write["chat_id"]
+            with self._lock:
+                self._revisions[chat_id] = revision
+                # Saved at this revision: the next save can skip these messages
+                self._written[chat_id] = written_positions(write["messages"])
+                if conflicted:
+                    self._redirects[write["chat_id"]] = chat_id
+
+            summary_changed = conflicted
+            if write["chat_id"] is None or write["title"] is not None:
+                summary = (write["title"], write["folder_id"])
+                summary_changed = conflicted or self._summaries.get(chat_id) != summary
+                self._summaries[chat_id] = summary
+
+            on_saved = self.on_saved
+            if on_saved:
+                try:
+                    on_saved(key, chat_id, summary_changed)
+                except Exception as e:
+                    print(f"Error in save callback: {e}")
+        return True
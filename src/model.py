@@ -1,14 +1,19 @@
 import requests
+import json
 import asyncio
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
+from .memory.messages import window_base
 # Make sure you have this function in your codebase:
 # from ren_backend.interfaces.chat.system_message import get_system_message
 
 OLLAMA_API_URL = "http://localhost:11434"
 
+# A reply whose load_duration exceeds this had to load the model into memory
+MODEL_LOAD_THRESHOLD_NS = 500_000_000
+
 class OllamaAPI:
     def __init__(self, model: str = "llama3.2", on_error: Callable = None):
         self.model = model
@@ -17,6 +22,10 @@ def __init__(self, model: str = "llama3.2", on_error: Callable = None):
         self.on_error = on_error
         self.token_manager = None
         self.settings = None
+        self.last_usage = None  # Timings and token counts of the latest reply
+        # Seq of the first history message sent last time; the next request
+        # starts there too so the server's prompt cache keeps matching
+        self.prompt_start_seq = None
         
         # Initialize with default system message until settings are loaded
         self.conversation_history = [{
@@ -78,7 +87,12 @@ def _preload_model(self):
                 self.on_error(f"Model preload failed: {str(e)}")
 
     def get_response_async(self, user_message: str, callback: Callable[[str], None], **kwargs):
-        """Asynchronously get a response from the Ollama LLM"""
+        """Asynchronously get a response from the Ollama LLM
+        
+        With on_chunk given, the reply is streamed and on_chunk is called
+        (on the worker thread) with each piece as it arrives; callback still
+        gets the whole reply at the end.
+        """
         def _async_get_response():
             try:
                 response = self.get_response(user_message, **kwargs)
@@ -90,12 +104,15 @@ def _async_get_response():
         
         self.executor.submit(_async_get_response)
 
-    def _make_request(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """Make a request to the Ollama API"""
+    def _make_request(self, messages: List[Dict[str, str]], on_chunk: Callable[[str], None] = None,
+                      **kwargs) -> Dict[str, Any]:
+        """Make a request to the Ollama API (streamed if on_chunk is given)"""
         payload = {
             "model": self.model,
-            "messages": messages,
-            "stream": False, 
+            # Only role and content go over the wire; reading content here is
+            # also what decompresses messages loaded from storage
+            "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            "stream": on_chunk is not None, 
             "options": {
                 "temperature": kwargs.get('temperature', 0.5),
                 "top_p": kwargs.get('top_p', 1.0),
@@ -103,20 +120,81 @@ def _make_request(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, A
         }
         
         try:
+            if on_chunk is not None:
+                return self._read_stream(payload, on_chunk)
             response = requests.post(self.api_url, json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"Error communicating with Ollama API: {str(e)}")
+    
+    def _read_stream(self, payload: Dict[str, Any], on_chunk: Callable[[str], None]) -> Dict[str, Any]:
+        """Stream a reply, passing each piece on; returns the final object
+        (with its counts and timings) holding the whole message"""
+        parts = []
+        final = {}
+        with requests.post(self.api_url, json=payload, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise Exception(f"Error from Ollama API: {data['error']}")
+                piece = data.get('message', {}).get('content', "")
+                if piece:
+                    parts.append(piece)
+                    on_chunk(piece)
+                if data.get('done'):
+                    final = data
+        final['message'] = {"role": "assistant", "content": "".join(parts)}
+        return final
+
+    def _usage_from_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Token counts and timings Ollama reports with a reply (durations are in ns)"""
+        load_ns = response.get('load_duration', 0) or 0
+        prompt_ns = response.get('prompt_eval_duration', 0) or 0
+        return {
+            "model": self.model,
+            "day": datetime.now().date().isoformat(),
+            "prompt_tokens": response.get('prompt_eval_count', 0) or 0,
+            "completion_tokens": response.get('eval_count', 0) or 0,
+            # The first token is ready once the model is loaded and the
+            # prompt evaluated (streamed or not)
+            "ttft_ms": (load_ns + prompt_ns) / 1e6,
+            "eval_ms": (response.get('eval_duration', 0) or 0) / 1e6,
+            "loaded": load_ns >= MODEL_LOAD_THRESHOLD_NS,
+        }
+
+    def _request_messages(self) -> List[Dict[str, str]]:
+        """The system prompt and as much of the history as fits the context
+        
+        History positions are counted in message seqs, which branches of a
+        conversation share, so continuing a sibling branch sends the same
+        prefix as the last request and only the new messages are evaluated.
+        """
+        history = self.conversation_history
+        if self.token_manager is None or len(history) <= 2:
+            return history
+        base_seq = window_base(history)
+        keep_from = None
+        if self.prompt_start_seq is not None:
+            keep_from = self.prompt_start_seq - base_seq + 1
+        start = self.token_manager.request_start(history, keep_from)
+        self.prompt_start_seq = base_seq + start - 1
+        return history[:1] + history[start:]
+
+    def reset_prompt_window(self):
+        """Forget where the last request started, e.g. when another chat is opened"""
+        self.prompt_start_seq = None
 
     def get_response(self, user_message: str, **kwargs) -> str:
         """Get a response from the Ollama LLM"""
-        # Trim history if needed
-        self.conversation_history = self.token_manager.trim_conversation(
-            self.conversation_history
-        )
+        self.last_usage = None
         
-        response = self._make_request(messages=self.conversation_history, **kwargs)
+        # The history itself is kept whole; only the request is windowed
+        response = self._make_request(messages=self._request_messages(), **kwargs)
+        self.last_usage = self._usage_from_response(response)
         
         # Extract the assistant's message
         assistant_message = response.get('message', {}).get('content', "")
@@ -47,11 +47,19 @@ class AppSettings:
     font_size: int = 12
     font_family: str = "Helvetica"
     window_size: tuple = (800, 600)
+    prefetch_folders_on_hover: bool = True  # Read a folder's subfolders in the background while hovered
+    chat_renderer: str = "widgets"  # "widgets" (a bubble per message) or "text" (the whole chat in one text widget)
+    stream_flush_ms: int = 33  # Streamed replies are redrawn at most this often
     
     # Chat settings
     max_history: int = 100
     show_timestamps: bool = True
     
+    # Storage settings
+    archive_after_days: int = 90  # Move chats untouched this long to cold storage (0 = never)
+    backup_interval_hours: int = 24  # Back up while idle at most this often (0 = never)
+    backup_keep: int = 7  # Number of backups kept
+    
     # Token limits
     max_input_tokens: int = 4000  # Single message limit
     max_system_prompt_tokens: int = 1000  # System prompt limit
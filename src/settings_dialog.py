@@ -85,6 +85,8 @@ def __init__(self, parent):
         
         self.parent = parent
         self.settings = parent.settings_manager.settings
+        # Main window's theme registry; widgets in the theme colour are bound to it
+        self.theme_registry = parent.theme
         
         # Always use dark theme colors
         bg_color = self.theme.bg_color
@@ -107,16 +109,22 @@ def __init__(self, parent):
             text_color_disabled=self.theme.disabled_text  # Always use gray for disabled text since we're always in dark mode
         )
         self.tabview.pack(fill="both", expand=True, padx=10, pady=(10, 0))
+        self.theme_registry.bind(self.tabview, "accent", "segmented_button_selected_color",
+                                 "segmented_button_selected_hover_color")
         
         # Add tabs
         model_tab = self.tabview.add("Model")
         appearance_tab = self.tabview.add("Appearance")
         prompt_tab = self.tabview.add("System Prompt")
+        usage_tab = self.tabview.add("Usage")
+        backups_tab = self.tabview.add("Backups")
         
         # Create tab contents
         self.create_model_settings(model_tab)
         self.create_appearance_settings(appearance_tab)
         self.create_prompt_settings(prompt_tab)
+        self.create_usage_panel(usage_tab)
+        self.create_backup_settings(backups_tab)
         
         # Add auto-save message
         status_label = ctk.CTkLabel(
@@ -246,6 +254,7 @@ def create_model_settings(self, parent):
             button_hover_color=self.theme.button_hover  # Black hover
         )
         self.temp_slider.set(self.settings.temperature)
+        self.theme_registry.bind(self.temp_slider, "accent", "progress_color", "button_color")
         self.temp_slider.pack(fill="x", padx=10, pady=5)
         
         # Add a separator
@@ -293,6 +302,189 @@ def check_connection_status(self):
         if self.winfo_exists():
             self.after(5000, self.check_connection_status)
     
+    def create_usage_panel(self, parent):
+        """Create usage analytics tab content"""
+        # Period selection
+        period_frame = ctk.CTkFrame(parent, fg_color=self.theme.bg_color)
+        period_frame.pack(fill="x", padx=10, pady=5)
+        
+        period_label = ctk.CTkLabel(period_frame, text="Period:", text_color=self.theme.text_color)
+        period_label.pack(side="left", padx=5)
+        
+        self.usage_period = ctk.CTkOptionMenu(
+            period_frame,
+            values=["7 days", "30 days", "90 days", "365 days"],
+            command=lambda _: self.refresh_usage(),
+            width=120,
+            fg_color=self.theme.dropdown_bg,
+            button_color=self.theme.dropdown_bg,
+            button_hover_color=self.theme.dropdown_hover,
+            text_color=self.theme.dropdown_text
+        )
+        self.usage_period.set("30 days")
+        self.usage_period.pack(side="left", padx=5)
+        
+        refresh_btn = ctk.CTkButton(
+            period_frame,
+            text="Refresh",
+            command=self.refresh_usage,
+            width=80,
+            fg_color=self.theme.button_bg,
+            hover_color=self.theme.button_hover,
+            text_color=self.theme.button_text
+        )
+        refresh_btn.pack(side="right", padx=5)
+        
+        # Read-only report; a monospace textbox keeps the columns aligned
+        self.usage_text = ctk.CTkTextbox(
+            parent,
+            font=("Courier", 12),
+            wrap="none",
+            fg_color=self.theme.secondary_bg,
+            text_color=self.theme.text_color
+        )
+        self.usage_text.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        self.refresh_usage()
+    
+    def refresh_usage(self):
+        """Reload the usage report from the summary tables"""
+        days = int(self.usage_period.get().split()[0])
+        try:
+            summary = self.parent.memory_db.get_usage_summary(days=days)
+        except Exception as e:
+            print(f"Error loading usage: {e}")
+            summary = {"days": [], "models": [], "chats": []}
+        
+        def table(title: str, key: str, rows: List[Dict]) -> List[str]:
+            lines = [title, f"{'':<24}{'Replies':>8}{'Prompt':>10}{'Output':>10}{'TTFT ms':>9}{'Tok/s':>8}{'Loads':>7}"]
+            for row in rows:
+                name = str(row[key])[:22]
+                lines.append(
+                    f"{name:<24}{row['requests']:>8}{row['prompt_tokens']:>10}{row['completion_tokens']:>10}"
+                    f"{row['avg_ttft_ms']:>9.0f}{row['tokens_per_sec']:>8.1f}{row['loads']:>7}"
+                )
+            if not rows:
+                lines.append("  No usage recorded yet")
+            return lines + [""]
+        
+        lines = (table("By model", "model_name", summary["models"])
+                 + table("By day", "day", summary["days"])
+                 + table("Top chats", "title", summary["chats"]))
+        
+        self.usage_text.configure(state="normal")
+        self.usage_text.delete("1.0", "end")
+        self.usage_text.insert("1.0", "\n".join(lines))
+        self.usage_text.configure(state="disabled")
+    
+    def create_backup_settings(self, parent):
+        """Create backups tab content"""
+        info_label = ctk.CTkLabel(
+            parent,
+            text=(f"Backups are taken while the app is idle, at most every "
+                  f"{self.settings.backup_interval_hours} hours; the newest "
+                  f"{self.settings.backup_keep} are kept."),
+            text_color=self.theme.menu_text_color,
+            wraplength=520,
+            justify="left"
+        )
+        info_label.pack(fill="x", padx=10, pady=5)
+        
+        actions_frame = ctk.CTkFrame(parent, fg_color=self.theme.bg_color)
+        actions_frame.pack(fill="x", padx=10, pady=5)
+        
+        self.backup_now_btn = ctk.CTkButton(
+            actions_frame,
+            text="Back Up Now",
+            command=self.backup_now,
+            fg_color=self.theme.button_bg,
+            hover_color=self.theme.button_hover,
+            text_color=self.theme.button_text
+        )
+        self.backup_now_btn.pack(side="right", padx=5)
+        
+        self.backups_frame = ctk.CTkScrollableFrame(parent)
+        self.backups_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        self.load_backups()
+    
+    def load_backups(self):
+        """List existing backups with a restore button each"""
+        for widget in self.backups_frame.winfo_children():
+            widget.destroy()
+        
+        backups = self.parent.memory_db.list_backups()
+        if not backups:
+            ctk.CTkLabel(
+                self.backups_frame,
+                text="No backups yet",
+                text_color=self.theme.disabled_text
+            ).pack(pady=10)
+            return
+        
+        for backup in backups:
+            row = ctk.CTkFrame(self.backups_frame, fg_color="transparent")
+            row.pack(fill="x", pady=2)
+            
+            label = backup["created"].strftime("%Y-%m-%d %H:%M")
+            if backup["name"].endswith("pre-restore"):
+                label += " (before restore)"
+            ctk.CTkLabel(
+                row,
+                text=f"{label}   {backup['size'] / 1e6:.1f} MB",
+                text_color=self.theme.text_color
+            ).pack(side="left", padx=5)
+            
+            ctk.CTkButton(
+                row,
+                text="Restore",
+                width=80,
+                command=lambda b=backup: self.restore_backup(b),
+                fg_color=self.theme.button_bg,
+                hover_color=self.theme.button_hover,
+                text_color=self.theme.button_text
+            ).pack(side="right", padx=5)
+    
+    def backup_now(self):
+        """Take a backup on a background thread"""
+        self.backup_now_btn.configure(state="disabled", text="Backing up...")
+        
+        def run():
+            try:
+                self.parent.memory_db.create_backup()
+                self.parent.memory_db.rotate_backups(self.settings.backup_keep)
+                error = None
+            except Exception as e:
+                error = str(e)
+            self.after(0, lambda: finished(error))
+        
+        def finished(error):
+            if not self.winfo_exists():
+                return
+            self.backup_now_btn.configure(state="normal", text="Back Up Now")
+            if error:
+                messagebox.showerror("Backup Failed", error, parent=self)
+            self.load_backups()
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def restore_backup(self, backup: Dict):
+        """Restore all chats from a backup after confirming"""
+        when = backup["created"].strftime("%Y-%m-%d %H:%M")
+        if not messagebox.askyesno(
+            "Restore Backup",
+            f"Replace all chats with the backup from {when}?\n\n"
+            "A backup of the current chats is taken first.",
+            parent=self
+        ):
+            return
+        try:
+            self.parent.restore_backup(backup["path"])
+            messagebox.showinfo("Restore Backup", f"Chats restored from {when}.", parent=self)
+        except Exception as e:
+            messagebox.showerror("Restore Failed", str(e), parent=self)
+        self.load_backups()
+    
     def create_appearance_settings(self, parent):
         """Create appearance settings tab content"""
         # Color theme section
@@ -322,6 +514,7 @@ def create_appearance_settings(self, parent):
             fg_color=self.settings.theme_color
         )
         self.color_picker_btn.pack(side="right", padx=5)
+        self.theme_registry.bind(self.color_picker_btn, "accent", "fg_color")
         
         # Color preview button
         self.color_preview = ctk.CTkButton(
@@ -335,6 +528,7 @@ def create_appearance_settings(self, parent):
             corner_radius=5
         )
         self.color_preview.pack(side="right", padx=5)
+        self.theme_registry.bind(self.color_preview, "accent", "fg_color", "hover_color")
         
         # Removed theme selection (light/dark mode)
         # Now only using dark theme
@@ -355,6 +549,7 @@ def create_appearance_settings(self, parent):
             button_hover_color=self.theme.button_hover
         )
         self.font_dropdown.set(self.settings.message_font_family)
+        self.theme_registry.bind(self.font_dropdown, "accent", "fg_color", "button_color")
         self.font_dropdown.pack(side="right", padx=5)
         
         # Font size slider
@@ -378,6 +573,7 @@ def create_appearance_settings(self, parent):
             button_hover_color=self.theme.button_hover
         )
         self.size_slider.set(self.settings.message_font_size)
+        self.theme_registry.bind(self.size_slider, "accent", "progress_color", "button_color")
         self.size_slider.pack(fill="x", padx=10, pady=5)
         
         # Preview text
@@ -462,6 +658,7 @@ def create_prompt_settings(self, parent):
             border_width_unchecked=2
         )
         custom_radio.pack(side="left", padx=10)
+        self.theme_registry.bind(custom_radio, "accent", "hover_color")
         
         template_radio = ctk.CTkRadioButton(
             mode_frame,
@@ -477,6 +674,7 @@ def create_prompt_settings(self, parent):
             border_width_unchecked=2
         )
         template_radio.pack(side="left", padx=10)
+        self.theme_registry.bind(template_radio, "accent", "hover_color")
         
         # Add template frame contents
         # AI Name input
@@ -804,94 +1002,14 @@ def show_color_picker(self):
             self.update_theme_elements()
     
     def update_theme_elements(self):
-        """Single source of truth for theme colors"""
-        color = self.color_entry.get()  # Get color from entry, not settings
+        """Single source of truth for theme colors
         
-        # 1. Update settings first
-        self.settings.theme_color = color
-        
-        # 2. Update parent window immediately
+        Everything showing the theme colour, here and in the main window,
+        is bound to the theme's "accent" colour when it is made, and
+        follows in one batch.
+        """
+        color = self.color_entry.get()  # Get color from entry, not settings
         self.parent.update_theme_color(color)
-        
-        # 3. Update tab view and selected tab
-        self.tabview.configure(
-            fg_color=self.theme.bg_color,
-            segmented_button_fg_color=self.theme.bg_color,
-            segmented_button_selected_color=color,
-            segmented_button_selected_hover_color=color,
-            segmented_button_unselected_color=self.theme.secondary_bg,
-            segmented_button_unselected_hover_color=self.theme.tab_unselected_hover
-        )
-        
-        # 4. Update all sliders with theme color
-        slider_elements = [
-            self.temp_slider,
-            getattr(self, 'size_slider', None)
-        ]
-        
-        for slider in slider_elements:
-            if slider:
-                slider.configure(
-                    progress_color=color,
-                    button_color=color,
-                    button_hover_color=self.theme.button_hover
-                )
-        
-        # 5. Update all dropdowns to dark theme
-        dropdown_elements = [
-            self.model_dropdown,
-            getattr(self, 'role_dropdown', None),
-            getattr(self, 'personality_dropdown', None),
-            getattr(self, 'font_dropdown', None),
-            getattr(self, 'theme_dropdown', None)
-        ]
-        
-        for dropdown in dropdown_elements:
-            if dropdown:
-                dropdown.configure(
-                    fg_color="#1e1e1e",
-                    button_color="#1e1e1e",
-                    button_hover_color="#000000",
-                    text_color="white"
-                )
-        
-        # 6. Update all buttons to dark theme
-        button_elements = [
-            self.refresh_btn,
-            getattr(self, 'color_picker_btn', None)
-        ]
-        
-        for button in button_elements:
-            if button:
-                button.configure(
-                    fg_color="#1e1e1e",
-                    hover_color="#000000",
-                    text_color="white"
-                )
-        
-        # 7. Keep download buttons black
-        if hasattr(self, 'downloads_frame'):
-            for widget in self.downloads_frame.winfo_children():
-                if isinstance(widget, ctk.CTkFrame):
-                    for btn in widget.winfo_children():
-                        if isinstance(btn, ctk.CTkButton):
-                            btn.configure(
-                                fg_color="#000000",
-                                hover_color="#1e1e1e",
-                                text_color="white"
-                            )
-        
-        # 8. Update radio buttons if they exist
-        if hasattr(self, 'prompt_mode'):
-            for widget in self.winfo_children():
-                if isinstance(widget, ctk.CTkRadioButton):
-                    widget.configure(
-                        fg_color="#1e1e1e",
-                        hover_color="#000000",
-                        text_color="white"
-                    )
-        
-        # 9. Save settings
         self.parent.settings_manager.save_settings()
     
     def update_color_from_entry(self, event=None):
@@ -901,12 +1019,6 @@ def update_color_from_entry(self, event=None):
             self.color_preview.configure(fg_color=color, hover_color=color)
             self.update_theme_elements()
     
-    def preview_theme_changes(self):
-        """Preview theme changes in real-time"""
-        # Update UI elements that use the theme color
-        self.update_ui_colors()
-        self.parent.update_theme_color(self.settings.theme_color)
-    
     def update_font(self, font_name: str):
         """Update font family"""
         self.settings.message_font_family = font_name
@@ -934,42 +1046,6 @@ def refresh_models(self):
         models = self.parent.api.get_available_models()
         self.model_dropdown.configure(values=models) 
     
-    def update_ui_colors(self):
-        """Update all UI elements with the current theme color"""
-        # Update buttons
-        self.color_picker_btn.configure(fg_color=self.settings.theme_color)
-        self.refresh_btn.configure(fg_color=self.settings.theme_color)
-        
-        # Update tabview
-        self.tabview.configure(
-            segmented_button_fg_color=self.settings.theme_color,
-            segmented_button_selected_color=self.settings.theme_color
-        )
-        
-        # Update dropdowns
-        self.theme_dropdown.configure(
-            fg_color=self.settings.theme_color,
-            button_color=self.settings.theme_color
-        )
-        self.font_dropdown.configure(
-            fg_color=self.settings.theme_color,
-            button_color=self.settings.theme_color
-        )
-        self.model_dropdown.configure(
-            fg_color=self.settings.theme_color,
-            button_color=self.settings.theme_color
-        )
-        
-        # Update sliders
-        self.temp_slider.configure(
-            progress_color=self.settings.theme_color,
-            button_color=self.settings.theme_color
-        )
-        self.size_slider.configure(
-            progress_color=self.settings.theme_color,
-            button_color=self.settings.theme_color
-        ) 
-    
     def load_available_downloads(self):
         """Load and display available model downloads"""
         # Clear existing content
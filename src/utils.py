@@ -37,9 +37,47 @@ def check_system_prompt(self, text: str) -> tuple[bool, str]:
             return False, f"System prompt too long ({tokens} tokens). Maximum is {self.settings.max_system_prompt_tokens} tokens."
         return True, ""
     
+    def message_tokens(self, msg) -> int:
+        """Token count of one message"""
+        # Messages loaded from the database carry their stored count, which
+        # avoids decompressing and re-tokenizing the whole window per request
+        if getattr(msg, "token_count", None) is not None:
+            return msg.token_count
+        return count_tokens(msg["content"])
+    
     def estimate_conversation_tokens(self, messages: list) -> int:
         """Estimate total tokens in conversation"""
-        return sum(count_tokens(msg["content"]) for msg in messages)
+        return sum(self.message_tokens(msg) for msg in messages)
+    
+    def request_start(self, messages: list, keep_from: int = None) -> int:
+        """Index of the first message after the system prompt to send
+        
+        The server reuses its cache for whatever prefix a prompt shares with
+        the previous one, so the window's start is sticky: ``keep_from`` (the
+        index the last request started at) is kept while everything from
+        there still fits. When the window has to move, it moves far enough
+        to leave a quarter of the context free for the next few turns,
+        instead of sliding one message - and missing the cache - every turn.
+        """
+        budget = self.settings.max_context_tokens - self.settings.token_padding
+        counts = [self.message_tokens(msg) for msg in messages]
+        available = budget - (counts[0] if counts else 0)
+        
+        # Tokens from each index to the end
+        suffix = [0] * (len(counts) + 1)
+        for i in range(len(counts) - 1, 0, -1):
+            suffix[i] = suffix[i + 1] + counts[i]
+        
+        if keep_from is not None and 1 <= keep_from < len(counts) and suffix[keep_from] <= available:
+            return keep_from
+        if suffix[1] <= available:
+            return 1
+        
+        target = available - budget // 4
+        start = 1
+        while start < len(counts) - 1 and suffix[start] > target:
+            start += 1
+        return start
     
     def should_trim_history(self, messages: list) -> bool:
         """Check if conversation history needs trimming"""